@@ -5,9 +5,16 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from hash_tag.core.filters import filter_punctuation, filter_by_tag, \
     filter_stop_words, filter_duplicates
 from hash_tag.core.filter_pipeline import FilterPipeLine
-from hash_tag.core.stem import stem_words
-from hash_tag.core.common_words import CalculateCommonWords
+from hash_tag.core.stem import load_stem_cache, save_stem_cache
+from hash_tag.core.common_words import CalculateCommonWords, counting_engines, \
+    chart_formats, table_formats
 from hash_tag.core.data_loader import DataLoader
+from hash_tag.core.columnar import write_lines
+from hash_tag.core.stages import make_stage, run_fused, run_stages, stream_stages
+from hash_tag.core.stage_cache import StageCache
+from hash_tag.core.word_index import WordIndex
+from hash_tag.tools.helpers import checkpoint_writer
+from hash_tag.tools import resources, metrics
 
 
 class HastTagApp(cmd.Cmd):
@@ -15,27 +22,77 @@ class HastTagApp(cmd.Cmd):
                         "Type help or ? to list commands.\n"
     prompt = ">>> "
 
-    def __init__(self, *args, **kwargs) -> None:
+    def __init__(self, *args, data_loader: DataLoader = None, **kwargs) -> None:
+        """
+        :param data_loader: default the DataLoader of the data folder
+        """
         super().__init__(*args, **kwargs)
         self.debug = True
-        self.data = None
+        self._data = None
+        self.word_index = None
+        # the ordered stages which are applied in the parsed data to get the current data,
+        # the filters of apply and the stem, None when the data are restored from a checkpoint
+        self.stages = []
         self.filter_pipeline = None
         self.common_words = None
-        self.data_loader = DataLoader(input_files_path="data")
+        self.data_loader = data_loader or DataLoader(input_files_path="data")
+        # the data after the stages for each configuration, so they are not applied again
+        self.stage_cache = StageCache(os.path.join(self.data_loader.saves_dir, "stage_cache"))
         self.vocabulary = "english"
         self.common_criterion = 6
         self.top_k = 10
         self.results_file_name = "results"
         self.tags = ["NNS", "NN"]
         self.stemmer = "lancaster"
+        self.counting_engine = "dict"
+        self.result_formats = ["pdf", "csv"]
+
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, data) -> None:
+        # a new state of the pipeline, the word index must be built again
+        self._data = data
+        self.word_index = None
+
+    def _apply_stages(self, stages: list, tag_cache=None) -> None:
+        """
+        Applies the stages after the current ones, the whole list of the stages runs in the
+        parsed data and its longest cached prefix is reused from the stage cache. The data
+        restored from a checkpoint have unknown stages, so the stages run in them directly.
+        :param tag_cache: the tag cache of filter_by_tag, see FilterPipeLine
+        """
+        checkpoint = self._checkpoint if self.debug else None
+        if self.stages is None:
+            self.data = run_fused(self.data, stages, checkpoint=checkpoint, tag_cache=tag_cache,
+                                  workers=self.data_loader.workers)
+            return
+        stages = self.stages + stages
+        self.data = self.stage_cache.run(self.data_loader.data, stages,
+                                         fingerprint=self.data_loader.fingerprint,
+                                         checkpoint=checkpoint, tag_cache=tag_cache,
+                                         workers=self.data_loader.workers)
+        self.stages = stages
+
+    def _checkpoint(self, stage_name: str, data) -> None:
+        """
+        Saves the data after the stage in the background, see CheckpointWriter
+        """
+        checkpoint_writer.submit(os.path.join(self.data_loader.saves_dir, stage_name), data,
+                                 writer=write_lines)
 
     def do_parse(self, _) -> None:
         """
         Parse all the input files,Entry point if there are no previous checkpoints.
+        Only the new or changed input files are parsed again.
         :param _: No parameters
         :return:
         """
+        self.data_loader.invalidate()
         self.data = self.data_loader.data
+        self.stages = []
 
     def do_print_settings(self, _) -> None:
         """
@@ -47,6 +104,13 @@ class HastTagApp(cmd.Cmd):
               f"Results file name is: {self.results_file_name}\n"
               f"Words tags to keep :{self.tags}\n"
               f"Stemmer is: {self.stemmer}\n"
+              f"Workers are: {self.data_loader.workers}\n"
+              f"Tokenizer is: {self.data_loader.tokenizer_name}\n"
+              f"Counting engine is: {self.counting_engine}\n"
+              f"Result formats are: {self.result_formats}\n"
+              f"Nltk data dir is: {resources.settings['data_dir']}\n"
+              f"Offline is: {resources.settings['offline']}\n"
+              f"Metrics are: {metrics.settings}\n"
               f"Showing result for top: {self.top_k}")
 
     def do_total_input_files(self, _) -> None:
@@ -57,6 +121,105 @@ class HastTagApp(cmd.Cmd):
         """
         print(f"{self.data_loader}")
 
+    def do_set_workers(self, workers) -> None:
+        """
+        Set the number of processes for the parsing of the input files and for the
+        filter_by_tag, 1 means serial execution
+        :param workers: integer
+        """
+        self.data_loader.workers = int(workers)
+        if self.filter_pipeline:
+            self.filter_pipeline.workers = self.data_loader.workers
+        print(f"New number of workers is: {self.data_loader.workers}")
+
+    def do_set_tokenizer(self, tokenizer) -> None:
+        """
+        Set the tokenizer of the input files: nltk (default) or regex, the regex one is
+        faster and it keeps almost the same alphabetic words, parse again after it
+        :param tokenizer: name of the tokenizer
+        """
+        try:
+            self.data_loader.tokenizer = tokenizer.strip().lower()
+            print(f"New tokenizer is: {self.data_loader.tokenizer_name}")
+        except ValueError as error:
+            print(error)
+
+    def do_set_engine(self, engine) -> None:
+        """
+        Set the counting engine of the common words: dict (default) or numpy
+        :param engine: name of the engine
+        """
+        engine = engine.strip().lower()
+        if engine not in counting_engines:
+            print(f"Supported engines are: {list(counting_engines)}")
+            return
+        self.counting_engine = engine
+        # the index is built again with the new engine
+        self.word_index = None
+        print(f"New counting engine is: {self.counting_engine}")
+
+    def do_set_formats(self, formats) -> None:
+        """
+        Set the files of the results of show and sweep: pdf, png, svg, csv, parquet
+        e.g. set_formats csv to skip the chart
+        :param formats: space separated formats
+        """
+        formats = formats.lower().split()
+        unknown = [output for output in formats if output not in chart_formats + table_formats]
+        if not formats or unknown:
+            print(f"Supported formats are: {list(chart_formats + table_formats)}")
+            return
+        self.result_formats = formats
+        print(f"New result formats are: {self.result_formats}")
+
+    def do_set_nltk_data(self, data_dir) -> None:
+        """
+        Set a local folder with the nltk data, it is searched first and the missing resources
+        are downloaded there
+        :param data_dir: path of the folder
+        """
+        resources.configure(data_dir=data_dir)
+        print(f"New nltk data dir is: {data_dir}")
+
+    def do_set_offline(self, offline) -> None:
+        """
+        In offline mode the missing nltk resources are never downloaded
+        :param offline: on or off
+        """
+        resources.configure(offline=offline.lower() in ("on", "true", "1"))
+        print(f"Offline is: {resources.settings['offline']}")
+
+    def do_set_metrics(self, options) -> None:
+        """
+        Measure every step (time, cpu, tokens/s, memory and cache hits) for the run report
+        :param options: on, off or on memory to add the tracemalloc peaks (slower)
+        """
+        options = options.lower().split()
+        enabled = bool(options) and options[0] in ("on", "true", "1")
+        metrics.configure(enabled=enabled, memory=enabled and "memory" in options)
+        print(f"Metrics are: {metrics.settings}")
+
+    def do_set_profile_dir(self, profile_dir) -> None:
+        """
+        Save the cProfile stats of every measured step in the given folder, an empty value
+        disables the profiling, the metrics must be on
+        :param profile_dir: path of the folder
+        """
+        metrics.configure(profile_dir=profile_dir.strip())
+        print(f"Profile dir is: {metrics.settings['profile_dir']}")
+
+    def do_metrics_report(self, file_name) -> None:
+        """
+        Write the run report of the measured steps as json in the results directory and
+        start a new one
+        :param file_name: optional, default metrics
+        """
+        file_path = os.path.join(self.data_loader.results_dir,
+                                 f"{file_name.strip() or 'metrics'}.json")
+        metrics.write_report(file_path)
+        metrics.reset()
+        print(f"Metrics report saved at: {file_path}")
+
     def do_set_vocabulary(self, vocabulary) -> None:
         """
         Set the vocabulary language for for nltk method of step words
@@ -76,14 +239,30 @@ class HastTagApp(cmd.Cmd):
         print(f"New stemmer is: {self.stemmer}")
 
     def do_stem(self, _) -> None:
+        """
+        Stem the words of the current data, after the applied filters, the stemmed data of
+        the same input files, stages, vocabulary and stemmer are reused from the stage cache
+        :param _: No parameters
+        """
+        if self.stages and any(name == "stem" for name, _ in self.stages):
+            print(f"The data are already stemmed: {self.stages}")
+            return
         try:
-            self.data = stem_words(self.data_loader.data, vocabulary=self.vocabulary,
-                                   stemmer=self.stemmer,
-                                   saves_dir=self.data_loader.saves_dir,
-                                   debug=self.debug)
+            load_stem_cache(self.data_loader.saves_dir)
+            self._apply_stages([make_stage("stem", vocabulary=self.vocabulary,
+                                           stemmer=self.stemmer)])
+            save_stem_cache(self.data_loader.saves_dir)
         except TypeError as e:
             print(f"Error trying top apply the stem: {e}")
 
+    def do_clear_stage_cache(self, _) -> None:
+        """
+        Remove all the cached states of the stages
+        :param _: No parameters
+        """
+        self.stage_cache.clear()
+        print(f"The stage cache is empty")
+
     def do_set_tags(self, tags) -> None:
         """
         Update the tags where the filter by tag method will keep for the word tokens
@@ -92,22 +271,34 @@ class HastTagApp(cmd.Cmd):
         self.tags = [tag.upper() for tag in tags.split(" ")]
         print(f"New tags are: {self.tags}")
 
-    def do_add(self, _) -> None:
+    def do_add(self, filter_names) -> None:
         """
         Add a specific filter one by one, useful to check the results per filter
-        :param _: No parameters
+        :param filter_names: optional, space separated names of the filters to add without the
+        interactive menu, e.g. add filter_punctuation filter_stop_words
         """
         if not self.filter_pipeline:
             self.filter_pipeline = FilterPipeLine(saves_dir=self.data_loader.saves_dir,
                                                   data=self.data_loader.data,
                                                   tags=self.tags,
                                                   vocabulary=self.vocabulary,
-                                                  debug=self.debug)
+                                                  debug=self.debug,
+                                                  workers=self.data_loader.workers,
+                                                  stage_cache=self.stage_cache,
+                                                  fingerprint=self.data_loader.fingerprint)
         supported_filters = {
             "1": filter_punctuation,
             "2": filter_duplicates,
             "3": filter_stop_words,
             "4": filter_by_tag}
+        if filter_names.strip():
+            filters = {n_filter.__name__: n_filter for n_filter in supported_filters.values()}
+            for name in filter_names.split():
+                if name in filters:
+                    self.filter_pipeline.add_filter(filters[name])
+                else:
+                    print(f"Unknown filter: {name}, supported: {list(filters)}")
+            return
         while True:
             print(f"0:exit")
             for key, value in supported_filters.items():
@@ -129,21 +320,26 @@ class HastTagApp(cmd.Cmd):
                                               data=self.data_loader.data,
                                               tags=self.tags,
                                               vocabulary=self.vocabulary,
-                                              debug=self.debug)
+                                              debug=self.debug,
+                                              workers=self.data_loader.workers,
+                                              stage_cache=self.stage_cache,
+                                              fingerprint=self.data_loader.fingerprint)
         self.filter_pipeline.add_all_filters()
         self.data = self.filter_pipeline.data
+        self.stages = []
 
     def do_apply(self, _) -> None:
         """
-        Run the pipeline of filtering the data for the requested filters.
+        Run the pipeline of filtering the data for the requested filters, they are applied
+        after the stages of the current data and then they are removed from the pipeline.
         :param _: No parameters
         """
         try:
             print(f"{self.filter_pipeline}")
             self.filter_pipeline.vocabulary = self.vocabulary
-            self.filter_pipeline.apply_filters()
-            # update the common data
-            self.data = self.filter_pipeline.data
+            self._apply_stages(self.filter_pipeline.stages,
+                               tag_cache=self.filter_pipeline.tag_cache)
+            self.filter_pipeline.clear_filters()
         except AttributeError as e:
             print(f"You need to add a filter first:{e}")
 
@@ -152,11 +348,16 @@ class HastTagApp(cmd.Cmd):
         Restore the state from previous filtering checkpoint.
         :param _: No parameters
         """
+        try:
+            checkpoint_writer.wait()
+        except IOError as error:
+            print(error)
         self.filter_pipeline = FilterPipeLine(saves_dir=self.data_loader.saves_dir,
                                               data=self.data_loader.data,
                                               tags=self.tags,
                                               vocabulary=self.vocabulary,
-                                              debug=self.debug)
+                                              debug=self.debug,
+                                              workers=self.data_loader.workers)
         if self.filter_pipeline.saves:
             checkpoints_dict = {str(key): value for
                                 (key, value) in enumerate(self.filter_pipeline.saves)}
@@ -164,9 +365,44 @@ class HastTagApp(cmd.Cmd):
             save_point = input("Restore from?: ")
             if save_point in checkpoints_dict:
                 self.data = self.filter_pipeline.restore_after_filter(checkpoints_dict[save_point])
+                self.stages = None
         else:
             print(f"No save points founded!")
 
+    def do_restore_index(self, _) -> None:
+        """
+        Restore the word index of the last show, the common words for different criterion
+        and top_k can be shown without the data.
+        :param _: No parameters
+        """
+        try:
+            self.word_index = WordIndex.load(os.path.join(self.data_loader.saves_dir,
+                                                          "word_index"))
+            self.stages = None
+        except FileNotFoundError:
+            print(f"No word index founded!")
+
+    def do_update(self, _) -> None:
+        """
+        Update the word index with the changes of the input files, only the new or changed
+        files are parsed, filtered and stemmed again and the lines of the changed or removed
+        files are retracted from the index.
+        :param _: No parameters
+        """
+        if self.word_index is None or self.stages is None:
+            print(f"You need to parse the data and show the results first, "
+                  f"the data restored from a checkpoint cannot be updated")
+            return
+        added, retracted = self.data_loader.update()
+        added = run_stages(added, self.stages, fused=True, workers=self.data_loader.workers)
+        self.word_index.retract(retracted)
+        self.word_index.add(added)
+        self.word_index.save(os.path.join(self.data_loader.saves_dir, "word_index"))
+        retracted = set(retracted)
+        self._data = sorted([line for line in self._data if line.file_name not in retracted] +
+                            added, key=lambda line: line.file_name)
+        print(f"Added lines: {len(added)}, retracted files: {sorted(retracted)}")
+
     def do_set_criterion(self, criterion) -> None:
         """
         Set the criterion for the calculation of the common words.
@@ -197,14 +433,20 @@ class HastTagApp(cmd.Cmd):
     def do_show(self, _) -> None:
         """
         Show the final results for common words for the requested parameters, criterion,top_k
+        The words are counted once for each state of the data in a word index, so changes of
+        the criterion and top_k don't count them again.
         :param _: No parameters
         """
         try:
+            if self.word_index is None:
+                self.word_index = WordIndex.build(self.data, engine=self.counting_engine)
+                self.word_index.save(os.path.join(self.data_loader.saves_dir, "word_index"))
             self.common_words = CalculateCommonWords(results_dir=self.data_loader.results_dir,
-                                                     data=self.data,
                                                      common_criterion=self.common_criterion,
-                                                     debug=self.debug)
-            self.common_words.show_common(top_k=self.top_k, file_name=self.results_file_name)
+                                                     debug=self.debug,
+                                                     index=self.word_index)
+            self.common_words.show_common(top_k=self.top_k, file_name=self.results_file_name,
+                                          formats=self.result_formats)
         except TypeError as e:
             print(f"You need to parse the data at least. "
                   f"optional apply some filters first "
@@ -217,12 +459,82 @@ class HastTagApp(cmd.Cmd):
                 f"All the common words are stored in results directory\n"
                 f"Change the parameters of top_k and and the criterion and repeat")
 
+    def do_sweep(self, grid) -> None:
+        """
+        Save the results of show for a grid of criteria and top_k, the words are counted only
+        once and the pdf and csv files are rendered by the workers in parallel.
+        :param grid: comma separated criteria and top_k values, e.g. sweep 2,4,6 5,10,20
+        """
+        try:
+            criteria, top_ks = ([int(value) for value in values.split(",")]
+                                for values in grid.split())
+            if not criteria or not top_ks or min(top_ks) < 1:
+                raise ValueError(grid)
+        except ValueError:
+            print(f"Usage: sweep 2,4,6 5,10,20 (criteria and top_k values, top_k at least 1)")
+            return
+        try:
+            if self.word_index is None:
+                self.word_index = WordIndex.build(self.data, engine=self.counting_engine)
+                self.word_index.save(os.path.join(self.data_loader.saves_dir, "word_index"))
+            common_words = CalculateCommonWords(results_dir=self.data_loader.results_dir,
+                                                common_criterion=min(criteria),
+                                                debug=self.debug,
+                                                index=self.word_index)
+            files = common_words.sweep(criteria=criteria, top_ks=top_ks,
+                                       file_name=self.results_file_name,
+                                       workers=self.data_loader.workers,
+                                       formats=self.result_formats)
+            print(f"Saved results for (criterion, top_k): {sorted(files)}")
+        except ValueError as e:
+            print(f"Invalid sweep: {e}")
+        except TypeError as e:
+            print(f"You need to parse the data at least. "
+                  f"optional apply some filters first "
+                  f"or restore them from a checkpoint!\n{e}")
+
+    def do_stream(self, _) -> None:
+        """
+        Run parse -> applied stages -> added filters -> stem -> show as one streaming pass over
+        the input files, the stages are applied in this order like apply and then stem, the
+        lines are never all kept in memory and no checkpoints are created.
+        :param _: No parameters
+        """
+        stages, tag_cache = list(self.stages or []), None
+        if self.filter_pipeline:
+            self.filter_pipeline.vocabulary = self.vocabulary
+            stages += self.filter_pipeline.stages
+            tag_cache = self.filter_pipeline.tag_cache
+        if all(name != "stem" for name, _ in stages):
+            stages.append(make_stage("stem", vocabulary=self.vocabulary, stemmer=self.stemmer))
+        stream = stream_stages(self.data_loader.iter_lines(), stages, tag_cache=tag_cache,
+                               workers=self.data_loader.workers)
+        try:
+            self.common_words = CalculateCommonWords(results_dir=self.data_loader.results_dir,
+                                                     data=stream,
+                                                     common_criterion=self.common_criterion,
+                                                     debug=self.debug,
+                                                     engine=self.counting_engine,
+                                                     workers=self.data_loader.workers)
+            self.common_words.show_common(top_k=self.top_k, file_name=self.results_file_name,
+                                          formats=self.result_formats)
+        except StopIteration:
+            print(f"Request common words with top_k={self.top_k}\n"
+                  f"criterion={self.common_criterion}\n"
+                  f"Nothing found")
+
     def do_exit(self, _) -> None:
         """
         Exit the program
         :return:
         """
         print("Thank you!\nbye")
+        # the pending checkpoints are written before the exit
+        try:
+            checkpoint_writer.wait()
+        except IOError as error:
+            print(error)
+        checkpoint_writer.shutdown()
         sys.exit()
 
 
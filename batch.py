@@ -0,0 +1,80 @@
+"""
+Runs the whole #HashTag pipeline without the interactive shell: parse -> stages -> count ->
+results, for cron jobs and worker containers. The configuration is read from a json file with
+the settings of core/batch.BatchConfig and every option of the command line overrides it.
+The files of the results (pdf and csv by default, --formats csv skips the chart) and a json
+report with the timings of every step are written in the results directory and the timings are
+printed at the end.
+exit status: 0 on success, 1 in case of a wrong configuration or if nothing is found
+usage: python batch.py --config nightly.json --workers 4
+       python batch.py --stages filter_punctuation stem --stemmer porter --criterion 3
+"""
+import argparse
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hash_tag.core.batch import BatchConfig, run_batch
+
+
+def parse_config(argv: list = None) -> BatchConfig:
+    """
+    :raise: ValueError in case of an unknown setting in the configuration file
+    """
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", help="json file with the settings of BatchConfig")
+    parser.add_argument("--input", dest="input_files_path", help="folder of the input files")
+    parser.add_argument("--saves", dest="saves_folder_name", help="folder of the saves")
+    parser.add_argument("--results", dest="results_folder_name", help="folder of the results")
+    parser.add_argument("--stages", nargs="+", help="the stages in the order they are applied")
+    parser.add_argument("--vocabulary")
+    parser.add_argument("--stemmer", help="porter or lancaster")
+    parser.add_argument("--tags", nargs="+", help="the tags of filter_by_tag, e.g. NN NNS")
+    parser.add_argument("--criterion", type=int, help="minimum number of files of a word")
+    parser.add_argument("--top-k", dest="top_k", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--tokenizer", help="nltk or regex")
+    parser.add_argument("--engine", help="the counting engine, dict or numpy")
+    parser.add_argument("--results-file-name", dest="results_file_name")
+    parser.add_argument("--formats", nargs="+",
+                        help="the files of the results: pdf png svg csv parquet")
+    parser.add_argument("--no-stage-cache", dest="use_stage_cache", action="store_false",
+                        default=None)
+    parser.add_argument("--show", action="store_true", default=None, help="open the plot")
+    parser.add_argument("--debug", action="store_true", default=None)
+    parser.add_argument("--metrics", action="store_true", default=None,
+                        help="write the metrics run report of every step")
+    parser.add_argument("--metrics-memory", dest="metrics_memory", action="store_true",
+                        default=None, help="add the tracemalloc peaks in the metrics")
+    parser.add_argument("--profile-dir", dest="profile_dir",
+                        help="save the cProfile stats of every step there, with --metrics")
+    args = vars(parser.parse_args(argv))
+    settings = {}
+    config_file = args.pop("config")
+    if config_file:
+        with open(config_file, encoding="utf-8") as f:
+            settings.update(json.load(f))
+    settings.update({name: value for name, value in args.items() if value is not None})
+    return BatchConfig.from_dict(settings)
+
+
+def main(argv: list = None) -> int:
+    try:
+        config = parse_config(argv)
+        result = run_batch(config)
+    except Exception as error:
+        # a wrong configuration, missing input files or nltk resources
+        print(f"Batch run failed: {error}", file=sys.stderr)
+        return 1
+    print(f"{'step':<45}{'seconds':>10}")
+    for step, seconds in result.timings.items():
+        print(f"{step:<45}{seconds:>10.2f}")
+    for word, counter, files in result.common:
+        print(f"{word}: {counter} lines in {files} files")
+    print(f"Results: {result.files}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""
+Benchmark of the startup and the rendering cost of core/common_words.py. Every import mode
+runs in a new python process: "lazy plotting" imports only the module, "eager plotting" adds
+the module level imports of matplotlib.pyplot, numpy and pandas of the previous versions.
+Then the top_k results of the bundled data/doc*.txt corpus are rendered in the given formats
+in this process, the first rendering of each mode pays its imports.
+usage: python benchmarks/bench_common_words.py --runs 5 --renders 5
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(PACKAGE_PARENT)
+from hash_tag.core.common_words import CalculateCommonWords, render_results, result_rows
+from hash_tag.core.data_loader import DataLoader
+from hash_tag.tools.logger import Logger
+
+IMPORT = "import hash_tag.core.common_words"
+EAGER_PLOTTING = "; import matplotlib.pyplot, numpy, pandas"
+
+
+def timed_run(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=PACKAGE_PARENT, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="processes of each import mode")
+    parser.add_argument("--renders", type=int, default=5, help="renders of each format")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+    Logger.logger.setLevel(logging.WARNING)
+
+    print(f"{'import mode':<24}{'best s':>10}{'mean s':>10}")
+    for mode, code in [("python only", "pass"), ("lazy plotting", IMPORT),
+                       ("eager plotting", IMPORT + EAGER_PLOTTING)]:
+        times = [timed_run(code) for _ in range(args.runs)]
+        print(f"{mode:<24}{min(times):>10.3f}{sum(times) / len(times):>10.3f}")
+
+    data = DataLoader(input_files_path="data").data
+    common_words = CalculateCommonWords(results_dir="", data=data, common_criterion=2)
+    rows = result_rows(common_words._get_common(top_k=args.top_k))
+    print(f"\n{'formats':<24}{'first s':>10}{'mean s':>10}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for formats in [("csv",), ("pdf", "csv"), ("png", "csv")]:
+            times = []
+            for _ in range(args.renders):
+                start = time.perf_counter()
+                render_results(results_dir=temp_dir, file_name="bench", rows=rows,
+                               top_k=args.top_k, criterion=2, formats=formats)
+                times.append(time.perf_counter() - start)
+            print(f"{'+'.join(formats):<24}{times[0]:>10.3f}{sum(times) / len(times):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
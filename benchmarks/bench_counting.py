@@ -0,0 +1,55 @@
+"""
+Benchmark of the counting engines of CalculateCommonWords on the bundled data/doc*.txt corpus
+scaled up with copies of the input files (every copy is a new file), it compares the dict
+engine, one WordCounterDict.__setitem__ for every word, with the numpy engine and checks that
+both of them return the same word_dict. With --workers > 1 the sharded map-reduce counting of
+each engine is measured too.
+usage: python benchmarks/bench_counting.py --scale 20 --workers 4
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.core.common_words import counting_engines, count_words_sharded
+from hash_tag.core.data_loader import DataLoader, FileLine
+from hash_tag.tools.logger import Logger
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=20, help="copies of the corpus")
+    parser.add_argument("--workers", type=int, default=1, help="processes for the shards")
+    parser.add_argument("--shard-size", type=int, default=10000, help="lines of each shard")
+    args = parser.parse_args()
+    Logger.logger.setLevel(logging.WARNING)
+
+    corpus = DataLoader(input_files_path="data").data
+    data = [FileLine(file_line.words, file_line.line, f"{copy}-{file_line.file_name}")
+            for copy in range(args.scale) for file_line in corpus]
+    total_words = sum(len(file_line.words) for file_line in data)
+    print(f"Counting {total_words} words of {len(data)} lines")
+
+    print(f"{'engine':<12}{'seconds':>10}{'words/s':>14}{'speedup':>10}")
+    results = {}
+    for engine, count_words in counting_engines.items():
+        start = time.perf_counter()
+        word_dict = count_words(data)
+        results[engine] = (time.perf_counter() - start, word_dict)
+        if args.workers > 1:
+            start = time.perf_counter()
+            word_dict = count_words_sharded(data, workers=args.workers,
+                                            shard_size=args.shard_size, engine=engine)
+            results[f"{engine} x{args.workers}"] = (time.perf_counter() - start, word_dict)
+    dict_seconds, expected = results["dict"]
+    for engine, (seconds, word_dict) in results.items():
+        assert word_dict.to_json() == expected.to_json(), f"{engine} counted different words"
+        print(f"{engine:<12}{seconds:>10.2f}{total_words / seconds:>14.0f}"
+              f"{dict_seconds / seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark of filter_by_tag on the bundled data/doc*.txt corpus scaled up by repeating it.
+It compares the previous nltk.pos_tag call per line with the batched tagging, the batched
+tagging with the tag cache and the tagging from a process pool, and checks that all of them
+keep the same words.
+usage: python benchmarks/bench_filter_by_tag.py --scale 20 --batch-size 1000 --workers 4
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.core.data_loader import DataLoader, copy_lines
+from hash_tag.core.filters import filter_by_tag
+from hash_tag.tools.cache import LRUCache
+from hash_tag.tools.logger import Logger
+import nltk
+
+
+def filter_by_tag_per_line(data, tags):
+    for line in data:
+        line.words = [tokens[0] for tokens in nltk.pos_tag(line.words) if tokens[1] in tags]
+    return data
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=20, help="copies of the corpus")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--tags", nargs="+", default=["NNS", "NN"])
+    args = parser.parse_args()
+    Logger.logger.setLevel(logging.WARNING)
+
+    corpus = DataLoader(input_files_path="data").data
+    total_lines = len(corpus) * args.scale
+    print(f"Tagging {total_lines} lines ({args.scale} copies of {len(corpus)} lines)")
+
+    def scaled_corpus():
+        return [file_line for _ in range(args.scale) for file_line in copy_lines(corpus)]
+
+    per_line_time, expected = timed(filter_by_tag_per_line, scaled_corpus(), tags=args.tags)
+    batched_time, batched = timed(filter_by_tag, scaled_corpus(), tags=args.tags,
+                                  batch_size=args.batch_size)
+    tag_cache = LRUCache(name="tag cache")
+    cached_time, cached = timed(filter_by_tag, scaled_corpus(), tags=args.tags,
+                                batch_size=args.batch_size, tag_cache=tag_cache)
+    parallel_time, parallel = timed(filter_by_tag, scaled_corpus(), tags=args.tags,
+                                    batch_size=args.batch_size, workers=args.workers)
+    assert batched == expected and cached == expected and parallel == expected, \
+        "Filtered words are different"
+
+    print(f"{'mode':<20}{'seconds':>10}{'lines/s':>12}{'speedup':>10}")
+    for mode, seconds in (("pos_tag per line", per_line_time),
+                          ("batched", batched_time),
+                          ("batched + cache", cached_time),
+                          (f"{args.workers} workers", parallel_time)):
+        print(f"{mode:<20}{seconds:>10.2f}{total_lines / seconds:>12.0f}"
+              f"{per_line_time / seconds:>9.1f}x")
+    print(f"tag cache hit rate: {tag_cache.hit_rate:0.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Benchmark of the startup time of the package, every run imports the modules in a new
+python process. The previous versions called nltk.download for punkt, the tagger and the stop
+words at import time, the "eager download check" mode repeats these calls after the imports to
+show their cost, they need network access or they wait for its timeout.
+usage: python benchmarks/bench_import_time.py --runs 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+IMPORTS = "import hash_tag.core.data_loader, hash_tag.core.filters, hash_tag.core.stem"
+EAGER_DOWNLOADS = "; import nltk; [nltk.download(name, quiet=True) for name in " \
+                  "('punkt', 'averaged_perceptron_tagger', 'stopwords')]"
+
+
+def timed_run(code: str, env: dict) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], env=env, cwd=PACKAGE_PARENT, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--skip-eager", action="store_true",
+                        help="don't run the eager download check mode")
+    args = parser.parse_args()
+    env = dict(os.environ, HASH_TAG_OFFLINE="1")
+
+    modes = [("python only", "pass"), ("lazy resources", IMPORTS)]
+    if not args.skip_eager:
+        modes.append(("eager download check", IMPORTS + EAGER_DOWNLOADS))
+    print(f"{'mode':<24}{'best s':>10}{'mean s':>10}")
+    for mode, code in modes:
+        times = [timed_run(code, env) for _ in range(args.runs)]
+        print(f"{mode:<24}{min(times):>10.3f}{sum(times) / len(times):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
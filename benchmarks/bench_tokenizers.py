@@ -0,0 +1,66 @@
+"""
+Benchmark of the tokenizers of core/tokenizers.py on the bundled data/doc*.txt corpus scaled up
+by repeating it. It compares the throughput of the nltk tokenizer (punkt and word_tokenize)
+with the compiled regex one and the agreement of their alphabetic words, the only words which
+are kept after filter_punctuation.
+usage: python benchmarks/bench_tokenizers.py --scale 20
+"""
+import argparse
+import collections
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.core.data_loader import DataLoader
+from hash_tag.core.tokenizers import tokenizers
+from hash_tag.tools.logger import Logger
+
+
+def alphabetic_words(tokenize, line: str) -> list:
+    return [word for words, _ in tokenize(line) for word in words if word.isalpha()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=20, help="copies of the corpus")
+    args = parser.parse_args()
+    Logger.logger.setLevel(logging.WARNING)
+
+    data_loader = DataLoader(input_files_path="data")
+    lines = [line for line, _ in data_loader._file_generator(data_loader._files_to_parse)]
+    print(f"Tokenizing {len(lines) * args.scale} lines ({args.scale} copies of {len(lines)})")
+
+    print(f"{'tokenizer':<12}{'seconds':>10}{'lines/s':>12}{'tokens':>10}")
+    results = {}
+    for name, tokenize in tokenizers.items():
+        try:
+            start = time.perf_counter()
+            total_tokens = sum(len(words) for _ in range(args.scale) for line in lines
+                               for words, _ in tokenize(line))
+            seconds = time.perf_counter() - start
+        except LookupError:
+            print(f"{name:<12} is not available, its nltk data are missing")
+            continue
+        results[name] = [alphabetic_words(tokenize, line) for line in lines]
+        print(f"{name:<12}{seconds:>10.2f}{len(lines) * args.scale / seconds:>12.0f}"
+              f"{total_tokens:>10}")
+
+    if "nltk" in results and "regex" in results:
+        same_lines = common = nltk_total = regex_total = 0
+        for nltk_words, regex_words in zip(results["nltk"], results["regex"]):
+            same_lines += nltk_words == regex_words
+            nltk_counter = collections.Counter(nltk_words)
+            regex_counter = collections.Counter(regex_words)
+            common += sum((nltk_counter & regex_counter).values())
+            nltk_total += len(nltk_words)
+            regex_total += len(regex_words)
+        print(f"lines with the same alphabetic words: {same_lines / len(lines):0.2%}")
+        print(f"alphabetic words recall: {common / nltk_total:0.2%}, "
+              f"precision: {common / regex_total:0.2%}")
+
+
+if __name__ == "__main__":
+    main()
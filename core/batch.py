@@ -0,0 +1,169 @@
+from hash_tag.core.common_words import CalculateCommonWords
+from hash_tag.core.data_loader import DataLoader
+from hash_tag.core.stage_cache import StageCache
+from hash_tag.core.stages import make_stage, run_fused, supported_stages
+from hash_tag.tools.helpers import checkpoint_writer
+from hash_tag.tools.logger import Logger
+from hash_tag.tools import metrics
+from typing import List, Tuple
+import dataclasses
+import json
+import os
+import time
+
+
+@dataclasses.dataclass
+class BatchConfig:
+    """
+    The whole configuration of a batch run, the same settings as the HastTagApp shell
+    stages: the names of the stages (see core/stages.supported_stages) in the order they are
+    applied in the parsed data
+    show: opens the plot window at the end, False only saves the files of the results
+    formats: the files of the results, e.g. ["csv"] without the chart, see render_results
+    use_stage_cache: reuse the longest cached prefix of the stages, see core/stage_cache.py
+    metrics: write the run report of tools/metrics.py next to the results, metrics_memory adds
+    the tracemalloc peaks and profile_dir the cProfile stats of every step
+    """
+    input_files_path: str = "data"
+    saves_folder_name: str = "saves"
+    results_folder_name: str = "results"
+    stages: List[str] = dataclasses.field(default_factory=lambda: [
+        "filter_punctuation", "filter_stop_words", "filter_by_tag", "stem"])
+    vocabulary: str = "english"
+    stemmer: str = "lancaster"
+    tags: List[str] = dataclasses.field(default_factory=lambda: ["NNS", "NN"])
+    criterion: int = 6
+    top_k: int = 10
+    workers: int = 1
+    tokenizer: str = "nltk"
+    engine: str = "dict"
+    results_file_name: str = "results"
+    formats: List[str] = dataclasses.field(default_factory=lambda: ["pdf", "csv"])
+    use_stage_cache: bool = True
+    show: bool = False
+    debug: bool = False
+    metrics: bool = False
+    metrics_memory: bool = False
+    profile_dir: str = None
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "BatchConfig":
+        """
+        :raise: ValueError in case of an unknown setting
+        """
+        fields = {field.name for field in dataclasses.fields(cls)}
+        unknown = sorted(set(values) - fields)
+        if unknown:
+            raise ValueError(f"Unknown batch settings: {unknown}, supported: {sorted(fields)}")
+        return cls(**values)
+
+    def stage_list(self) -> List[Tuple[str, dict]]:
+        """
+        Returns the stages as (name, parameters) like the HastTagApp.stages
+        :raise: ValueError in case of an unknown stage
+        """
+        stages = []
+        for name in self.stages:
+            if name not in supported_stages:
+                raise ValueError(f"Unknown stage: {name}, supported: {list(supported_stages)}")
+            stages.append(make_stage(name, vocabulary=self.vocabulary, tags=self.tags,
+                                     stemmer=self.stemmer))
+        return stages
+
+
+@dataclasses.dataclass
+class BatchResult:
+    """
+    a struct like class with the results of a batch run
+    common: the top_k (word, counter, number of files)
+    timings: the seconds of each step: parse, every applied stage, all the stages, count,
+    results and total
+    files: the files of the results and the reports in the results dir
+    """
+    common: List[tuple]
+    timings: dict
+    files: List[str]
+
+    def to_json(self) -> dict:
+        return {"common": [{"word": word, "counter": counter, "files": files}
+                           for word, counter, files in self.common],
+                "timings": self.timings,
+                "files": self.files}
+
+
+def run_batch(config: BatchConfig) -> BatchResult:
+    """
+    Runs the whole pipeline without any interaction: parse -> stages -> count -> results and
+    writes a json report with the configuration, the common words and the timings next to the
+    files of the results. The settings of tools/metrics.py are restored after the run.
+    :raise: ValueError in case of an unknown stage or nothing is found for the top_k and the
+    criterion, IOError in case a checkpoint failed to be written
+    """
+    previous = dict(metrics.settings)
+    try:
+        return _run_batch(config)
+    finally:
+        metrics.configure(enabled=previous["enabled"], memory=previous["memory"],
+                          profile_dir=previous["profile_dir"] or "")
+
+
+def _run_batch(config: BatchConfig) -> BatchResult:
+    stages = config.stage_list()
+    if config.metrics:
+        metrics.configure(enabled=True, memory=config.metrics_memory,
+                          profile_dir=config.profile_dir or "")
+        metrics.reset()
+    timings = {}
+    run_start = start = time.perf_counter()
+    data_loader = DataLoader(input_files_path=config.input_files_path,
+                             saves_folder_name=config.saves_folder_name,
+                             results_folder_name=config.results_folder_name,
+                             workers=config.workers, tokenizer=config.tokenizer)
+    os.makedirs(data_loader.results_dir, exist_ok=True)
+    data = data_loader.data
+    timings["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if config.use_stage_cache:
+        stage_cache = StageCache(os.path.join(data_loader.saves_dir, "stage_cache"))
+        data = stage_cache.run(data, stages, fingerprint=data_loader.fingerprint,
+                               timings=timings, workers=config.workers)
+    else:
+        data = run_fused(data, stages, timings=timings, workers=config.workers)
+    # with the cached stages too, they are not in the timings of the applied stages
+    timings["stages"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    common_words = CalculateCommonWords(results_dir=data_loader.results_dir, data=data,
+                                        common_criterion=config.criterion, debug=config.debug,
+                                        engine=config.engine, workers=config.workers)
+    timings["count"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        results = common_words.show_common(top_k=config.top_k,
+                                           file_name=config.results_file_name,
+                                           show=config.show, formats=config.formats)
+    except StopIteration:
+        raise ValueError(f"Nothing found for top_k={config.top_k} and "
+                         f"criterion={config.criterion}")
+    timings["results"] = time.perf_counter() - start
+    checkpoint_writer.wait()
+    timings["total"] = time.perf_counter() - run_start
+
+    # the same name as the files of show_common
+    file_name = os.path.join(data_loader.results_dir,
+                             f"{config.results_file_name}-topk={config.top_k}-"
+                             f"criterion={config.criterion}")
+    result = BatchResult(common=[(word, occurrences.counter, len(occurrences.file_ids))
+                                 for word, occurrences in results],
+                         timings=timings,
+                         files=[f"{file_name}.{output}" for output in config.formats] +
+                               [f"{file_name}.report.json"])
+    with open(f"{file_name}.report.json", "w", encoding="utf-8") as f:
+        json.dump({"config": dataclasses.asdict(config), **result.to_json()}, f, indent=2)
+    if config.metrics:
+        result.files.append(metrics.write_report(f"{file_name}.metrics.json"))
+    for step, seconds in timings.items():
+        Logger.logger.info(f"Batch step: {step} took {seconds:0.2f}s")
+    return result
@@ -0,0 +1,349 @@
+from hash_tag.tools.logger import Logger
+from array import array
+from collections.abc import Sequence
+from typing import Iterable, Tuple
+import bisect
+import mmap
+import os
+import struct
+import sys
+import weakref
+
+# The columnar format of a list of FileLine objects, all the numbers are little endian:
+# header: magic, number of lines, number of tokens, number of unique words, lines and files and
+# the size of the utf-8 blob of each string table, then the sections, each one starts at a
+# multiple of 8 bytes:
+#   token offsets: uint64[lines + 1], the tokens of line i are tokens[offsets[i]:offsets[i + 1]]
+#   tokens: uint32[tokens], the ids of the words of all the lines in one flat buffer
+#   line ids: uint32[lines], the id of the line string of each FileLine
+#   file ids: uint32[lines], the id of the file name of each FileLine
+#   words, lines, files string tables: uint64[strings + 1] offsets and the utf-8 blob
+_MAGIC = b"HTCOL001"
+_HEADER = struct.Struct("<8s8Q")
+
+
+def _padding(size: int) -> int:
+    return -size % 8
+
+
+def _native(numbers: array) -> bytes:
+    if sys.byteorder != "little":
+        numbers = array(numbers.typecode, numbers)
+        numbers.byteswap()
+    return numbers.tobytes()
+
+
+class _StringTable:
+    def __init__(self):
+        self.ids = {}
+        self.blob = bytearray()
+        self.offsets = array("Q", [0])
+
+    def intern(self, string: str) -> int:
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = self.ids[string] = len(self.ids)
+            self.blob += string.encode("utf-8")
+            self.offsets.append(len(self.blob))
+        return string_id
+
+
+def encode_lines(data: Iterable) -> bytes:
+    """
+    Returns the columnar format of the FileLine objects, see ColumnarLines
+    """
+    words, lines, files = _StringTable(), _StringTable(), _StringTable()
+    token_offsets = array("Q", [0])
+    tokens = array("I")
+    line_ids = array("I")
+    file_ids = array("I")
+    word_intern = words.intern
+    for file_line in data:
+        tokens.extend([word_intern(word) for word in file_line.words])
+        token_offsets.append(len(tokens))
+        line_ids.append(lines.intern(file_line.line))
+        file_ids.append(files.intern(file_line.file_name))
+    sections = [_native(token_offsets), _native(tokens), _native(line_ids), _native(file_ids)]
+    for table in (words, lines, files):
+        sections.extend((_native(table.offsets), bytes(table.blob)))
+    header = _HEADER.pack(_MAGIC, len(line_ids), len(tokens), len(words.ids), len(lines.ids),
+                          len(files.ids), len(words.blob), len(lines.blob), len(files.blob))
+    return b"".join(section + b"\0" * _padding(len(section))
+                    for section in [header] + sections)
+
+
+class _Segment:
+    """
+    The memoryviews of the sections of one buffer in the columnar format, the strings are
+    decoded only when they are requested and each one only once.
+    """
+
+    def __init__(self, buffer, start: int = 0, size: int = None):
+        """
+        :param start: the position of the columnar format in the buffer
+        :param size: the size of the columnar format, default until the end of the buffer
+        """
+        view = memoryview(buffer)
+        if start or size is not None:
+            view = view[start:len(view) if size is None else start + size]
+        self._buffer = buffer
+        self._views = [view]
+        magic, *counts = _HEADER.unpack_from(view)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError("Not a columnar lines buffer")
+        if sys.byteorder != "little":
+            self.close()
+            raise ValueError("The columnar lines can be read only in little endian machines")
+        total_lines, total_tokens, total_words, total_strings, total_files, *blob_sizes = counts
+        self._position = _HEADER.size + _padding(_HEADER.size)
+        self.token_offsets = self._section(view, "Q", total_lines + 1)
+        self.tokens = self._section(view, "I", total_tokens)
+        self.line_ids = self._section(view, "I", total_lines)
+        self.file_ids = self._section(view, "I", total_lines)
+        self.tables = []
+        for total, blob_size in zip((total_words, total_strings, total_files), blob_sizes):
+            offsets = self._section(view, "Q", total + 1)
+            blob = self._section(view, "B", blob_size)
+            self.tables.append((offsets, blob, [None] * total))
+        self.words, self.lines, self.files = [table[2] for table in self.tables]
+
+    def _section(self, view: memoryview, typecode: str, total: int) -> memoryview:
+        size = struct.calcsize(typecode) * total
+        section = view[self._position:self._position + size].cast(typecode)
+        self._views.append(section)
+        self._position += size + _padding(size)
+        return section
+
+    @property
+    def buffer(self) -> memoryview:
+        # the columnar format of this segment
+        return self._views[0]
+
+    def close(self) -> None:
+        """
+        Releases the memoryviews and closes the memory mapped buffer, the segment can't be
+        used after it
+        """
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if isinstance(self._buffer, mmap.mmap):
+            try:
+                self._buffer.close()
+            except BufferError:
+                # the other segments of the same file still use the mapping, the last one
+                # closes it
+                pass
+        self._buffer = None
+
+    def detach(self) -> None:
+        """
+        Copies the columnar format in memory and closes the memory mapped buffer, so the
+        file can be replaced or removed, the decoded strings are kept
+        """
+        if not self._views:
+            return
+        strings = [table[2] for table in self.tables]
+        buffer = bytes(self._views[0])
+        self.close()
+        self.__init__(buffer)
+        self.tables = [(offsets, blob, decoded)
+                       for (offsets, blob, _), decoded in zip(self.tables, strings)]
+        self.words, self.lines, self.files = strings
+
+    def __len__(self):
+        return len(self.line_ids)
+
+    def string(self, table: int, string_id: int) -> str:
+        offsets, blob, strings = self.tables[table]
+        string = strings[string_id]
+        if string is None:
+            string = strings[string_id] = str(blob[offsets[string_id]:offsets[string_id + 1]],
+                                              "utf-8")
+        return string
+
+    def words_of(self, index: int) -> list:
+        words = self.words
+        string = self.string
+        return [words[word_id] if words[word_id] is not None else string(0, word_id)
+                for word_id in self.tokens[self.token_offsets[index]:
+                                           self.token_offsets[index + 1]]]
+
+
+class ColumnarLines(Sequence):
+    """
+    A read only sequence of FileLine objects over one or more buffers in the columnar format
+    (bytes or a mmap), a FileLine object is created only when it is accessed and then it is
+    kept, so the filters can change its words in place like in a list.
+    view() returns a new sequence with the original FileLine objects of the buffers, without
+    copying them, and it is pickled as a plain list.
+    """
+
+    def __init__(self, buffers: Iterable = ()):
+        self._segments = [buffer if isinstance(buffer, _Segment) else _Segment(buffer)
+                          for buffer in buffers]
+        self._starts = []
+        total = 0
+        for segment in self._segments:
+            self._starts.append(total)
+            total += len(segment)
+        self._total = total
+        self._lines = {}
+
+    @classmethod
+    def concat(cls, sequences: Iterable["ColumnarLines"]) -> "ColumnarLines":
+        return cls([segment for sequence in sequences for segment in sequence._segments])
+
+    def view(self) -> "ColumnarLines":
+        return ColumnarLines(self._segments)
+
+    def split(self) -> list:
+        """
+        Returns a view for each buffer of the sequence
+        """
+        return [ColumnarLines([segment]) for segment in self._segments]
+
+    def buffers(self) -> list:
+        """
+        Returns the columnar format of each buffer of the sequence, without the changes of the
+        accessed lines
+        """
+        return [segment.buffer for segment in self._segments]
+
+    def snapshot(self) -> tuple:
+        """
+        Returns a copy which the next changes of the lines can't affect, without decoding the
+        lines: the columnar format of each buffer and the accessed lines as
+        {index: (words, line, file_name)}, see from_snapshot
+        """
+        return ([bytes(buffer) for buffer in self.buffers()],
+                {index: (file_line.words[:], file_line.line, file_line.file_name)
+                 for index, file_line in self._lines.items()})
+
+    @classmethod
+    def from_snapshot(cls, buffers: list, lines: dict) -> "ColumnarLines":
+        from hash_tag.core.data_loader import FileLine
+        sequence = cls(buffers)
+        sequence._lines = {index: FileLine(words=words, line=line, file_name=file_name)
+                           for index, (words, line, file_name) in lines.items()}
+        return sequence
+
+    def __len__(self):
+        return self._total
+
+    @property
+    def total_tokens(self) -> int:
+        """
+        The number of words of all the lines without creating the FileLine objects, the lines
+        which were accessed (and maybe changed from the filters) are counted from their objects
+        """
+        total = sum(len(segment.tokens) for segment in self._segments)
+        for index, file_line in self._lines.items():
+            position = bisect.bisect_right(self._starts, index) - 1
+            offsets = self._segments[position].token_offsets
+            index -= self._starts[position]
+            total += len(file_line.words) - (offsets[index + 1] - offsets[index])
+        return total
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(self._total))]
+        if index < 0:
+            index += self._total
+        if not 0 <= index < self._total:
+            raise IndexError("ColumnarLines index out of range")
+        file_line = self._lines.get(index)
+        if file_line is None:
+            file_line = self._lines[index] = self._decode(index)
+        return file_line
+
+    def __iter__(self):
+        for index in range(self._total):
+            yield self[index]
+
+    def _decode(self, index: int):
+        # imported here because the data_loader uses this module
+        from hash_tag.core.data_loader import FileLine
+        position = bisect.bisect_right(self._starts, index) - 1
+        segment = self._segments[position]
+        index -= self._starts[position]
+        return FileLine(words=segment.words_of(index),
+                        line=segment.string(1, segment.line_ids[index]),
+                        file_name=segment.string(2, segment.file_ids[index]))
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, ColumnarLines)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._total} lines, {len(self._lines)} loaded)"
+
+    def close(self) -> None:
+        """
+        Closes the memory mapped buffers, the lines which were accessed stay valid but the
+        rest of the lines of this sequence and of its views can't be accessed after it
+        """
+        for segment in self._segments:
+            segment.close()
+
+    def __enter__(self) -> "ColumnarLines":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+# the segments over each memory mapped file by its real path, see release
+_mapped_segments = {}
+
+
+def release(file_path: str) -> None:
+    """
+    Copies in memory the live sequences of read_lines over the file and closes its mapping,
+    it must be called before the file is replaced or removed, a mapped file can't be
+    replaced or removed in windows
+    """
+    segments = _mapped_segments.pop(os.path.realpath(file_path), ())
+    for segment in list(segments):
+        segment.detach()
+
+
+def write_lines(file_path: str, data: Iterable) -> None:
+    """
+    Writes the FileLine objects in the columnar format at file_path.lines, the file is
+    replaced atomically and the previous one is released because it can be memory mapped
+    from a previous read_lines.
+    """
+    Logger.logger.debug(f"Creating columnar checkpoint at: {file_path}")
+    temp_path = f"{file_path}.lines.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(encode_lines(data))
+    release(f"{file_path}.lines")
+    os.replace(temp_path, f"{file_path}.lines")
+
+
+def read_lines(file_path: str, ranges: Iterable[Tuple[int, int]] = None) -> ColumnarLines:
+    """
+    Memory maps the columnar file, only the pages of the accessed lines are read.
+    The mapping is closed from ColumnarLines.close or from release.
+    :param ranges: (start, size) of each columnar format in the file when it contains more than
+    one, default the whole file is one
+    :raise: FileNotFoundError in case the file doesn't exist
+    """
+    Logger.logger.debug(f"Mapping columnar checkpoint from: {file_path}")
+    with open(file_path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return ColumnarLines()
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    ranges = [(0, None)] if ranges is None else list(ranges)
+    if not ranges:
+        buffer.close()
+        return ColumnarLines()
+    segments = [_Segment(buffer, start, size) for start, size in ranges]
+    _mapped_segments.setdefault(os.path.realpath(file_path), weakref.WeakSet()).update(segments)
+    return ColumnarLines(segments)
@@ -1,77 +1,508 @@
 from hash_tag.core.data_loader import FileLine
-from hash_tag.tools.helpers import write_json
-from hash_tag.tools.logger import logged
-from typing import List, Generator
+from hash_tag.tools.helpers import write_json, chunked
+from hash_tag.tools.logger import Logger, logged
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Generator, Callable, Dict, Tuple
+from array import array
+import collections
+import heapq
+import csv
+import itertools
 import os
-import dataclasses
-import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
+
+# numpy, pandas and matplotlib are imported only in the functions which use them, the import of
+# this module doesn't pay their startup cost when only the words are counted
+
+
+class StringTable:
+    """
+    Interns strings, each unique string is stored once and it is referenced from its
+    integer id, the ids are given in insertion order.
+    """
+
+    def __init__(self):
+        self.strings = []
+        self._ids = {}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, string_id: int) -> str:
+        return self.strings[string_id]
+
+    def intern(self, string: str) -> int:
+        string_id = self._ids.get(string)
+        if string_id is None:
+            string_id = self._ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def compacted(self, live_ids: Iterable[int]) -> Tuple["StringTable", list]:
+        """
+        Returns a new table with only the strings of live_ids in the same relative order and
+        the map old id -> new id, None for the dropped strings. This table is not changed, so
+        the objects which still reference it stay valid.
+        """
+        live_ids = set(live_ids)
+        table = StringTable()
+        id_map = [table.intern(string) if string_id in live_ids else None
+                  for string_id, string in enumerate(self.strings)]
+        return table, id_map
+
+
+class UniqueIds(array):
+    """
+    An array of unsigned integer ids which keeps only the first occurrence of each id in
+    insertion order. The last id is checked first, an id which is known to be new is appended
+    without any check and for the rest a companion set is built once and kept up to date,
+    so each add costs O(1). The set is not pickled, only the ids.
+    """
+    __slots__ = ("_members",)
+
+    def __new__(cls, ids: Iterable = ()):
+        return super(UniqueIds, cls).__new__(cls, "I", ids)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._member_set()
+
+    def _member_set(self) -> set:
+        members = getattr(self, "_members", None)
+        if members is None or len(members) != len(self):
+            # built once, or again after a change which didn't use add
+            members = self._members = set(self)
+        return members
+
+    def __copy__(self) -> "UniqueIds":
+        return UniqueIds(self)
+
+    def __deepcopy__(self, memo: dict) -> "UniqueIds":
+        return UniqueIds(self)
+
+    def add(self, item_id: int, is_new: bool = False) -> bool:
+        """
+        Appends the id if it is not in the array and returns True if it was appended
+        :param is_new: the caller knows that the id can't be in the array yet
+        """
+        if self and self[-1] == item_id:
+            return False
+        members = getattr(self, "_members", None)
+        if not is_new:
+            members = self._member_set()
+            if item_id in members:
+                return False
+        self.append(item_id)
+        if members is not None:
+            members.add(item_id)
+        return True
 
 
-@dataclasses.dataclass
 class WordOccurrence:
     """
     Helper class for handling the data in a more structured way, It is used mainly at
     WordCounterDict.
     counter: integer where we track the number of word occurrences
-    line: the corresponding line
-    file_name: the corresponding file name
+    line_ids: UniqueIds of the corresponding unique lines in the line table
+    file_ids: UniqueIds of the corresponding unique file names in the file table
+    The lines and file_names are resolved from the tables only when they are requested.
     """
-    counter: int
-    lines: list
-    file_names: list
+    __slots__ = ("counter", "line_ids", "file_ids", "_line_table", "_file_table")
+
+    def __init__(self, counter: int, line_ids: UniqueIds, file_ids: UniqueIds,
+                 line_table: StringTable, file_table: StringTable):
+        self.counter = counter
+        self.line_ids = line_ids
+        self.file_ids = file_ids
+        self._line_table = line_table
+        self._file_table = file_table
+
+    @property
+    def lines(self) -> list:
+        return [self._line_table[line_id] for line_id in self.line_ids]
+
+    @property
+    def file_names(self) -> list:
+        return [self._file_table[file_id] for file_id in self.file_ids]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, WordOccurrence):
+            return NotImplemented
+        return (self.counter, self.lines, self.file_names) == \
+               (other.counter, other.lines, other.file_names)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(counter={self.counter}, lines={self.lines}, " \
+               f"file_names={self.file_names})"
 
 
 class WordCounterDict(dict):
     """
     A custom dict to be able to count all the words in all lines in all input files
     The format of the dict it will be like {"word_token" : WordOccurrence)
+    All the occurrences share one line table and one file table, so each line and file name
+    is stored once and the occurrences keep only their integer ids.
     """
 
-    def __init__(self):
+    def __init__(self, line_table: StringTable = None, file_table: StringTable = None):
         super(WordCounterDict, self).__init__()
+        self.line_table = line_table if line_table is not None else StringTable()
+        self.file_table = file_table if file_table is not None else StringTable()
+        self._last_line = None
+        self._last_line_id = None
+        self._last_line_is_new = False
+        self._last_file = None
+        self._last_file_id = None
+        self._last_file_is_new = False
 
     def __setitem__(self, key: str, file_line: FileLine):
+        if file_line.line is not self._last_line:
+            # a new line, intern it once for all of its words
+            total_lines = len(self.line_table)
+            self._last_line = file_line.line
+            self._last_line_id = self.line_table.intern(file_line.line)
+            self._last_line_is_new = len(self.line_table) > total_lines
+        if file_line.file_name is not self._last_file:
+            total_files = len(self.file_table)
+            self._last_file = file_line.file_name
+            self._last_file_id = self.file_table.intern(file_line.file_name)
+            self._last_file_is_new = len(self.file_table) > total_files
+        line_id, file_id = self._last_line_id, self._last_file_id
         if key not in self:
             dict.__setitem__(self, key, WordOccurrence(counter=1,
-                                                       lines=[file_line.line],
-                                                       file_names=[file_line.file_name]))
+                                                       line_ids=UniqueIds([line_id]),
+                                                       file_ids=UniqueIds([file_id]),
+                                                       line_table=self.line_table,
+                                                       file_table=self.file_table))
         else:
             # case where we have already seen this words we increase the counter only in
-            # different lines
+            # different lines, a line or file which is seen for the first time is appended
+            # without a check and the rest are checked in O(1) from the UniqueIds
             word_occurrence = self.__getitem__(key)
-            if file_line.file_name not in word_occurrence.file_names:
-                # same word different file
-                word_occurrence.file_names.append(file_line.file_name)
-            if file_line.line not in word_occurrence.lines:
+            # same word different file
+            word_occurrence.file_ids.add(file_id, is_new=self._last_file_is_new)
+            if word_occurrence.line_ids.add(line_id, is_new=self._last_line_is_new):
                 # same word different line
                 # update the counter
-                word_occurrence.lines.append(file_line.line)
                 word_occurrence.counter += 1
 
-            dict.__setitem__(self, key, word_occurrence)
+    def filtered(self, predicate: Callable) -> "WordCounterDict":
+        """
+        Returns a new WordCounterDict with the same tables and only the words where
+        predicate(WordOccurrence) is True
+        """
+        word_dict = WordCounterDict(line_table=self.line_table, file_table=self.file_table)
+        for word, occurrences in self.items():
+            if predicate(occurrences):
+                dict.__setitem__(word_dict, word, occurrences)
+        return word_dict
+
+    def __reduce__(self):
+        return _restore_word_counter, (self.line_table, self.file_table, list(self.items()))
+
+    def json_sections(self) -> list:
+        """
+        Same as to_json but the words are generated one by one for the streaming write_json
+        """
+        words = ((word, {"counter": occurrences.counter,
+                         "lines": occurrences.line_ids.tolist(),
+                         "file_names": occurrences.file_ids.tolist()})
+                 for word, occurrences in self.items())
+        return [("data", words, True),
+                ("lines", self.line_table.strings, False),
+                ("file_names", self.file_table.strings, False)]
+
+    def to_json(self) -> dict:
+        """
+        Returns a json friendly dict where the occurrences reference the lines and the files
+        from the tables with their ids.
+        """
+        return {"data": {word: {"counter": occurrences.counter,
+                                "lines": occurrences.line_ids.tolist(),
+                                "file_names": occurrences.file_ids.tolist()}
+                         for word, occurrences in self.items()},
+                "lines": self.line_table.strings,
+                "file_names": self.file_table.strings}
+
+
+def _restore_word_counter(line_table: StringTable, file_table: StringTable,
+                          items: list) -> WordCounterDict:
+    """
+    Unpickle helper of the WordCounterDict, the items are added without counting them again
+    """
+    word_dict = WordCounterDict(line_table=line_table, file_table=file_table)
+    for word, occurrences in items:
+        dict.__setitem__(word_dict, word, occurrences)
+    return word_dict
+
+
+def count_words(data: Iterable[FileLine], line_table: StringTable = None,
+                file_table: StringTable = None) -> WordCounterDict:
+    """
+    The dict counting engine, every word of every line is added in a WordCounterDict
+    """
+    word_dict = WordCounterDict(line_table=line_table, file_table=file_table)
+    for line in data:
+        for word_tokens in line.words:
+            word_dict[word_tokens] = line
+    return word_dict
+
+
+def _first_unique(word_ids: "numpy.ndarray", value_ids: "numpy.ndarray", total_values: int,
+                  total_words: int) -> tuple:
+    """
+    Returns the unique values of each word in the order of their first occurrence as one
+    array, where the values of the word i are values[offsets[i]:offsets[i + 1]], and the
+    offsets.
+    """
+    import numpy as np
+    _, first = np.unique(word_ids * total_values + value_ids, return_index=True)
+    pair_words = word_ids[first]
+    order = np.lexsort((first, pair_words))
+    values = value_ids[first][order].astype(np.uint32)
+    offsets = np.zeros(total_words + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pair_words, minlength=total_words), out=offsets[1:])
+    return values, offsets
+
+
+def count_words_numpy(data: Iterable[FileLine], line_table: StringTable = None,
+                      file_table: StringTable = None) -> WordCounterDict:
+    """
+    The numpy counting engine, the words are turned to integer ids and the unique lines and
+    files of each word are found with numpy for all the (word, line, file) ids at once.
+    The result is the same as count_words, the words keep the order of their first occurrence
+    and the lines and the files of each word too.
+    """
+    word_dict = WordCounterDict(line_table=line_table, file_table=file_table)
+    line_table, file_table = word_dict.line_table, word_dict.file_table
+    vocabulary = {}
+    word_ids, lengths, line_ids, file_ids = [], [], [], []
+    for line in data:
+        if not line.words:
+            # like count_words, the lines without words are not added in the tables
+            continue
+        word_ids.extend([vocabulary.setdefault(word, len(vocabulary)) for word in line.words])
+        lengths.append(len(line.words))
+        line_ids.append(line_table.intern(line.line))
+        file_ids.append(file_table.intern(line.file_name))
+    if not vocabulary:
+        return word_dict
+    import numpy as np
+    word_ids = np.array(word_ids, dtype=np.int64)
+    lengths = np.array(lengths, dtype=np.int64)
+    token_lines = np.repeat(np.array(line_ids, dtype=np.int64), lengths)
+    token_files = np.repeat(np.array(file_ids, dtype=np.int64), lengths)
+    lines, line_offsets = _first_unique(word_ids, token_lines, len(line_table), len(vocabulary))
+    files, file_offsets = _first_unique(word_ids, token_files, len(file_table), len(vocabulary))
+    line_offsets, file_offsets = line_offsets.tolist(), file_offsets.tolist()
+    for word_id, word in enumerate(vocabulary):
+        word_lines = UniqueIds()
+        word_lines.frombytes(lines[line_offsets[word_id]:line_offsets[word_id + 1]].tobytes())
+        word_files = UniqueIds()
+        word_files.frombytes(files[file_offsets[word_id]:file_offsets[word_id + 1]].tobytes())
+        dict.__setitem__(word_dict, word, WordOccurrence(counter=len(word_lines),
+                                                         line_ids=word_lines,
+                                                         file_ids=word_files,
+                                                         line_table=line_table,
+                                                         file_table=file_table))
+    return word_dict
+
+
+# the counting engines of CalculateCommonWords and WordIndex
+counting_engines = {"dict": count_words, "numpy": count_words_numpy}
+
+
+def merge_counts(word_dict: WordCounterDict, partial: WordCounterDict) -> WordCounterDict:
+    """
+    Merges the partial counts of the lines after the lines of word_dict, the partial has its
+    own tables so its ids are mapped once to the ids of word_dict and then the lines and files
+    of each word are merged, the cost depends on the words and their unique lines, not on the
+    occurrences of the words. The lines which are new in word_dict can't be in the lines of
+    any word yet, only the lines which were seen before are searched.
+    The result is the same as counting the lines of word_dict and partial together.
+    """
+    line_table, file_table = word_dict.line_table, word_dict.file_table
+    first_new_line_id = len(line_table)
+    line_map = [line_table.intern(line) for line in partial.line_table.strings]
+    file_map = [file_table.intern(file_name) for file_name in partial.file_table.strings]
+    for word, occurrences in partial.items():
+        line_ids = UniqueIds([line_map[line_id] for line_id in occurrences.line_ids])
+        file_ids = UniqueIds([file_map[file_id] for file_id in occurrences.file_ids])
+        word_occurrence = dict.get(word_dict, word)
+        if word_occurrence is None:
+            dict.__setitem__(word_dict, word, WordOccurrence(counter=len(line_ids),
+                                                             line_ids=line_ids,
+                                                             file_ids=file_ids,
+                                                             line_table=line_table,
+                                                             file_table=file_table))
+            continue
+        for line_id in line_ids:
+            word_occurrence.line_ids.add(line_id, is_new=line_id >= first_new_line_id)
+        for file_id in file_ids:
+            word_occurrence.file_ids.add(file_id)
+        word_occurrence.counter = len(word_occurrence.line_ids)
+    return word_dict
+
+
+def _count_shard(shard: list, engine: str) -> WordCounterDict:
+    """
+    The map step of count_words_sharded, it runs in the worker processes
+    """
+    return counting_engines[engine](shard)
+
+
+def count_words_sharded(data: Iterable[FileLine], workers: int, shard_size: int = 10000,
+                        engine: str = "dict") -> WordCounterDict:
+    """
+    Map-reduce counting: the data are split in shards of shard_size consecutive lines, every
+    shard is counted from a worker process in a partial WordCounterDict and the partials are
+    merged with merge_counts in the order of the shards, so the words, their lines and files
+    are in the same order as the single process count_words.
+    The shards are submitted in a bounded window ahead of the reduce, so the data can be a
+    generator and only a few shards are in memory.
+    """
+    word_dict = WordCounterDict()
+    Logger.logger.debug(f"Counting the words with {workers} workers")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for shard in chunked(data, shard_size):
+            pending.append(executor.submit(_count_shard, shard, engine))
+            if len(pending) >= 2 * workers:
+                merge_counts(word_dict, pending.popleft().result())
+        while pending:
+            merge_counts(word_dict, pending.popleft().result())
+    return word_dict
+
+
+def result_rows(results: Iterable[tuple]) -> list:
+    """
+    Returns the (word, counter, lines, documents) rows of the (word, WordOccurrence) results,
+    plain data which can be sent to render_results in another process
+    """
+    return [(word, occurrences.counter, occurrences.lines, occurrences.file_names)
+            for word, occurrences in results]
+
+
+# the output formats of render_results, the charts and the tables of the results
+chart_formats = ("pdf", "png", "svg")
+table_formats = ("csv", "parquet")
+
+
+def render_results(results_dir: str, file_name: str, rows: list, top_k: int, criterion: int,
+                   show: bool = False, formats: Iterable[str] = ("pdf", "csv"),
+                   dpi: int = 200) -> str:
+    """
+    Saves the bar plot and the table of the rows of the results in the requested formats,
+    see result_rows, without any chart format the matplotlib is not even imported.
+    The chart is drawn on a matplotlib Figure without pyplot, so it works without a display
+    and from worker processes, pyplot is used only to show it.
+    :param show: open the plot window too, only in the main process
+    :param formats: any of the chart_formats and the table_formats
+    :param dpi: the resolution of the png, the pdf and svg are vector formats
+    :return: the path of the files without the extension
+    :raise: ValueError in case of an unknown format or parquet without pyarrow or fastparquet
+    """
+    formats = list(formats)
+    unknown = [output for output in formats if output not in chart_formats + table_formats]
+    if unknown:
+        raise ValueError(f"Unknown result formats: {unknown}, "
+                         f"supported: {list(chart_formats + table_formats)}")
+    # create for each data a list
+    words = [row[0] for row in rows]
+    occurrences = [row[1] for row in rows]
+    # create the final file_name
+    file_path = os.path.join(results_dir, f"{file_name}-topk={top_k}-criterion={criterion}")
+
+    charts = [output for output in formats if output in chart_formats]
+    if charts or show:
+        # Create a figure for the bar plot
+        if show:
+            import matplotlib.pyplot as plt
+            f = plt.figure()
+        else:
+            from matplotlib.figure import Figure
+            f = Figure()
+        ax = f.add_subplot()
+        ax.bar(words, occurrences, align='center')
+        ax.set_xticks(range(len(words)))
+        ax.tick_params(axis='both', which='major', labelsize=7)
+        ax.set_xticklabels(words)
+        ax.set_title(f"top {top_k} #hashtags for at least #{criterion} input files")
+        for chart in charts:
+            f.savefig(f"{file_path}.{chart}", format=chart,
+                      dpi=dpi if chart == "png" else "figure")
+        if show:
+            plt.show()
+
+    columns = ["Words", "counter", "line/s", "document/s"]
+    if "csv" in formats:
+        # the same csv as the pandas to_csv of the previous versions, lists as their repr
+        with open(f"{file_path}.csv", "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.writer(csv_file, lineterminator="\n")
+            writer.writerow(columns)
+            writer.writerows((word, counter, str(lines), str(documents))
+                             for word, counter, lines, documents in rows)
+    if "parquet" in formats:
+        import pandas as pd
+        try:
+            pd.DataFrame([list(row) for row in rows], columns=columns).to_parquet(
+                f"{file_path}.parquet", index=False)
+        except ImportError as error:
+            raise ValueError(f"The parquet format needs pyarrow or fastparquet: {error}")
+    return file_path
 
 
 class CalculateCommonWords:
-    def __init__(self, results_dir: str, data: List[FileLine], common_criterion: int = 5,
-                 debug: bool = False):
+    def __init__(self, results_dir: str, data: Iterable[FileLine] = None,
+                 common_criterion: int = 5, debug: bool = False, index=None,
+                 engine: str = "dict", workers: int = 1, shard_size: int = 10000):
+        """
+        :param index: a WordIndex of the data, in this case the words are not counted again
+        and the data are not needed
+        :param engine: the counting engine "dict" or "numpy", see counting_engines
+        :param workers: with workers > 1 the shards of the data are counted in a process pool
+        and merged, see count_words_sharded
+        :param shard_size: number of lines of each shard for the workers
+        :raise: ValueError in case of an unknown engine
+        """
+        if engine not in counting_engines:
+            raise ValueError(f"Unknown counting engine: {engine}, "
+                             f"supported: {list(counting_engines)}")
         self._results_dir = results_dir
-        self.word_dict = WordCounterDict()
+        self._word_dict = WordCounterDict()
         self.debug = debug
         self.criterion = common_criterion
-        self._count_words(data=data)
+        self.engine = engine
+        self.workers = workers
+        self.shard_size = shard_size
+        self._index = index
+        if index is None:
+            self._count_words(data=data)
+        else:
+            self._find_common()
+
+    @property
+    def word_dict(self) -> WordCounterDict:
+        if self._word_dict is None:
+            # with an index the common words are selected only if they are requested
+            self._word_dict = self._index.common(self.criterion)
+        return self._word_dict
+
+    @word_dict.setter
+    def word_dict(self, word_dict: WordCounterDict):
+        self._word_dict = word_dict
 
     @logged
-    def _count_words(self, data: List[FileLine]) -> None:
+    def _count_words(self, data: Iterable[FileLine]) -> None:
         """
         This method will build the word_counter dictionary where we
         count for each unique word in the "data" the number of the occurrence's
         and also we keep track the corresponding lines and files.
+        The data can be a generator, the lines are consumed one by one.
         """
-        for line in data:
-            for word_tokens in line.words:
-                self.word_dict[word_tokens] = line
+        if self.workers > 1:
+            self.word_dict = count_words_sharded(data, workers=self.workers,
+                                                 shard_size=self.shard_size, engine=self.engine)
+        else:
+            self.word_dict = counting_engines[self.engine](data)
         self._find_common()
 
     @logged
@@ -80,64 +511,109 @@ class CalculateCommonWords:
         This method "filter" the dictionary with words, where one word is consider as common
         if it is appeared in more than 1 file
         """
-        self.word_dict = {word: occurrences for word, occurrences
-                          in self.word_dict.items() if
-                          len(occurrences.file_names) >= self.criterion}
+        if self._index is not None:
+            self.word_dict = None
+        else:
+            self.word_dict = self.word_dict.filtered(
+                lambda occurrences: len(occurrences.file_ids) >= self.criterion)
         if self.debug:
             write_json(file_path=os.path.join(self._results_dir, "common_words"),
                        data=self.word_dict)
         return self.word_dict
 
     @logged
-    def show_common(self, top_k: int = 2, file_name: str = "results") -> None:
+    def show_common(self, top_k: int = 2, file_name: str = "results",
+                    show: bool = True, formats: Iterable[str] = ("pdf", "csv")) -> list:
         """
         Show a bor plat and save as pdf the results after the pipeline
         :param top_k: request number of the results
         :param file_name:
+        :param show: False only saves the pdf and the csv without opening the plot window,
+        for the batch runs
+        :param formats: the output files, e.g. only ("csv",) without the chart, see
+        render_results
         :raise StopIteration: In case top_k or the criterion is to high.
+        :return: the top_k (word, WordOccurrence)
         """
-        common_gen = self._get_common()
+        common_gen = self._get_common(top_k=top_k)
         results = []
         for i in range(top_k):
             results.append(next(common_gen))
-        # create for each data a list
-        words = [word[0] for word in results]
-        occurrences = [word[1].counter for word in results]
-        lines = [word[1].lines for word in results]
-        documents = [word[1].file_names for word in results]
-        # Create a figure for the bar plot
-        f = plt.figure()
-        ax = f.add_subplot()
-        ax.bar(words, occurrences, align='center')
-        x = np.arange(len(words))
-        ax.set_xticks(x)
-        ax.tick_params(axis='both', which='major', labelsize=7)
-        ax.set_xticklabels(words)
-        title = f"top {top_k} #hashtags for at least #{self.criterion} input files"
-        plt.title(title)
-
-        # create a data frame for the csv
-        df = pd.DataFrame(list(zip(words, occurrences, lines, documents)),
-                          columns=["Words", "counter", "line/s", "document/s"])
-
-        # create the final file_name
-        file_name = f"{file_name}-topk={top_k}-criterion={self.criterion}"
+        render_results(results_dir=self._results_dir, file_name=file_name,
+                       rows=result_rows(results), top_k=top_k, criterion=self.criterion,
+                       show=show, formats=formats)
+        return results
 
-        plt.savefig(os.path.join(self._results_dir, f"{file_name}.pdf"),
-                    format='pdf', dpi=1200)
-
-        df.to_csv(os.path.join(self._results_dir, f"{file_name}.csv"),
-                  index=None, header=True)
-        plt.show()
+    @logged
+    def sweep(self, criteria: Iterable[int], top_ks: Iterable[int], file_name: str = "results",
+              workers: int = 1,
+              formats: Iterable[str] = ("pdf", "csv")) -> Dict[Tuple[int, int], str]:
+        """
+        Saves the pdf and the csv of show_common for every (criterion, top_k) of the grid
+        without counting the words again. The ranking of each criterion is created once and
+        every top_k is a prefix of it, without an index the words are sorted only once for the
+        lowest criterion and the ranking of every other criterion keeps its words in the same
+        order, which is the same as sorting them again.
+        The files are rendered in a process pool of workers, the charts are slow to draw.
+        :param criteria: every criterion must be at least the criterion of the object, the
+        words of the lower ones were filtered out
+        :param formats: the output files of every combination, see render_results
+        :return: {(criterion, top_k): path of the files without the extension}, the
+        combinations with less than top_k common words are skipped like StopIteration of
+        show_common
+        :raise: ValueError in case of empty criteria or top_ks, a top_k lower than 1 or a
+        criterion lower than the criterion of the object
+        """
+        criteria, top_ks = sorted(set(criteria)), sorted(set(top_ks))
+        if not criteria or not top_ks:
+            raise ValueError("The criteria and the top_ks of the sweep must not be empty")
+        if top_ks[0] < 1:
+            raise ValueError("The top_ks must be at least 1")
+        if criteria[0] < self.criterion:
+            raise ValueError(f"The criteria must be at least {self.criterion}")
+        ranking = None
+        tasks = []
+        for criterion in criteria:
+            if self._index is not None:
+                criterion_ranking = self._index.top(criterion=criterion, top_k=top_ks[-1])
+            else:
+                if ranking is None:
+                    ranking = list(self._get_common())
+                criterion_ranking = list(itertools.islice(
+                    (item for item in ranking if len(item[1].file_ids) >= criterion),
+                    top_ks[-1]))
+            rows = result_rows(criterion_ranking)
+            for top_k in top_ks:
+                if top_k > len(rows):
+                    Logger.logger.info(f"Nothing found for top_k={top_k} and "
+                                       f"criterion={criterion}")
+                    continue
+                tasks.append(dict(results_dir=self._results_dir, file_name=file_name,
+                                  rows=rows[:top_k], top_k=top_k, criterion=criterion,
+                                  formats=tuple(formats)))
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(render_results, **task) for task in tasks]
+                paths = [future.result() for future in futures]
+        else:
+            paths = [render_results(**task) for task in tasks]
+        return {(task["criterion"], task["top_k"]): path for task, path in zip(tasks, paths)}
 
     @logged
-    def _get_common(self) -> Generator:
+    def _get_common(self, top_k: int = None) -> Generator:
         """
         Return a generator for common words in a sorted way based on the number of lines = counter
         as a criterion for sorting, yields a tuple where each element is:
         (word,WordOccurrence object)
+        Words with the same counter keep the order of their first occurrence in the data.
+        :param top_k: only the top_k words are selected with a heap instead of sorting all
+        the words, None returns the whole ranking
         """
-        words_gen = ((word, values) for word, values in
-                     sorted(self.word_dict.items(), key=lambda x: x[1].counter,
-                            reverse=True))
-        yield from words_gen
+        if self._index is not None:
+            words = self._index.top(criterion=self.criterion, top_k=top_k)
+        elif top_k is None:
+            words = sorted(self.word_dict.items(), key=lambda x: x[1].counter, reverse=True)
+        else:
+            # same as sorted(...)[:top_k], the ties are resolved in the same way
+            words = heapq.nlargest(top_k, self.word_dict.items(), key=lambda x: x[1].counter)
+        yield from words
@@ -1,19 +1,18 @@
-from nltk.tokenize import word_tokenize, sent_tokenize
+from concurrent.futures import ProcessPoolExecutor
+import collections
 import dataclasses
+import hashlib
+import io
+import itertools
 import os
 import sys
-from hash_tag.tools.helpers import restore, write
+from hash_tag.core.columnar import ColumnarLines
+from hash_tag.core.token_cache import TokenCache
+from hash_tag.core.tokenizers import tokenizers, nltk_tokenize
+from hash_tag.tools.helpers import restore
 from hash_tag.tools.logger import Logger, logged
-from typing import Iterable, List, Generator
-
-try:
-    import nltk
-
-    nltk.download('punkt')
-    nltk.download('averaged_perceptron_tagger')
-except LookupError as e:
-    Logger.logger.error(f"Cannot continue: {e}")
-    sys.exit()
+from hash_tag.tools.metrics import watch_cache
+from typing import Iterable, List, Generator, Tuple, Union, Callable
 
 
 @dataclasses.dataclass
@@ -29,16 +28,49 @@ class FileLine:
     file_name: str
 
 
+def copy_lines(data: List[FileLine]) -> List[FileLine]:
+    """
+    Returns new FileLine objects with a copy of the words list, the line and file name
+    strings are shared with the given objects.
+    """
+    return [FileLine(file_line.words[:], file_line.line, file_line.file_name)
+            for file_line in data]
+
+
+def _strip_whitespace(text: str) -> str:
+    return "".join(text.split())
+
+
 class DataLoader:
     def __init__(self, input_files_path: str, saves_folder_name: str = "saves",
-                 results_folder_name: str = "results"):
+                 results_folder_name: str = "results", workers: int = 1,
+                 chunk_size: int = None, split_by: str = "file",
+                 tokenizer: Union[str, Callable] = "nltk"):
+        """
+        :param workers: number of processes used from parse_files, 1 means serial parsing
+        :param chunk_size: size of each task for the workers, number of files per task when
+        we split by file or number of bytes per task when we split by bytes
+        :param split_by: "file" or "bytes", how the input files are split between the workers
+        :param tokenizer: the name of a tokenizer of core/tokenizers.py ("nltk" or the faster
+        "regex") or a module level function line -> (words, sentence) for each sentence
+        """
         self._saves_dir = None
         self._result_dir = None
         self._data = None
         self._files_to_parse = []
         self._total_data = 0
+        self._fingerprints = {}
+        self._workers = workers
+        if split_by not in ("file", "bytes"):
+            raise ValueError(f"Cannot split the input files by: {split_by}")
+        self._split_by = split_by
+        self.tokenizer = tokenizer
+        if chunk_size is None:
+            chunk_size = 1 if split_by == "file" else 1024 * 1024
+        self._chunk_size = chunk_size
         self.current_dir = os.path.dirname(os.path.abspath(__file__))
         self.parent_path = os.path.dirname(self.current_dir)
+        self._input_files_path = input_files_path
         self._validate_input_files(files_path=input_files_path)
         self._make_directories(saves_folder_name=saves_folder_name,
                                results_folder_name=results_folder_name)
@@ -56,16 +88,146 @@ class DataLoader:
         return len(self._files_to_parse)
 
     @property
-    def data(self):
-        try:
-            self._data = restore(os.path.join(self._saves_dir, "extracted_tokens.pickle"))
-        except FileNotFoundError as e:
-            Logger.logger.debug(f"{e}\nParsing input files..")
-            self._data = self.parse_files()
-            write(os.path.join(self._saves_dir, "extracted_tokens"), self._data)
-        finally:
+    def tokenizer(self) -> Callable:
+        return self._tokenizer
+
+    @tokenizer.setter
+    def tokenizer(self, tokenizer: Union[str, Callable]):
+        """
+        :raise: ValueError in case of an unknown tokenizer name
+        """
+        if isinstance(tokenizer, str):
+            if tokenizer not in tokenizers:
+                raise ValueError(f"Unknown tokenizer: {tokenizer}, supported: {list(tokenizers)}")
+            tokenizer = tokenizers[tokenizer]
+        self._tokenizer = tokenizer
+        self._data = None
+
+    @property
+    def tokenizer_name(self) -> str:
+        return next((name for name, tokenizer in tokenizers.items()
+                     if tokenizer is self._tokenizer), self._tokenizer.__name__)
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @workers.setter
+    def workers(self, workers: int):
+        self._workers = max(1, int(workers))
+
+    @property
+    def data(self) -> ColumnarLines:
+        """
+        Returns a copy of the FileLine objects of all the input files, they are loaded only
+        once in the columnar format and kept in memory until invalidate is called.
+        Every access returns a new view where the FileLine objects are created only when they
+        are accessed, so the filters can change them without affecting the cached ones.
+        """
+        if self._data is None:
+            self._data = self._load_with_cache()
             self._total_data = len(self._data)
-        return self._data
+        return self._data.view()
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Returns a hash of the content of all the input files and the tokenizer, it identifies
+        the input data of the pipeline, see core/stage_cache.py
+        """
+        if self._data is None:
+            self._data = self._load_with_cache()
+            self._total_data = len(self._data)
+        hash_obj = hashlib.blake2b(self.tokenizer_name.encode("utf-8"), digest_size=16)
+        for file_path in self._files_to_parse:
+            hash_obj.update(os.path.basename(file_path).encode("utf-8"))
+            hash_obj.update(self._fingerprints[file_path].digest.encode("utf-8"))
+        return hash_obj.hexdigest()
+
+    def invalidate(self) -> None:
+        """
+        Drops the in memory FileLine objects and checks again the input files folder,
+        the next access of data will load them again from the token cache.
+        """
+        self._data = None
+        self._validate_input_files(files_path=self._input_files_path)
+
+    def update(self) -> Tuple[List[FileLine], List[str]]:
+        """
+        Checks again the input files and compares them with the last loaded data.
+        Returns a copy of the FileLine objects of the new or changed files and the names of the
+        changed or removed files, where their previous lines must be retracted.
+        """
+        previous_fingerprints = self._fingerprints
+        self.invalidate()
+        data = self.data
+        changed = [file_path for file_path, fingerprint in self._fingerprints.items()
+                   if file_path not in previous_fingerprints or
+                   previous_fingerprints[file_path].digest != fingerprint.digest]
+        retracted = [file_path for file_path in previous_fingerprints
+                     if file_path not in self._fingerprints or file_path in changed]
+        changed = {self.restore_file_name(file_path) for file_path in changed}
+        Logger.logger.debug(f"New or changed input files: {changed}")
+        return ([file_line for file_line in data if file_line.file_name in changed],
+                [self.restore_file_name(file_path) for file_path in retracted])
+
+    @logged
+    def _load_with_cache(self) -> ColumnarLines:
+        """
+        Returns the FileLine objects of all the input files from the per file token cache,
+        only the new or changed files are parsed again and the files which are removed
+        are dropped from the cache.
+        """
+        # the tokens of each tokenizer are kept in a different cache
+        cache_name = "token_cache" if self._tokenizer is nltk_tokenize \
+            else f"token_cache_{self.tokenizer_name}"
+        token_cache = TokenCache(os.path.join(self._saves_dir, cache_name))
+        watch_cache(token_cache)
+        if not len(token_cache) and self._tokenizer is nltk_tokenize:
+            self._seed_token_cache(token_cache)
+        files_to_parse = [file_path for file_path in self._files_to_parse
+                          if token_cache.lookup(file_path) is None]
+        if files_to_parse:
+            Logger.logger.debug(f"Parsing new or changed input files: {files_to_parse}")
+            parsed = {file_path: [] for file_path in files_to_parse}
+            paths = {self.restore_file_name(file_path): file_path for file_path in files_to_parse}
+            for file_line in self.iter_lines(files=files_to_parse):
+                parsed[paths[file_line.file_name]].append(file_line)
+            for file_path, file_lines in parsed.items():
+                token_cache.update(file_path, file_lines)
+        removed = token_cache.prune(self._files_to_parse)
+        if removed:
+            Logger.logger.debug(f"Dropping removed input files from the cache: {removed}")
+        token_cache.save()
+        self._fingerprints = token_cache.fingerprints()
+        # the lines are taken from the saved cache, they are memory mapped from its file
+        return token_cache.lines(self._files_to_parse)
+
+    def _seed_token_cache(self, token_cache: TokenCache) -> None:
+        """
+        Fills an empty token cache from the checkpoint extracted_tokens.pickle of the previous
+        versions, if it exists. Only the files whose current content matches the stored lines
+        (ignoring the whitespace) are seeded, the rest are parsed again.
+        """
+        try:
+            extracted_tokens = restore(os.path.join(self._saves_dir, "extracted_tokens.pickle"))
+        except FileNotFoundError:
+            return
+        Logger.logger.debug("Creating the token cache from extracted_tokens.pickle")
+        per_file = {}
+        for file_line in extracted_tokens:
+            per_file.setdefault(file_line.file_name, []).append(file_line)
+        for file_path in self._files_to_parse:
+            file_name = self.restore_file_name(file_path)
+            if file_name not in per_file:
+                continue
+            with open(file_path, encoding="utf8") as file_reader:
+                content = _strip_whitespace(file_reader.read())
+            if content == _strip_whitespace("".join(file_line.line
+                                                    for file_line in per_file[file_name])):
+                token_cache.update(file_path, per_file[file_name])
+            else:
+                Logger.logger.debug(f"Stale extracted tokens for {file_name}, parsing it again")
 
     def _make_directories(self, saves_folder_name: str, results_folder_name: str) -> None:
         """
@@ -99,8 +261,8 @@ class DataLoader:
             raise Exception(f"Path for input files folder:{files_path} does not exist")
         else:
             # @TODO right now parse only .txt files
-            files = [file for file in os.listdir(files_path) if
-                     file.endswith(".txt")]
+            files = sorted(file for file in os.listdir(files_path) if
+                           file.endswith(".txt"))
             self._files_to_parse = [os.path.join(files_path, file) for file in files]
 
     @logged
@@ -109,14 +271,66 @@ class DataLoader:
         This method will parse all the input files and returns a list of FileLine objects
         we follow this approach because for each sentence in file we need the extracted word
         tokens and also a "reference" of the corresponding line and file.
+        With more than one worker the files are parsed from a process pool and the results
+        are concatenated in the same order as the serial parsing.
         """
-        results = []
-        for line, file_path in self._file_generator(files=self._files_to_parse):
+        return list(self.iter_lines())
+
+    def iter_lines(self, files: List[str] = None) -> Generator:
+        """
+        Streaming version of parse_files, yields the FileLine objects one by one in the same
+        order, so only the lines of the current file (or of the pending worker tasks) are kept
+        in memory.
+        :param files: parse only these files, default all the input files
+        """
+        files = self._files_to_parse if files is None else files
+        if self._workers > 1:
+            yield from self._iter_lines_parallel(files=files)
+            return
+        for line, file_path in self._file_generator(files=files):
             file_name = self.restore_file_name(file_path)
-            for tokens in self._tokenize_line(line=line):
-                file_line = FileLine(*tokens, file_name=file_name)
-                results.append(file_line)
-        return results
+            for tokens in self._tokenizer(line):
+                yield FileLine(*tokens, file_name=file_name)
+
+    def _iter_lines_parallel(self, files: List[str]) -> Generator:
+        """
+        Splits the input files in tasks (whole files or line aligned byte ranges) and parse them
+        in a process pool. Tasks are submitted in a bounded window ahead of the consumer and
+        their results are yielded in the order of the tasks.
+        """
+        if self._split_by == "bytes":
+            tasks = ([task] for file in files for task in
+                     self._byte_ranges(file, chunk_size=self._chunk_size))
+        else:
+            files = iter(files)
+            tasks = iter(lambda: [(file, 0, None) for file in
+                                  itertools.islice(files, max(1, self._chunk_size))], [])
+        Logger.logger.debug(f"Parsing the input files with {self._workers} workers")
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            pending = collections.deque()
+            for task in tasks:
+                pending.append(executor.submit(_parse_tasks, task, self._tokenizer))
+                if len(pending) >= 2 * self._workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    @staticmethod
+    def _byte_ranges(file: str, chunk_size: int) -> Generator:
+        """
+        Yields (file, start, end) tasks of about chunk_size bytes, every range ends after a
+        new line so none of the lines is split between two tasks.
+        """
+        file_size = os.path.getsize(file)
+        chunk_size = max(1, chunk_size)
+        start = 0
+        with open(file, "rb") as file_reader:
+            while start < file_size:
+                file_reader.seek(min(start + chunk_size, file_size))
+                file_reader.readline()
+                end = min(file_reader.tell(), file_size)
+                yield file, start, end
+                start = end
 
     @staticmethod
     def _file_generator(files: Iterable) -> Generator:
@@ -131,9 +345,10 @@ class DataLoader:
         This method use the nltk methods sent_tokenize and word_tokenize to extract all of the words
         of the given sentence it's useful because no matter what kind of punctuation we have in
         the sentence,it is able to split them and extract the word tokens.
+        It is the default tokenizer of the DataLoader, see core/tokenizers.py
+        :raise: LookupError in case the nltk punkt tokenizer is missing, see tools/resources.py
         """
-        tokens = ((word_tokenize(token), token) for token in sent_tokenize(line))
-        yield from tokens
+        yield from nltk_tokenize(line)
 
     @staticmethod
     def restore_file_name(file_path: str) -> str:
@@ -149,3 +364,22 @@ class DataLoader:
               f"Save dir(contains the pickled saves): {self._saves_dir}\n"
               f"Total number of documents: #{self.total}")
         return ""
+
+
+def _parse_tasks(tasks: List[tuple], tokenize: Callable = None) -> List[FileLine]:
+    """
+    Worker of the DataLoader process pool, parse every (file, start, end) task, the byte range
+    [start, end) of the file or the whole file when end is None, exactly like the serial parsing.
+    :param tokenize: the tokenizer of the DataLoader, default the nltk one
+    """
+    tokenize = tokenize or nltk_tokenize
+    results = []
+    for file_path, start, end in tasks:
+        file_name = DataLoader.restore_file_name(file_path)
+        with open(file_path, "rb") as file_reader:
+            file_reader.seek(start)
+            chunk = file_reader.read() if end is None else file_reader.read(end - start)
+        for line in io.TextIOWrapper(io.BytesIO(chunk), encoding="utf8"):
+            for tokens in tokenize(line.strip()):
+                results.append(FileLine(*tokens, file_name=file_name))
+    return results
@@ -1,15 +1,29 @@
+from hash_tag.core.columnar import read_lines, write_lines
 from hash_tag.core.data_loader import FileLine
 from hash_tag.core.filters import filter_stop_words, filter_by_tag, \
     filter_punctuation
-from hash_tag.tools.helpers import write, restore, write_json
+from hash_tag.core.stages import make_stage, run_fused
+from hash_tag.tools.cache import LRUCache
+from hash_tag.tools.helpers import restore, checkpoint_writer
 from hash_tag.tools.logger import Logger, logged
+from hash_tag.tools.metrics import measure, watch_cache
 import os
-from typing import List, Callable
+from typing import List, Callable, Sequence
 
 
 class FilterPipeLine:
     def __init__(self, saves_dir: str, data: List[FileLine], tags: List[str],
-                 vocabulary: str, debug: bool = False):
+                 vocabulary: str, debug: bool = False, tag_cache_size: int = 100000,
+                 workers: int = 1, fused: bool = True, stage_cache=None,
+                 fingerprint: str = None):
+        """
+        :param tag_cache_size: maximum number of tagged words lists kept from filter_by_tag,
+        0 disables the cache
+        :param workers: number of processes for the filters which support it (filter_by_tag)
+        :param fused: the consecutive filters which work word by word are applied in one pass
+        :param stage_cache: a StageCache, with the fingerprint of the input data the filters
+        start from the longest cached prefix of them, see core/stage_cache.py
+        """
         self._saves_dir = saves_dir
         self._data = data
         self._vocabulary = vocabulary
@@ -17,11 +31,23 @@ class FilterPipeLine:
         self._tags = tags
         self._saves = []
         self._debug = debug
+        self.workers = workers
+        self.fused = fused
+        self.stage_cache = stage_cache
+        self.fingerprint = fingerprint
+        self._tag_cache = LRUCache(max_size=tag_cache_size, name="tag cache") \
+            if tag_cache_size > 0 else None
+        if self._tag_cache is not None:
+            watch_cache(self._tag_cache)
 
     @property
     def data(self):
         return self._data
 
+    @property
+    def tag_cache(self):
+        return self._tag_cache
+
     @property
     def vocabulary(self):
         return self._vocabulary
@@ -30,21 +56,39 @@ class FilterPipeLine:
     def vocabulary(self, new_vocab: str):
         self._vocabulary = new_vocab
 
+    @property
+    def stages(self) -> List[tuple]:
+        """
+        Returns the registered filters as (name, parameters) stages, see core/stages.py
+        """
+        return [make_stage(n_filter.__name__, vocabulary=self._vocabulary, tags=self._tags)
+                for n_filter in self._filters]
+
     @property
     def saves(self) -> List[str]:
         """
-        Returns a list with all the checkpoints founded in saves dir after the filter pipeline
+        Returns a list with all the checkpoints founded in saves dir after the filter pipeline,
+        the columnar checkpoints (.lines) and the pickles of the previous versions.
         """
+        checkpoint_writer.wait(check=False)
         self._saves = [filter_file for filter_file in os.listdir(self._saves_dir) if
-                       filter_file.startswith("filter") and filter_file.endswith(".pickle")]
+                       filter_file.startswith("filter") and
+                       filter_file.endswith((".lines", ".pickle"))]
         return self._saves
 
-    def restore_after_filter(self, filter_name: str) -> List[FileLine]:
+    def restore_after_filter(self, filter_name: str) -> Sequence[FileLine]:
         """
-        Restore the state from the given checkpoint
-        :raise: FileNotFound exception in case it is called with random name outside the app
+        Restore the state from the given checkpoint, a columnar checkpoint is memory mapped
+        and its lines are read only when they are accessed.
+        :raise: FileNotFound exception in case it is called with random name outside the app,
+        IOError in case a checkpoint failed to be written
         """
-        self._data = restore(os.path.join(self._saves_dir, filter_name))
+        checkpoint_writer.wait()
+        file_path = os.path.join(self._saves_dir, filter_name)
+        if filter_name.endswith(".lines"):
+            self._data = read_lines(file_path)
+        else:
+            self._data = restore(file_path)
         return self._data
 
     def add_all_filters(self) -> None:
@@ -63,21 +107,53 @@ class FilterPipeLine:
             self._filters.append(n_filter)
             Logger.logger.info(f"Successfully added the filter > {n_filter.__name__}")
 
+    def clear_filters(self) -> None:
+        """
+        Removes all the filters, for example after the app applied them
+        """
+        self._filters = []
+
     @logged
-    def apply_filters(self) -> List[FileLine]:
+    def apply_filters(self, fused: bool = None) -> List[FileLine]:
         """
         Run the pipeline of the filters in the extracted data from files.
+        :param fused: default self.fused, the filter_punctuation and filter_stop_words are
+        applied word by word in one pass over the lines, see core/stages.run_fused.
+        The result and the checkpoints are the same in both cases.
         """
+        fused = self.fused if fused is None else fused
+        checkpoint = self._checkpoint if self._debug else None
         pipeline = self._data
-        Logger.logger.debug(f"Pipeline is > {self._filters}")
-        for n_filter in self._filters:
-            pipeline = n_filter(pipeline, vocabulary=self._vocabulary,
-                                tags=self._tags)
-            if self._debug:
-                write(os.path.join(self._saves_dir, f"{n_filter.__name__}"), self._data)
-                write_json(os.path.join(self._saves_dir, f"{n_filter.__name__}"), self._data)
+        Logger.logger.debug(f"Pipeline is > {self._filters}, fused: {fused}")
+        if fused and self.stage_cache is not None and self.fingerprint is not None:
+            pipeline = self.stage_cache.run(pipeline, self.stages, fingerprint=self.fingerprint,
+                                            functions=self._filters, checkpoint=checkpoint,
+                                            tag_cache=self._tag_cache, workers=self.workers)
+        elif fused:
+            pipeline = run_fused(pipeline, self.stages, functions=self._filters,
+                                 checkpoint=checkpoint, tag_cache=self._tag_cache,
+                                 workers=self.workers)
+        else:
+            for n_filter in self._filters:
+                with measure(n_filter.__name__, pipeline):
+                    pipeline = n_filter(pipeline, vocabulary=self._vocabulary,
+                                        tags=self._tags, tag_cache=self._tag_cache,
+                                        workers=self.workers)
+                if checkpoint:
+                    checkpoint(n_filter.__name__, pipeline)
+        if self._tag_cache is not None:
+            self._tag_cache.log_stats()
+        # the filters change the lines in place but a cached state is a new sequence
+        self._data = pipeline
         return pipeline
 
+    def _checkpoint(self, filter_name: str, data: List[FileLine]) -> None:
+        """
+        Saves the data after the filter_name in the background, see CheckpointWriter
+        """
+        checkpoint_writer.submit(os.path.join(self._saves_dir, filter_name), data,
+                                 writer=write_lines)
+
     def __str__(self):
         print(f"{self.__class__.__name__}\n"
               f"saves dir: {self._saves_dir}\n"
@@ -1,11 +1,13 @@
 from hash_tag.core.data_loader import FileLine
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Callable
+import atexit
+from hash_tag.tools.helpers import chunked
 from hash_tag.tools.logger import Logger
+from hash_tag.tools.resources import require
 
 try:
     import nltk
-
-    nltk.download('stopwords')
     from nltk.corpus import stopwords
 except Exception as e:
     Logger.logger.error(e)
@@ -27,13 +29,110 @@ def filter_punctuation(data: List[FileLine], *args, **kwargs) -> List[FileLine]:
 def filter_by_tag(data: List[FileLine], *args, **kwargs) -> List[FileLine]:
     """
     filter all the words for the requested tags based on  the nltk pos tag
+    The lines are tagged in batches of batch_size lines (default 1000) with nltk.pos_tag_sents
+    and an optional tag_cache (LRUCache) keeps the tags of already seen word sequences.
+    With workers > 1 the batches are tagged from a process pool.
+    An optional tagger, a module level function words -> [(word, tag), ...], replaces the
+    nltk perceptron tagger.
     """
-    for line in data:
-        line.words = [tokens[0] for tokens in nltk.pos_tag(line.words) if
-                      tokens[1] in kwargs["tags"]]
+    tagger = kwargs.get("tagger")
+    if tagger is None:
+        require("averaged_perceptron_tagger")
+    tags = set(kwargs["tags"])
+    batch_size = kwargs.get("batch_size", 1000)
+    workers = kwargs.get("workers", 1)
+    if workers > 1:
+        def tag_sents(lines):
+            return _parallel_pos_tag_sents(lines, workers=workers, batch_size=batch_size,
+                                           tagger=tagger)
+    elif tagger is not None:
+        def tag_sents(lines):
+            return [tagger(words) for words in lines]
+    else:
+        tag_sents = nltk.pos_tag_sents
+    for chunk in chunked(data, batch_size * max(1, workers)):
+        tagged_lines = _pos_tag_lines([line.words for line in chunk],
+                                      tag_cache=kwargs.get("tag_cache"), tag_sents=tag_sents)
+        for line, tagged_words in zip(chunk, tagged_lines):
+            line.words = [tokens[0] for tokens in tagged_words if tokens[1] in tags]
     return data
 
 
+def _pos_tag_lines(lines: List[list], tag_cache=None, tag_sents=None) -> List[list]:
+    """
+    Returns the nltk pos tags of each words list, only the words lists which are not in the
+    tag_cache are tagged and each unique words list is tagged once.
+    :param tag_sents: the function which tags a list of words lists, default nltk.pos_tag_sents
+    """
+    tag_sents = tag_sents or nltk.pos_tag_sents
+    if tag_cache is None:
+        return tag_sents(lines)
+    keys = [tuple(words) for words in lines]
+    results = [tag_cache.get(key) for key in keys]
+    missing = list(dict.fromkeys(key for key, result in zip(keys, results) if result is None))
+    tagged = dict(zip(missing, tag_sents([list(key) for key in missing]))) if missing else {}
+    for key, tagged_words in tagged.items():
+        tag_cache.put(key, tagged_words)
+    return [tagged[key] if result is None else result for key, result in zip(keys, results)]
+
+
+_tagger_pool = {"pool": None, "key": None}
+_worker_tagger = None
+
+
+def _init_tagger_worker(tagger: Callable = None) -> None:
+    """
+    Loads the averaged perceptron tagger once for each worker process
+    :param tagger: a module level function words -> [(word, tag), ...] instead of the nltk tagger
+    """
+    global _worker_tagger
+    if tagger is None:
+        require("averaged_perceptron_tagger")
+        from nltk.tag.perceptron import PerceptronTagger
+        tagger = PerceptronTagger().tag
+    _worker_tagger = tagger
+
+
+def _tag_in_worker(lines: List[list]) -> List[list]:
+    return [_worker_tagger(words) for words in lines]
+
+
+def _get_tagger_pool(workers: int, tagger: Callable = None) -> ProcessPoolExecutor:
+    """
+    Returns a process pool with the requested number of workers, the pool is kept alive
+    between the calls of filter_by_tag, so the tagger is not loaded again for each call.
+    A call with a different number of workers or tagger shuts down the previous pool.
+    """
+    key = (workers, tagger)
+    if _tagger_pool["key"] != key:
+        _shutdown_tagger_pool()
+        _tagger_pool["pool"] = ProcessPoolExecutor(max_workers=workers,
+                                                   initializer=_init_tagger_worker,
+                                                   initargs=(tagger,))
+        _tagger_pool["key"] = key
+    return _tagger_pool["pool"]
+
+
+@atexit.register
+def _shutdown_tagger_pool() -> None:
+    if _tagger_pool["pool"] is not None:
+        _tagger_pool["pool"].shutdown()
+    _tagger_pool["pool"] = _tagger_pool["key"] = None
+
+
+def _parallel_pos_tag_sents(lines: List[list], workers: int, batch_size: int,
+                            tagger: Callable = None) -> List[list]:
+    """
+    Same as nltk.pos_tag_sents but the batches of lines are tagged from the worker processes,
+    executor.map keeps the order of the batches.
+    """
+    pool = _get_tagger_pool(workers, tagger)
+    results = []
+    for tagged_lines in pool.map(_tag_in_worker, chunked(lines, batch_size)):
+        results.extend(tagged_lines)
+    return results
+
+
 def filter_duplicates(data: List[FileLine], *args, **kwargs) -> List[FileLine]:
     """
     Removes the duplicates words in the same line only!
@@ -48,6 +147,7 @@ def filter_stop_words(data: List[FileLine], *args, **kwargs) -> List[FileLine]:
     Filter the words based on the requested vocabulary and nltk stop words
     """
     try:
+        require("stopwords")
         stop_words = set(stopwords.words(kwargs["vocabulary"].lower()))
         Logger.logger.debug(f"Stop_words are {stop_words}")
         for line in data:
@@ -58,3 +158,25 @@ def filter_stop_words(data: List[FileLine], *args, **kwargs) -> List[FileLine]:
                             f"{stopwords.__dict__}")
     except KeyError as key_error:
         Logger.logger.error(f"Vocabulary keyword argument is missing: {key_error}")
+
+
+# ##############################################################################################
+# ################## per word predicates of the filters for the fused execution ################
+# ##############################################################################################
+
+def punctuation_predicate(*args, **kwargs) -> Callable[[str], bool]:
+    """
+    The predicate of filter_punctuation for one word
+    """
+    return str.isalpha
+
+
+def stop_words_predicate(*args, **kwargs) -> Callable[[str], bool]:
+    """
+    The predicate of filter_stop_words for one word
+    :raise: IOError in case of an unsupported vocabulary, KeyError if it is missing
+    """
+    require("stopwords")
+    stop_words = set(stopwords.words(kwargs["vocabulary"].lower()))
+    Logger.logger.debug(f"Stop_words are {stop_words}")
+    return lambda word: word.lower() not in stop_words
@@ -0,0 +1,157 @@
+from hash_tag.core.columnar import read_lines, release, write_lines
+from hash_tag.core.data_loader import FileLine
+from hash_tag.core.stages import run_fused, supported_stages
+from hash_tag.tools.helpers import checkpoint_writer
+from hash_tag.tools.logger import Logger
+from hash_tag.tools.metrics import watch_cache
+from typing import Callable, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import os
+import time
+
+
+class StageCache:
+    """
+    A content addressed cache with the data after every prefix of a pipeline of stages.
+    Each entry is keyed by the fingerprint of the input data (see DataLoader.fingerprint)
+    and the ordered (name, parameters) stages which were applied in them, so the same stages
+    with other parameters, for example another stemmer or other tags, are different entries.
+    The entries are columnar files (see core/columnar.py) which are memory mapped when they are
+    reused and they are written in the background from the checkpoint_writer.
+    The entries which are older than max_age seconds are evicted and then the least recently
+    used ones until the total size is at most max_size bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = 512 * 1024 * 1024,
+                 max_age: float = 7 * 24 * 3600):
+        """
+        :param max_size: maximum total size of the entries in bytes, 0 or less means unbounded
+        :param max_age: maximum age of an entry since its last use in seconds, 0 or less means
+        that the entries never expire
+        """
+        self._cache_dir = cache_dir
+        self.max_size = max_size
+        self.max_age = max_age
+        self.name = "stage cache"
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        watch_cache(self)
+
+    @staticmethod
+    def key(fingerprint: str, stages: Sequence[Tuple[str, dict]]) -> str:
+        description = json.dumps([fingerprint, [[name, params] for name, params in stages]],
+                                 sort_keys=True, default=str)
+        return hashlib.blake2b(description.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _path(self, fingerprint: str, stages: Sequence[Tuple[str, dict]]) -> str:
+        return os.path.join(self._cache_dir, self.key(fingerprint, stages))
+
+    def lookup(self, fingerprint: str,
+               stages: List[Tuple[str, dict]]) -> Tuple[int, Optional[Sequence[FileLine]]]:
+        """
+        Returns the number of stages of the longest cached prefix of the stages and the data
+        after them, (0, None) in case there isn't any
+        """
+        checkpoint_writer.wait(check=False)
+        for total in range(len(stages), 0, -1):
+            file_path = f"{self._path(fingerprint, stages[:total])}.lines"
+            try:
+                data = read_lines(file_path)
+            except FileNotFoundError:
+                continue
+            # the last use, for the eviction
+            os.utime(file_path)
+            self.hits += 1
+            Logger.logger.debug(f"Stage cache hit after the stages: "
+                                f"{[name for name, _ in stages[:total]]}")
+            return total, data
+        self.misses += 1
+        return 0, None
+
+    def store(self, fingerprint: str, stages: List[Tuple[str, dict]],
+              data: Sequence[FileLine]) -> None:
+        """
+        Saves the data after the stages in the background
+        """
+        checkpoint_writer.submit(self._path(fingerprint, stages), data, with_json=False,
+                                 writer=write_lines)
+
+    def run(self, data: Sequence[FileLine], stages: List[Tuple[str, dict]], fingerprint: str,
+            functions: List[Callable] = None, checkpoint: Callable = None,
+            **kwargs) -> Sequence[FileLine]:
+        """
+        Same as run_fused but the longest cached prefix of the stages is reused and only the
+        rest of the stages are applied in the data after it, the data after each one of them
+        are stored in the cache.
+        :param data: the input data, they are used only if there isn't any cached prefix
+        :param functions: the function of each stage, default the supported_stages of their names
+        :param checkpoint: it is called as checkpoint(name, data) after every applied stage
+        :raise: KeyError in case of an unknown stage
+        """
+        self.evict()
+        if functions is None:
+            functions = [supported_stages[name] for name, _ in stages]
+        total, cached = self.lookup(fingerprint, stages)
+        if cached is not None:
+            data = cached
+        applied = [total]
+
+        def store(name: str, stage_data: Sequence[FileLine]) -> None:
+            applied[0] += 1
+            self.store(fingerprint, stages[:applied[0]], stage_data)
+            if checkpoint:
+                checkpoint(name, stage_data)
+
+        return run_fused(data, stages[total:], functions=functions[total:], checkpoint=store,
+                         **kwargs)
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for file_name in os.listdir(self._cache_dir):
+            if not file_name.endswith(".lines"):
+                continue
+            file_path = os.path.join(self._cache_dir, file_name)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file_path))
+        return sorted(entries)
+
+    def evict(self) -> List[str]:
+        """
+        Removes the expired entries and then the least recently used until the cache fits
+        in max_size, returns the paths of the removed entries
+        """
+        checkpoint_writer.wait(check=False)
+        entries = self._entries()
+        total_size = sum(size for _, size, _ in entries)
+        now = time.time()
+        removed = []
+        for last_use, size, file_path in entries:
+            expired = 0 < self.max_age < now - last_use
+            if not expired and not 0 < self.max_size < total_size:
+                # the entries are sorted by their last use, the rest are newer
+                break
+            try:
+                # the sequences of the entry which are still used are copied in memory
+                release(file_path)
+                os.remove(file_path)
+            except OSError as error:
+                Logger.logger.debug(f"Cannot evict: {file_path}: {error}")
+                continue
+            total_size -= size
+            removed.append(file_path)
+        if removed:
+            Logger.logger.debug(f"Evicted stage cache entries: {removed}")
+        return removed
+
+    def clear(self) -> None:
+        checkpoint_writer.wait(check=False)
+        for _, _, file_path in self._entries():
+            release(file_path)
+            os.remove(file_path)
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,203 @@
+from hash_tag.core.data_loader import FileLine
+from hash_tag.core.filters import filter_punctuation, filter_by_tag, \
+    filter_stop_words, filter_duplicates, punctuation_predicate, stop_words_predicate
+from hash_tag.core.stem import stem_words, token_stemmer
+from hash_tag.tools.helpers import chunked
+from hash_tag.tools.logger import Logger
+from hash_tag.tools.metrics import measure
+from typing import Iterable, Generator, List, Tuple, Callable, Optional
+import itertools
+import time
+
+# A stage of the pipeline is described from its name and its parameters, for example
+# ("filter_by_tag", {"vocabulary": "english", "tags": ["NN"]}), so the same sequence of stages
+# can be applied again in new data.
+
+
+def stem(data: List[FileLine], *args, **kwargs) -> List[FileLine]:
+    """
+    stem_words as a stage, without checkpoints
+    """
+    return stem_words(data, vocabulary=kwargs["vocabulary"], stemmer=kwargs["stemmer"],
+                      saves_dir=None)
+
+
+supported_stages = {
+    "filter_punctuation": filter_punctuation,
+    "filter_duplicates": filter_duplicates,
+    "filter_stop_words": filter_stop_words,
+    "filter_by_tag": filter_by_tag,
+    "stem": stem}
+
+# The settings which each stage reads, a stage is described (and cached) only with them, so for
+# example new tags don't change the filter_stop_words stage. The stages which are not here get
+# all the settings.
+stage_parameters = {
+    "filter_punctuation": (),
+    "filter_duplicates": (),
+    "filter_stop_words": ("vocabulary",),
+    "filter_by_tag": ("tags",),
+    "stem": ("vocabulary", "stemmer")}
+
+
+def make_stage(name: str, **settings) -> Tuple[str, dict]:
+    """
+    Returns the stage (name, parameters) with only the settings which the stage reads
+    :raise: KeyError in case a setting of the stage is missing
+    """
+    keys = stage_parameters.get(name)
+    return name, dict(settings) if keys is None else {key: settings[key] for key in keys}
+
+
+# The stages which work word by word, each factory returns the operation of the stage for one
+# word as ("filter", predicate) or ("map", function), see run_fused. A None function leaves the
+# words unchanged, for example when there isn't any stemmer for the vocabulary.
+# filter_by_tag and filter_duplicates need the whole line so they can't be fused.
+token_operations = {
+    "filter_punctuation": lambda **params: ("filter", punctuation_predicate(**params)),
+    "filter_stop_words": lambda **params: ("filter", stop_words_predicate(**params)),
+    "stem": lambda **params: ("map", token_stemmer(vocabulary=params["vocabulary"],
+                                                   stemmer=params["stemmer"]))}
+
+
+def token_operation(name: str, params: dict) -> Optional[Tuple[str, Callable]]:
+    """
+    Returns the per word operation of the stage or None in case the stage works with whole
+    lines or its operation can't be created, in this case the stage runs on its own.
+    """
+    factory = token_operations.get(name)
+    if factory is None:
+        return None
+    try:
+        kind, function = factory(**params)
+    except (IOError, KeyError) as error:
+        Logger.logger.debug(f"Stage: {name} can't be fused: {error}")
+        return None
+    return kind, function
+
+
+def apply_token_operations(data: List[FileLine], operations: List[Tuple[str, Callable]],
+                           snapshots: List[list] = None) -> List[FileLine]:
+    """
+    Applies the operations in the given order to the words of each line in one pass, the
+    operations are chained with the map and filter builtins so each word goes through all of
+    them and only the final words list is created.
+    :param snapshots: one list for each operation except the last, it is filled with copies of
+    the lines after this operation, they are needed for the checkpoints
+    """
+    if snapshots is None:
+        for line in data:
+            words = line.words
+            for kind, function in operations:
+                if function is not None:
+                    words = map(function, words) if kind == "map" else filter(function, words)
+            line.words = list(words)
+        return data
+    for line in data:
+        words = line.words
+        for index, (kind, function) in enumerate(operations):
+            if function is not None:
+                words = list(map(function, words) if kind == "map" else filter(function, words))
+            if index < len(snapshots):
+                snapshots[index].append(FileLine(words=words[:], line=line.line,
+                                                 file_name=line.file_name))
+        line.words = words
+    return data
+
+
+def fused_groups(stages: List[Tuple[str, dict]],
+                 functions: List[Callable] = None) -> List[Tuple[bool, list]]:
+    """
+    Splits the stages in groups of consecutive stages which can be fused or not, in their
+    order, as (fusible, [(name, params, function, operation), ...]), where the operation is
+    the per word operation of a fusible stage, see token_operation.
+    :param functions: the function of each stage, default the supported_stages of their names
+    :raise: KeyError in case of an unknown stage
+    """
+    if functions is None:
+        functions = [supported_stages[name] for name, _ in stages]
+    # only the known stage functions are fused, not other functions with the same name
+    steps = [(name, params, function, token_operation(name, params)
+              if function is supported_stages.get(name) else None)
+             for (name, params), function in zip(stages, functions)]
+    return [(fusible, list(group)) for fusible, group in
+            itertools.groupby(steps, key=lambda step: step[3] is not None)]
+
+
+def run_fused(data: List[FileLine], stages: List[Tuple[str, dict]],
+              functions: List[Callable] = None, checkpoint: Callable = None,
+              timings: dict = None, **kwargs) -> List[FileLine]:
+    """
+    Same as run_stages but the consecutive stages which work word by word are composed and
+    applied in one pass over the data, the order of the stages is kept.
+    :param functions: the function of each stage, default the supported_stages of their names
+    :param checkpoint: it is called as checkpoint(name, data) after every stage with the data
+    after this stage, the states inside a fused group are copied only in this case
+    :param timings: it is filled with the seconds of every stage, the stages of a fused group
+    are applied together so they are timed as one entry with their names joined with "+",
+    the same entries are measured for the run report of tools/metrics.py
+    :param kwargs: extra keyword arguments for all the stages, for example the workers
+    :raise: KeyError in case of an unknown stage
+    """
+    for fusible, group in fused_groups(stages, functions):
+        if not fusible:
+            for name, params, function, _ in group:
+                start = time.perf_counter()
+                with measure(name, data):
+                    data = function(data, **params, **kwargs)
+                if checkpoint:
+                    checkpoint(name, data)
+                if timings is not None:
+                    timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+            continue
+        Logger.logger.debug(f"Fused stages: {[step[0] for step in group]}")
+        start = time.perf_counter()
+        snapshots = [[] for _ in group[:-1]] if checkpoint else None
+        with measure("+".join(step[0] for step in group), data):
+            data = apply_token_operations(data, [operation for *_, operation in group],
+                                          snapshots)
+        if checkpoint:
+            for (name, *_), snapshot in zip(group, snapshots + [data]):
+                checkpoint(name, snapshot)
+        if timings is not None:
+            name = "+".join(step[0] for step in group)
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+    return data
+
+
+def stream_stages(stream: Iterable[FileLine], stages: List[Tuple[str, dict]],
+                  functions: List[Callable] = None, chunk_size: int = 1000,
+                  **kwargs) -> Generator:
+    """
+    Streaming version of run_fused, the stages are applied in the given order in every chunk
+    of chunk_size lines of the stream and the lines are yielded, so only one chunk is in memory.
+    The per word operations are created once for the whole stream and no checkpoints are
+    created in this mode.
+    :param kwargs: extra keyword arguments for all the stages, for example the workers
+    :raise: KeyError in case of an unknown stage
+    """
+    groups = fused_groups(stages, functions)
+    Logger.logger.debug(f"Streaming stages: {[name for name, _ in stages]}")
+    for chunk in chunked(stream, chunk_size):
+        for fusible, group in groups:
+            if fusible:
+                chunk = apply_token_operations(chunk, [operation for *_, operation in group])
+                continue
+            for name, params, function, _ in group:
+                chunk = function(chunk, **params, **kwargs)
+        yield from chunk
+
+
+def run_stages(data: List[FileLine], stages: List[Tuple[str, dict]], fused: bool = False,
+               **kwargs) -> List[FileLine]:
+    """
+    Applies the stages in the given order
+    :param fused: the stages which work word by word are applied in one pass, see run_fused
+    :param kwargs: extra keyword arguments for all the stages, for example the workers
+    :raise: KeyError in case of an unknown stage
+    """
+    if fused:
+        return run_fused(data, stages, **kwargs)
+    for name, params in stages:
+        data = supported_stages[name](data, **params, **kwargs)
+    return data
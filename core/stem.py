@@ -1,7 +1,10 @@
+from hash_tag.core.columnar import write_lines
 from hash_tag.core.data_loader import FileLine
-from hash_tag.tools.logger import Logger, logged
-from hash_tag.tools.helpers import write_json, write
-from typing import List
+from hash_tag.tools.cache import LRUCache
+from hash_tag.tools.logger import Logger
+from hash_tag.tools.helpers import checkpoint_writer
+from hash_tag.tools.metrics import watch_cache
+from typing import List, Callable, Optional
 import os
 
 try:
@@ -13,27 +16,91 @@ except Exception as e:
     Logger.logger.error(e)
 
 
-@logged
-def stem_words(data: List[FileLine], vocabulary: str, stemmer: str, saves_dir: str,
-               debug: bool = False) -> List[FileLine]:
+# a memo with the stem of each (stemmer, word), most of the words of a text are the same few
+# thousands so most of the stems are calculated only once
+stem_cache = LRUCache(max_size=200000, name="stem cache")
+watch_cache(stem_cache)
+
+
+def _cached_stem(stemmer_obj) -> Callable:
     """
-    Stem words using nltk PorterStemmer or LancasterStemmer for english language only
+    Returns a function which stems a word with the stemmer_obj through the stem_cache
     """
-    english_stemmer_driver = {"porter": PorterStemmer,
-                              "lancaster": LancasterStemmer}
+    stemmer_name = stemmer_obj.__class__.__name__
+
+    def stem(word: str) -> str:
+        key = (stemmer_name, word)
+        stemmed_word = stem_cache.get(key)
+        if stemmed_word is None:
+            stemmed_word = stemmer_obj.stem(word)
+            stem_cache.put(key, stemmed_word)
+        return stemmed_word
+
+    return stem
 
-    if vocabulary.lower() == "english":
+
+def load_stem_cache(saves_dir: str) -> None:
+    """
+    Warm start of an empty stem cache from the save of a previous run
+    """
+    if not len(stem_cache):
         try:
-            stemmer_obj = english_stemmer_driver[stemmer.lower()]()
-            for line in data:
-                line.words = [stemmer_obj.stem(word) for word in line.words]
-
-            if debug:
-                write(os.path.join(saves_dir, f"{stemmer_obj.__class__.__name__}"), data)
-                write_json(os.path.join(saves_dir, f"{stemmer_obj.__class__.__name__}"), data)
-        except KeyError as error:
-            Logger.logger.error(f"Key error: {error}")
-    else:
+            stem_cache.load(os.path.join(saves_dir, "stem_cache"))
+        except FileNotFoundError:
+            Logger.logger.debug("There isn't any saved stem cache")
+
+
+def save_stem_cache(saves_dir: str) -> None:
+    """
+    Saves the stem cache in saves_dir for the next runs, see load_stem_cache
+    """
+    stem_cache.save(os.path.join(saves_dir, "stem_cache"))
+
+
+def _get_stemmer(vocabulary: str, stemmer: str):
+    """
+    Returns a new stemmer object for the requested vocabulary or None if there isn't any
+    """
+    english_stemmer_driver = {"porter": PorterStemmer,
+                              "lancaster": LancasterStemmer}
+    if vocabulary.lower() != "english":
         Logger.logger.info(f"There aren't any register stemmer's for the "
                            f"requested language:{vocabulary}")
+        return None
+    try:
+        return english_stemmer_driver[stemmer.lower()]()
+    except KeyError as error:
+        Logger.logger.error(f"Key error: {error}")
+        return None
+
+
+def stem_words(data: List[FileLine], vocabulary: str, stemmer: str, saves_dir: str,
+               debug: bool = False, persist_cache: bool = False) -> List[FileLine]:
+    """
+    Stem words using nltk PorterStemmer or LancasterStemmer for english language only
+    :param persist_cache: load the stem cache from saves_dir and save it back after stemming
+    """
+    stemmer_obj = _get_stemmer(vocabulary=vocabulary, stemmer=stemmer)
+    if stemmer_obj:
+        if persist_cache:
+            load_stem_cache(saves_dir)
+        stem = _cached_stem(stemmer_obj)
+        for line in data:
+            line.words = [stem(word) for word in line.words]
+        stem_cache.log_stats()
+        if persist_cache:
+            save_stem_cache(saves_dir)
+
+        if debug:
+            checkpoint_writer.submit(os.path.join(saves_dir, f"{stemmer_obj.__class__.__name__}"),
+                                     data, writer=write_lines)
     return data
+
+
+def token_stemmer(vocabulary: str, stemmer: str) -> Optional[Callable]:
+    """
+    Returns the cached stem function of stem_words for one word or None if there isn't any
+    stemmer for the vocabulary
+    """
+    stemmer_obj = _get_stemmer(vocabulary=vocabulary, stemmer=stemmer)
+    return _cached_stem(stemmer_obj) if stemmer_obj else None
@@ -0,0 +1,182 @@
+from hash_tag.core.columnar import ColumnarLines, encode_lines, read_lines, release
+from hash_tag.tools.logger import Logger
+from typing import Dict, Iterable, List, Optional
+import dataclasses
+import hashlib
+import os
+import pickle
+import struct
+
+# The end of the token cache file: the position of the pickled index and the magic
+_INDEX_MAGIC = b"HTTOKIX1"
+_TRAILER = struct.Struct("<Q8s")
+
+
+@dataclasses.dataclass
+class FileFingerprint:
+    """
+    a struct like class to identify the content of an input file
+    size: the size of the file in bytes
+    mtime: the modification time of the file in nanoseconds
+    digest: the blake2b hash of the content of the file
+    """
+    size: int
+    mtime: int
+    digest: str
+
+
+class TokenCache:
+    """
+    A per file cache with the extracted FileLine objects of each input file.
+    Each entry is keyed by the path of the file and it is valid as long as the size and the
+    modification time or the content hash of the file are the same, so only new or changed
+    files need to be tokenized again.
+    The cache is one file, cache_path.lines, with the lines of each input file in the columnar
+    format (see core/columnar.py) one after the other, then the pickled index
+    {"file_path": (FileFingerprint, start, size)} and at the end the position of the index.
+    The file is memory mapped, so the cache is loaded without reading the lines or creating
+    any FileLine object, they are created only when they are accessed.
+    """
+
+    def __init__(self, cache_path: str):
+        self._pack_path = f"{cache_path}.lines"
+        self._entries = {}
+        self._changed = False
+        self.name = "token cache"
+        self.hits = 0
+        self.misses = 0
+        try:
+            self._entries = self._read()
+        except FileNotFoundError:
+            Logger.logger.debug(f"There isn't any token cache at: {self._pack_path}")
+        except (ValueError, OSError, struct.error, pickle.UnpicklingError, EOFError) as error:
+            Logger.logger.error(f"Invalid token cache at: {self._pack_path}: {error}, "
+                                f"the input files are parsed again")
+
+    def _read(self) -> dict:
+        """
+        Memory maps the cache file, returns {"file_path": (FileFingerprint, ColumnarLines)}
+        :raise: FileNotFoundError in case there isn't any cache, ValueError in case of an
+        invalid one
+        """
+        with open(self._pack_path, "rb") as f:
+            f.seek(-_TRAILER.size, os.SEEK_END)
+            index_position, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+            if magic != _INDEX_MAGIC:
+                raise ValueError("Not a token cache file")
+            f.seek(index_position)
+            index = pickle.load(f)
+        file_lines = read_lines(self._pack_path,
+                                ranges=[(start, size) for _, start, size in index.values()])
+        return {file_path: (fingerprint, lines) for (file_path, (fingerprint, _, _)), lines
+                in zip(index.items(), file_lines.split())}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, file_path: str):
+        return file_path in self._entries
+
+    @staticmethod
+    def fingerprint(file_path: str, with_digest: bool = True) -> FileFingerprint:
+        """
+        Returns the FileFingerprint of the given file, the content hash is calculated only
+        if with_digest is True because it needs a full read of the file.
+        """
+        stat = os.stat(file_path)
+        digest = ""
+        if with_digest:
+            hash_obj = hashlib.blake2b(digest_size=16)
+            with open(file_path, "rb") as file_reader:
+                for block in iter(lambda: file_reader.read(1024 * 1024), b""):
+                    hash_obj.update(block)
+            digest = hash_obj.hexdigest()
+        return FileFingerprint(size=stat.st_size, mtime=stat.st_mtime_ns, digest=digest)
+
+    def lookup(self, file_path: str) -> Optional[ColumnarLines]:
+        """
+        Returns the cached FileLine objects of the file or None if the file is new or
+        its content has changed. The content hash is checked only when the size or the
+        modification time are different from the cached ones.
+        """
+        if file_path not in self._entries:
+            self.misses += 1
+            return None
+        cached_fingerprint, file_lines = self._entries[file_path]
+        fingerprint = self.fingerprint(file_path, with_digest=False)
+        if (fingerprint.size, fingerprint.mtime) == (cached_fingerprint.size,
+                                                    cached_fingerprint.mtime):
+            self.hits += 1
+            return file_lines.view()
+        fingerprint = self.fingerprint(file_path)
+        if fingerprint.digest == cached_fingerprint.digest:
+            # touched but not changed, keep the new modification time
+            self._entries[file_path] = (fingerprint, file_lines)
+            self._changed = True
+            self.hits += 1
+            return file_lines.view()
+        self.misses += 1
+        return None
+
+    def update(self, file_path: str, file_lines: List) -> ColumnarLines:
+        """
+        Stores the FileLine objects of the file with its current fingerprint and returns
+        them as they are stored
+        """
+        file_lines = ColumnarLines([encode_lines(file_lines)])
+        self._entries[file_path] = (self.fingerprint(file_path), file_lines)
+        self._changed = True
+        return file_lines.view()
+
+    def prune(self, file_paths: Iterable[str]) -> List[str]:
+        """
+        Drops the entries of the files which are not in file_paths anymore and
+        returns their paths.
+        """
+        file_paths = set(file_paths)
+        removed = [file_path for file_path in self._entries if file_path not in file_paths]
+        for file_path in removed:
+            del self._entries[file_path]
+            self._changed = True
+        return removed
+
+    def fingerprints(self) -> Dict[str, FileFingerprint]:
+        return {file_path: entry[0] for file_path, entry in self._entries.items()}
+
+    def lines(self, file_paths: Iterable[str]) -> ColumnarLines:
+        """
+        Returns the cached FileLine objects of the given files in their order, without
+        checking the files again
+        :raise: KeyError in case a file is not in the cache
+        """
+        return ColumnarLines.concat(self._entries[file_path][1] for file_path in file_paths)
+
+    def save(self) -> None:
+        """
+        Writes the cache only if at least one entry has changed, the new file replaces the
+        previous one which is memory mapped again
+        """
+        if not self._changed:
+            return
+        Logger.logger.debug(f"Saving the token cache at: {self._pack_path}")
+        temp_path = f"{self._pack_path}.tmp"
+        self._write(temp_path)
+        # the mapping of the previous file is released before it is replaced, only the lines
+        # which are still used outside the cache are copied in memory
+        self._entries = {}
+        release(self._pack_path)
+        os.replace(temp_path, self._pack_path)
+        self._entries = self._read()
+        self._changed = False
+
+    def _write(self, file_path: str) -> None:
+        index = {}
+        with open(file_path, "wb") as f:
+            for cached_path, (fingerprint, file_lines) in self._entries.items():
+                start = f.tell()
+                for buffer in file_lines.buffers():
+                    f.write(buffer)
+                index[cached_path] = (fingerprint, start, f.tell() - start)
+            index_position = f.tell()
+            pickle.dump(index, f, pickle.HIGHEST_PROTOCOL)
+            f.write(_TRAILER.pack(index_position, _INDEX_MAGIC))
@@ -0,0 +1,68 @@
+from hash_tag.tools.resources import require
+from typing import Generator
+import re
+
+# A tokenizer is a module level function (so the DataLoader workers can use it) which takes a
+# line of an input file and yields (words, sentence) for each sentence of the line.
+
+
+def nltk_tokenize(line: str) -> Generator:
+    """
+    The nltk sent_tokenize (punkt) and word_tokenize (treebank), it's useful because no matter
+    what kind of punctuation we have in the sentence, it is able to split them and extract the
+    word tokens.
+    :raise: LookupError in case the nltk punkt tokenizer is missing, see tools/resources.py
+    """
+    require("punkt")
+    from nltk.tokenize import word_tokenize, sent_tokenize
+    yield from ((word_tokenize(sentence), sentence) for sentence in sent_tokenize(line))
+
+
+# a sentence ends with .!? (and maybe a closing quote or bracket) before the next sentence
+# which starts with an upper case letter or a digit, except after an abbreviation
+_sentence_end = re.compile(r"""[.!?]["'”’)\]]?\s+(?=["'“‘(\[]?[A-Z0-9])""")
+_abbreviations = {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "col", "gen", "gov", "sen",
+                  "rep", "lt", "sgt", "capt", "vs", "etc", "no", "inc", "co", "corp", "jan",
+                  "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec"}
+
+# the words like the treebank tokenizer of word_tokenize for the alphabetic tokens:
+# the contractions before a space or a punctuation are split (do n't, we 've, can not, gon na),
+# the inner hyphens, apostrophes, slashes and dots are kept in the word (well-known, o'clock,
+# HIV/AIDS, U.S.-Russian), a dot is split only at the end of the sentence (Mr. but end .),
+# a leading apostrophe is kept ('em) and every other char is a token, like the curly ones
+_word_token = re.compile(r"""
+    \b(?:can(?=not\b)|gim(?=me\b)|gon(?=na\b)|got(?=ta\b)|lem(?=me\b)|wan(?=na\b))
+  | \w+(?=(?:n't|'(?:s|re|ve|ll|d|m))(?![\w'-]))
+  | n't(?![\w'-])
+  | '(?:s|re|ve|ll|d|m)(?![\w'-])
+  | (?:(?<![\w'])')?\w+(?:(?:\.-|[-'./])\w+)*(?:\.(?!\.)(?![\])}"'”’]*\s*$))?
+  | \S
+""", re.VERBOSE | re.IGNORECASE)
+
+
+def _split_sentences(line: str) -> Generator:
+    start = 0
+    for match in _sentence_end.finditer(line):
+        if line[match.start()] == ".":
+            word = line[line.rfind(" ", start, match.start()) + 1:match.start()]
+            if word.lower() in _abbreviations or "." in word or \
+                    (len(word) == 1 and word.isupper()):
+                continue
+        yield line[start:match.start() + len(match.group().rstrip())]
+        start = match.end()
+    if start < len(line):
+        yield line[start:]
+
+
+def regex_tokenize(line: str) -> Generator:
+    """
+    A fast tokenizer with compiled regular expressions, it splits the sentences on .!? before
+    an upper case letter except after the initials and some common abbreviations, its
+    alphabetic words are the same as the word_tokenize ones in most of the cases, the
+    punctuation tokens can be different.
+    """
+    for sentence in _split_sentences(line.strip()):
+        yield _word_token.findall(sentence), sentence
+
+
+tokenizers = {"nltk": nltk_tokenize, "regex": regex_tokenize}
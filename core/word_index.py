@@ -0,0 +1,304 @@
+from hash_tag.core.common_words import StringTable, UniqueIds, WordCounterDict, \
+    WordOccurrence, counting_engines
+from hash_tag.core.data_loader import FileLine
+from hash_tag.tools.helpers import restore, write
+from hash_tag.tools.logger import Logger, logged
+from typing import Dict, Iterable, List, Tuple
+import bisect
+import heapq
+import itertools
+
+
+class WordIndex:
+    """
+    An inverted index of all the words of the data: word -> (document frequency, lines).
+    It is built once for a state of the pipeline and it answers the queries "top_k words
+    which exist in at least criterion files" without counting the words again.
+    The words are kept in buckets by their document frequency (number of files) and every
+    bucket is sorted by the counter, the ties keep the order of the first occurrence of the
+    word in the data, like the CalculateCommonWords ranking.
+    The postings are stored once in word_dict, for each file the index keeps only its unique
+    lines and words in the order of their first occurrence, so the lines of new files can be
+    added and the lines of removed files can be retracted without counting all the data again.
+    The strings of the retracted lines and files are dropped from the tables when they are at
+    least half of them. The files are kept sorted by name like the DataLoader input files.
+    """
+
+    def __init__(self, engine: str = "dict"):
+        """
+        :param engine: the counting engine of the words of each file, see counting_engines
+        :raise: ValueError in case of an unknown engine
+        """
+        if engine not in counting_engines:
+            raise ValueError(f"Unknown counting engine: {engine}, "
+                             f"supported: {list(counting_engines)}")
+        self.engine = engine
+        self.line_table = StringTable()
+        self.file_table = StringTable()
+        self.word_dict = WordCounterDict(line_table=self.line_table, file_table=self.file_table)
+        self._files = []
+        # file name -> {line id: position of the line in the unique lines of the file}
+        self._file_lines = {}
+        # file name -> the unique words of the file in the order of their first occurrence
+        self._file_words = {}
+        # line id -> the names of the files which contain the line
+        self._line_files = {}
+        self._buckets = None
+        self._word_ranks = {}
+
+    @classmethod
+    @logged
+    def build(cls, data: Iterable[FileLine], engine: str = "dict") -> "WordIndex":
+        """
+        Counts all the words of the data, data can be a generator
+        """
+        word_index = cls(engine=engine)
+        word_index.add(data)
+        return word_index
+
+    @property
+    def files(self) -> List[str]:
+        return list(self._files)
+
+    @logged
+    def add(self, data: Iterable[FileLine]) -> None:
+        """
+        Counts the lines of new files and merges their postings in the index
+        :raise: ValueError in case a file is already in the index, it must be retracted first
+        """
+        file_lines = {}
+        for line in data:
+            if line.file_name not in file_lines:
+                if line.file_name in self._file_lines:
+                    raise ValueError(f"File: {line.file_name} is already in the index")
+                file_lines[line.file_name] = []
+            file_lines[line.file_name].append(line)
+        # the saved indexes of the previous versions don't have an engine
+        count_words = counting_engines[self.engine]
+        partials = {file_name: count_words(lines, line_table=self.line_table,
+                                           file_table=self.file_table)
+                    for file_name, lines in sorted(file_lines.items())}
+        if not partials:
+            return
+        append_only = not self._files or min(partials) > self._files[-1]
+        new_occurrences = {}
+        for file_name, partial in partials.items():
+            self._add_file(file_name, file_lines[file_name], partial)
+            for word, occurrences in partial.items():
+                new_occurrences.setdefault(word, []).append(occurrences)
+        for word, occurrences in new_occurrences.items():
+            word_occurrence = dict.get(self.word_dict, word)
+            if word_occurrence is None:
+                word_occurrence = self._copy(occurrences[0])
+                dict.__setitem__(self.word_dict, word, word_occurrence)
+                occurrences = occurrences[1:]
+            self._merge(word_occurrence, occurrences)
+        if not append_only:
+            # the new files are between the others, their lines and files are not at the end
+            self._reorder(new_occurrences)
+        self._invalidate()
+
+    def _add_file(self, file_name: str, lines: List[FileLine], partial: WordCounterDict) -> None:
+        """
+        Keeps the unique lines and words of a new file, the lines are already interned from
+        the counting of the file
+        """
+        bisect.insort(self._files, file_name)
+        file_lines = {}
+        for line in lines:
+            if line.words:
+                file_lines.setdefault(self.line_table.intern(line.line), len(file_lines))
+        for line_id in file_lines:
+            self._line_files.setdefault(line_id, []).append(file_name)
+        self._file_lines[file_name] = file_lines
+        self._file_words[file_name] = list(partial)
+
+    @logged
+    def retract(self, file_names: Iterable[str]) -> None:
+        """
+        Removes the postings of the given files from the index
+        """
+        words = {}
+        removed_file_ids = set()
+        for file_name in file_names:
+            file_lines = self._file_lines.pop(file_name, None)
+            if file_lines is None:
+                continue
+            self._files.remove(file_name)
+            removed_file_ids.add(self.file_table.intern(file_name))
+            words.update(dict.fromkeys(self._file_words.pop(file_name)))
+            for line_id in file_lines:
+                line_files = self._line_files[line_id]
+                line_files.remove(file_name)
+                if not line_files:
+                    del self._line_files[line_id]
+        for word in words:
+            occurrences = self.word_dict[word]
+            file_ids = [file_id for file_id in occurrences.file_ids
+                        if file_id not in removed_file_ids]
+            if not file_ids:
+                dict.__delitem__(self.word_dict, word)
+                continue
+            # a line of a removed file stays if another file has it too
+            line_ids = [line_id for line_id in occurrences.line_ids
+                        if line_id in self._line_files]
+            dict.__setitem__(self.word_dict, word, self._occurrence(line_ids, file_ids))
+        # the first file of a line which is still in other files may be removed
+        self._reorder(word for word in words if word in self.word_dict)
+        self._compact()
+        self._invalidate()
+
+    def _reorder(self, words: Iterable[str]) -> None:
+        """
+        Sorts the lines and files of the given words like a full rebuild: the files by their
+        position and the lines by (position of the first file of the line, position of the
+        line in this file)
+        """
+        positions = {file_name: position for position, file_name in enumerate(self._files)}
+        file_positions = {}
+        line_positions = {}
+
+        def file_position(file_id: int) -> int:
+            if file_id not in file_positions:
+                file_positions[file_id] = positions[self.file_table[file_id]]
+            return file_positions[file_id]
+
+        def line_position(line_id: int) -> Tuple[int, int]:
+            if line_id not in line_positions:
+                file_name = min(self._line_files[line_id], key=positions.get)
+                line_positions[line_id] = (positions[file_name],
+                                           self._file_lines[file_name][line_id])
+            return line_positions[line_id]
+
+        for word in words:
+            occurrences = self.word_dict[word]
+            dict.__setitem__(self.word_dict, word, self._occurrence(
+                sorted(occurrences.line_ids, key=line_position),
+                sorted(occurrences.file_ids, key=file_position)))
+
+    def _compact(self) -> None:
+        """
+        Drops the strings of the retracted lines or files when they are at least half of their
+        table, the ids of the postings are mapped to the new tables. The new tables are new
+        objects, the results which were taken from the index before stay valid.
+        """
+        dead_lines = len(self.line_table) - len(self._line_files)
+        dead_files = len(self.file_table) - len(self._files)
+        compact_lines = dead_lines and dead_lines * 2 >= len(self.line_table)
+        compact_files = dead_files and dead_files * 2 >= len(self.file_table)
+        if not compact_lines and not compact_files:
+            return
+        line_map = file_map = None
+        if compact_lines:
+            Logger.logger.debug(f"Dropping {dead_lines} retracted lines from the line table")
+            self.line_table, line_map = self.line_table.compacted(self._line_files)
+            self._line_files = {line_map[line_id]: files
+                                for line_id, files in self._line_files.items()}
+            self._file_lines = {file_name: {line_map[line_id]: position
+                                            for line_id, position in file_lines.items()}
+                                for file_name, file_lines in self._file_lines.items()}
+        if compact_files:
+            Logger.logger.debug(f"Dropping {dead_files} retracted files from the file table")
+            self.file_table, file_map = self.file_table.compacted(
+                self.file_table.intern(file_name) for file_name in self._files)
+        word_dict = WordCounterDict(line_table=self.line_table, file_table=self.file_table)
+        for word, occurrences in self.word_dict.items():
+            line_ids, file_ids = occurrences.line_ids, occurrences.file_ids
+            if line_map is not None:
+                line_ids = [line_map[line_id] for line_id in line_ids]
+            if file_map is not None:
+                file_ids = [file_map[file_id] for file_id in file_ids]
+            dict.__setitem__(word_dict, word, self._occurrence(line_ids, file_ids))
+        self.word_dict = word_dict
+
+    def _occurrence(self, line_ids: Iterable[int], file_ids: Iterable[int]) -> WordOccurrence:
+        line_ids = UniqueIds(line_ids)
+        return WordOccurrence(counter=len(line_ids), line_ids=line_ids,
+                              file_ids=UniqueIds(file_ids),
+                              line_table=self.line_table, file_table=self.file_table)
+
+    def _copy(self, occurrences: WordOccurrence) -> WordOccurrence:
+        return self._occurrence(occurrences.line_ids, occurrences.file_ids)
+
+    @staticmethod
+    def _merge(word_occurrence: WordOccurrence, others: List[WordOccurrence]) -> None:
+        """
+        Adds the unique lines and files of the others in the word_occurrence, each check is
+        O(1) from the UniqueIds
+        """
+        for occurrences in others:
+            for line_id in occurrences.line_ids:
+                word_occurrence.line_ids.add(line_id)
+            for file_id in occurrences.file_ids:
+                word_occurrence.file_ids.add(file_id)
+        word_occurrence.counter = len(word_occurrence.line_ids)
+
+    def _invalidate(self) -> None:
+        self._buckets = None
+        self._word_ranks = {}
+
+    def _rank(self, word: str, positions: Dict[str, int]) -> Tuple[int, int]:
+        """
+        The position of the first occurrence of the word: (position of the first file,
+        position of the word in the words of this file)
+        """
+        file_name = self.file_table[self.word_dict[word].file_ids[0]]
+        if file_name not in self._word_ranks:
+            self._word_ranks[file_name] = {file_word: position for position, file_word
+                                           in enumerate(self._file_words[file_name])}
+        return positions[file_name], self._word_ranks[file_name][word]
+
+    @property
+    def buckets(self) -> Dict[int, List[tuple]]:
+        """
+        Returns the words grouped by document frequency as {df: [(-counter, rank, word), ...]}
+        where rank is the position of the first occurrence of the word, each list is sorted.
+        """
+        if self._buckets is None:
+            self._buckets = {}
+            positions = {file_name: position for position, file_name in enumerate(self._files)}
+            for word, occurrences in self.word_dict.items():
+                self._buckets.setdefault(len(occurrences.file_ids), []).append(
+                    (-occurrences.counter, self._rank(word, positions), word))
+            for bucket in self._buckets.values():
+                bucket.sort()
+        return self._buckets
+
+    def document_frequency(self, word: str) -> int:
+        return len(self.word_dict[word].file_ids)
+
+    def common(self, criterion: int) -> WordCounterDict:
+        """
+        Returns all the words which exist in at least criterion files
+        """
+        return self.word_dict.filtered(lambda occurrences:
+                                       len(occurrences.file_ids) >= criterion)
+
+    def top(self, criterion: int, top_k: int = None) -> List[Tuple[str, WordOccurrence]]:
+        """
+        Returns the top_k (word, WordOccurrence) with at least criterion files sorted by the
+        counter, the sorted buckets are merged lazily so only top_k words are visited.
+        :param top_k: None returns the whole ranking
+        """
+        buckets = [bucket for frequency, bucket in self.buckets.items()
+                   if frequency >= criterion]
+        ranking = itertools.islice(heapq.merge(*buckets), top_k)
+        return [(word, self.word_dict[word]) for _, _, word in ranking]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_buckets"] = None
+        state["_word_ranks"] = {}
+        return state
+
+    def save(self, file_path: str) -> None:
+        write(file_path, self)
+
+    @classmethod
+    def load(cls, file_path: str) -> "WordIndex":
+        """
+        Restores an index from the save at file_path (without the .pickle)
+        :raise: FileNotFoundError in case there isn't any save
+        """
+        Logger.logger.debug(f"Loading the word index from: {file_path}")
+        return restore(f"{file_path}.pickle")
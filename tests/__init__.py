@@ -0,0 +1,18 @@
+import os
+import shutil
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def temp_folders(temp_dir: str) -> dict:
+    """
+    Returns the saves and results folders of a DataLoader inside the given temporary directory,
+    the saves folder starts with the extracted tokens of saves_from_unittest, so the tests
+    don't need the nltk punkt data and don't leave any cache behind.
+    """
+    saves_dir = os.path.join(temp_dir, "saves")
+    os.mkdir(saves_dir)
+    shutil.copy(os.path.join(tests_dir, "saves_from_unittest", "extracted_tokens.pickle"),
+                saves_dir)
+    return {"saves_folder_name": saves_dir,
+            "results_folder_name": os.path.join(temp_dir, "results")}
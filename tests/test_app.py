@@ -0,0 +1,138 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.app import HastTagApp
+from hash_tag.core.common_words import CalculateCommonWords
+from hash_tag.core.data_loader import DataLoader
+from hash_tag.core.filters import filter_punctuation, filter_stop_words
+from hash_tag.core.stem import stem_words
+from hash_tag.core.word_index import WordIndex
+from hash_tag.tools.helpers import checkpoint_writer
+from hash_tag.tools.logger import Logger
+
+# turn off the logger
+Logger.logger = MagicMock()
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+stop_words = ["this", "because", "does", "was", "has", "the", "and", "to", "of", "a", "in",
+              "that", "we", "our", "is", "it", "for"]
+
+
+class TestApp(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.temp_dir.name, "data")
+        shutil.copytree(os.path.join(tests_dir, "data"), self.input_dir)
+        data_loader = DataLoader(input_files_path=self.input_dir,
+                                 saves_folder_name=os.path.join(self.temp_dir.name, "saves"),
+                                 results_folder_name=os.path.join(self.temp_dir.name, "results"),
+                                 tokenizer="regex")
+        self.app = HastTagApp(data_loader=data_loader)
+        self.app.debug = False
+        self.app.stemmer = "porter"
+        self.app.common_criterion = 2
+        self.app.result_formats = ["csv"]
+        # the nltk stop words without the nltk data
+        self.patches = [patch("hash_tag.core.filters.require"),
+                        patch("hash_tag.core.filters.stopwords",
+                              MagicMock(words=MagicMock(return_value=stop_words)))]
+        for stop_words_patch in self.patches:
+            stop_words_patch.start()
+
+    def tearDown(self):
+        for stop_words_patch in self.patches:
+            stop_words_patch.stop()
+        checkpoint_writer.wait()
+        self.temp_dir.cleanup()
+
+    def test_stream(self):
+        print("##########################################################################")
+        print("#################### test app stream #####################################")
+        print("##########################################################################")
+        self.app.do_add("filter_punctuation filter_stop_words")
+        self.app.do_stream("")
+        streamed = self.app.common_words.word_dict
+        # the stop words are filtered before the stem, they can't leak as stems
+        for stem in ("thi", "becaus", "doe", "wa", "ha"):
+            self.assertNotIn(stem, streamed)
+        self.assertIn("nation", streamed)
+        # the same stages on the materialized data
+        self.app.do_apply("")
+        data = stem_words(self.app.data, vocabulary="english", stemmer="porter", saves_dir=None)
+        common_words = CalculateCommonWords(results_dir="", data=data, common_criterion=2)
+        self.assertEqual(streamed, common_words.word_dict)
+
+    def test_update(self):
+        print("##########################################################################")
+        print("#################### test app update #####################################")
+        print("##########################################################################")
+        self.app.do_parse("")
+        self.app.do_add("filter_punctuation")
+        self.app.do_apply("")
+        self.app.do_show("")
+        # added, changed and removed input files
+        shutil.copy(os.path.join(self.input_dir, "doc2.txt"),
+                    os.path.join(self.input_dir, "doc7.txt"))
+        with open(os.path.join(self.input_dir, "doc1.txt"), "a", encoding="utf8") as file_writer:
+            file_writer.write("The people of this great nation\n")
+        os.remove(os.path.join(self.input_dir, "doc4.txt"))
+        self.app.do_update("")
+        data_loader = DataLoader(input_files_path=self.input_dir,
+                                 saves_folder_name=os.path.join(self.temp_dir.name, "rebuild"),
+                                 results_folder_name=os.path.join(self.temp_dir.name, "results"),
+                                 tokenizer="regex")
+        data = filter_punctuation(data_loader.data)
+        full_index = WordIndex.build(data)
+        self.assertEqual(self.app.data, data)
+        self.assertEqual(self.app.word_index.files, full_index.files)
+        self.assertEqual(self.app.word_index.word_dict, full_index.word_dict)
+        self.assertEqual(self.app.word_index.top(criterion=2), full_index.top(criterion=2))
+
+    def test_stages(self):
+        print("##########################################################################")
+        print("#################### test app stages #####################################")
+        print("##########################################################################")
+        self.app.do_parse("")
+        self.app.do_add("filter_punctuation filter_stop_words")
+        self.app.do_apply("")
+        self.app.do_stem("")
+        # one ordered list with the filters and then the stem
+        stages = [("filter_punctuation", {}),
+                  ("filter_stop_words", {"vocabulary": "english"}),
+                  ("stem", {"vocabulary": "english", "stemmer": "porter"})]
+        self.assertEqual(self.app.stages, stages)
+        data = filter_stop_words(filter_punctuation(self.app.data_loader.data),
+                                 vocabulary="english")
+        data = stem_words(data, vocabulary="english", stemmer="porter", saves_dir=None)
+        self.assertEqual(list(self.app.data), data)
+        # the stemmed data are not stemmed again
+        self.app.do_stem("")
+        self.assertEqual(self.app.stages, stages)
+        self.assertEqual(list(self.app.data), data)
+        # the whole list is cached, the stream applies the same stages
+        total, _ = self.app.stage_cache.lookup(self.app.data_loader.fingerprint, stages)
+        self.assertEqual(total, 3)
+        self.app.do_stream("")
+        common_words = CalculateCommonWords(results_dir="", data=data, common_criterion=2)
+        self.assertEqual(self.app.common_words.word_dict, common_words.word_dict)
+
+    def test_sweep_grid(self):
+        print("##########################################################################")
+        print("#################### test app sweep grid #################################")
+        print("##########################################################################")
+        self.app.do_parse("")
+        with patch("hash_tag.app.CalculateCommonWords") as common_words, \
+                patch("builtins.print") as printed:
+            for grid in ("", "2,4", "2,4 ", "2,4 0,5", "2, 5"):
+                self.app.do_sweep(grid)
+            common_words.assert_not_called()
+            self.assertTrue(all(call.args[0].startswith("Usage: sweep")
+                                for call in printed.call_args_list))
+            common_words.return_value.sweep.side_effect = ValueError("criterion")
+            self.app.do_sweep("2,4 5")
+            printed.assert_called_with("Invalid sweep: criterion")
@@ -0,0 +1,88 @@
+import unittest
+from unittest.mock import MagicMock
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.core.batch import BatchConfig, run_batch
+from hash_tag.tools import metrics
+from hash_tag.tools.logger import Logger
+
+# turn off the logger
+Logger.logger = MagicMock()
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_config(self):
+        print("##########################################################################")
+        print("#################### test batch config ###################################")
+        print("##########################################################################")
+        config = BatchConfig.from_dict({"stages": ["stem", "filter_punctuation"],
+                                        "stemmer": "porter", "tags": ["NN"]})
+        self.assertEqual(config.stage_list(),
+                         [("stem", {"vocabulary": "english", "stemmer": "porter"}),
+                          ("filter_punctuation", {})])
+        with self.assertRaises(ValueError):
+            BatchConfig.from_dict({"top": 3})
+        with self.assertRaises(ValueError):
+            BatchConfig(stages=["unknown"]).stage_list()
+
+    def test_run_batch(self):
+        print("##########################################################################")
+        print("#################### test run batch ######################################")
+        print("##########################################################################")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config = BatchConfig(input_files_path=os.path.join(tests_dir, "data"),
+                                 saves_folder_name=os.path.join(temp_dir, "saves"),
+                                 results_folder_name=os.path.join(temp_dir, "results"),
+                                 stages=["filter_punctuation", "stem"], stemmer="porter",
+                                 tokenizer="regex", criterion=6, top_k=3)
+            result = run_batch(config)
+            self.assertEqual(len(result.common), 3)
+            self.assertTrue(all(files == 6 for _, _, files in result.common))
+            self.assertIn("filter_punctuation+stem", result.timings)
+            for file_path in result.files:
+                self.assertTrue(os.path.exists(file_path))
+            with open(result.files[-1]) as f:
+                report = json.load(f)
+            self.assertEqual(report["config"]["stages"], ["filter_punctuation", "stem"])
+            self.assertEqual(report["common"][0]["word"], result.common[0][0])
+            # the second run reuses the stages from the stage cache
+            cached_result = run_batch(config)
+            self.assertEqual(cached_result.common, result.common)
+            self.assertNotIn("filter_punctuation+stem", cached_result.timings)
+            config.top_k = 10000
+            with self.assertRaises(ValueError):
+                run_batch(config)
+
+    def test_metrics_settings(self):
+        print("##########################################################################")
+        print("#################### test batch metrics settings #########################")
+        print("##########################################################################")
+        previous = dict(metrics.settings)
+        try:
+            metrics.configure(enabled=False, memory=False, profile_dir="")
+            with tempfile.TemporaryDirectory() as temp_dir:
+                config = BatchConfig(input_files_path=os.path.join(tests_dir, "data"),
+                                     saves_folder_name=os.path.join(temp_dir, "saves"),
+                                     results_folder_name=os.path.join(temp_dir, "results"),
+                                     stages=["filter_punctuation"], tokenizer="regex",
+                                     criterion=6, top_k=3, metrics=True, metrics_memory=True,
+                                     profile_dir=os.path.join(temp_dir, "profile"))
+                result = run_batch(config)
+                self.assertTrue(result.files[-1].endswith(".metrics.json"))
+                # the settings of the caller are restored, after a failed run too
+                self.assertEqual(metrics.settings, {"enabled": False, "memory": False,
+                                                    "profile_dir": None})
+                config.top_k = 10000
+                with self.assertRaises(ValueError):
+                    run_batch(config)
+                self.assertEqual(metrics.settings, {"enabled": False, "memory": False,
+                                                    "profile_dir": None})
+        finally:
+            metrics.configure(enabled=previous["enabled"], memory=previous["memory"],
+                              profile_dir=previous["profile_dir"] or "")
@@ -0,0 +1,101 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import pickle
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.core.columnar import ColumnarLines, encode_lines, read_lines, release, write_lines
+from hash_tag.core.data_loader import FileLine
+from hash_tag.tools.logger import Logger
+
+# turn off the logger
+Logger.logger = MagicMock()
+
+
+class TestColumnar(unittest.TestCase):
+
+    def setUp(self):
+        self.data = [FileLine(words=["nation", "people", "nation"], line="line 1",
+                              file_name="doc1.txt"),
+                     FileLine(words=[], line="line 2", file_name="doc1.txt"),
+                     FileLine(words=["troops", "ελλάδα"], line="line 1", file_name="doc2.txt")]
+
+    def test_columnar_lines(self):
+        print("##########################################################################")
+        print("#################### test columnar lines #################################")
+        print("##########################################################################")
+        lines = ColumnarLines([encode_lines(self.data), encode_lines([]),
+                               encode_lines(self.data[:1])])
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(list(lines), self.data + self.data[:1])
+        self.assertEqual(lines[-1], self.data[0])
+        self.assertEqual(lines[1:3], self.data[1:3])
+        # the changes are kept in the same sequence but not in a new view
+        self.assertEqual(lines.total_tokens, 8)
+        lines[0].words = ["nation"]
+        self.assertEqual(lines[0].words, ["nation"])
+        self.assertEqual(lines.total_tokens, 6)
+        self.assertEqual(lines.view()[0], self.data[0])
+        # pickled as a list
+        restored = pickle.loads(pickle.dumps(lines))
+        self.assertIsInstance(restored, list)
+        self.assertEqual(restored[0].words, ["nation"])
+
+    def test_write_and_read(self):
+        print("##########################################################################")
+        print("#################### test columnar write and read ########################")
+        print("##########################################################################")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "checkpoint")
+            write_lines(file_path, self.data)
+            lines = read_lines(f"{file_path}.lines")
+            self.assertEqual(lines, self.data)
+            # a new checkpoint doesn't change the mapped one
+            write_lines(file_path, self.data[:1])
+            self.assertEqual(lines.view(), self.data)
+            self.assertEqual(read_lines(f"{file_path}.lines"), self.data[:1])
+
+    def test_close_and_release(self):
+        print("##########################################################################")
+        print("#################### test columnar close and release #####################")
+        print("##########################################################################")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "checkpoint")
+            write_lines(file_path, self.data)
+            with read_lines(f"{file_path}.lines") as lines:
+                mapping = lines._segments[0]._buffer
+                self.assertEqual(lines[0], self.data[0])
+            self.assertTrue(mapping.closed)
+            # the accessed lines stay valid
+            self.assertEqual(lines[0], self.data[0])
+            # a live sequence is copied in memory before the file is replaced or removed
+            lines = read_lines(f"{file_path}.lines")
+            self.assertEqual(lines[1], self.data[1])
+            mapping = lines._segments[0]._buffer
+            write_lines(file_path, self.data[:1])
+            self.assertTrue(mapping.closed)
+            self.assertEqual(lines.view(), self.data)
+            lines = read_lines(f"{file_path}.lines")
+            mapping = lines._segments[0]._buffer
+            release(f"{file_path}.lines")
+            os.remove(f"{file_path}.lines")
+            self.assertTrue(mapping.closed)
+            self.assertEqual(lines, self.data[:1])
+
+    def test_read_ranges(self):
+        print("##########################################################################")
+        print("#################### test columnar ranges ################################")
+        print("##########################################################################")
+        buffers = [encode_lines(self.data), encode_lines(self.data[:1])]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "pack")
+            with open(file_path, "wb") as f:
+                f.write(b"".join(buffers))
+            lines = read_lines(file_path, ranges=[(len(buffers[0]), len(buffers[1])),
+                                                  (0, len(buffers[0]))])
+            self.assertEqual(lines, self.data[:1] + self.data)
+            mapping = lines._segments[0]._buffer
+            lines.close()
+            self.assertTrue(mapping.closed)
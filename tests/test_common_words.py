@@ -1,21 +1,31 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
+import copy
 import os
+import pickle
 import sys
+import tempfile
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from hash_tag.core.common_words import WordCounterDict, CalculateCommonWords
+from hash_tag.core.common_words import WordCounterDict, CalculateCommonWords, count_words, \
+    count_words_numpy, count_words_sharded, merge_counts, result_rows, render_results, UniqueIds
 from hash_tag.core.data_loader import DataLoader, FileLine
+from hash_tag.tests import temp_folders
+from hash_tag.core.word_index import WordIndex
 
 
 class TestDataLoader(unittest.TestCase):
     def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.folders = temp_folders(self.temp_dir.name)
         os.path.dirname = MagicMock(return_value=os.path.dirname(os.path.abspath(__file__)))
         self.data_loader = DataLoader(input_files_path="data",
-                                      saves_folder_name="saves_from_unittest",
-                                      results_folder_name="results_from_unittest")
+                                      **self.folders)
 
         self.maxDiff = None
 
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
     def test_word_counter_dict(self):
         print("##########################################################################")
         print("#################### test word counter dict ##############################")
@@ -85,3 +95,184 @@ class TestDataLoader(unittest.TestCase):
                                                      " brave the cold today$",
                                                      'Test line!'])
         self.assertEqual(word_counter["Let"].file_names, ['doc1.txt', 'test_file.txt'])
+
+    def test_word_counter_tables(self):
+        print("##########################################################################")
+        print("#################### test word counter tables ############################")
+        print("##########################################################################")
+        # each line and file name is stored once in the tables of the WordCounterDict and
+        # the WordOccurrence objects keep only their ids
+        word_counter = WordCounterDict()
+        first_line = FileLine(words=["people", "nation", "people"], line="people of the nation",
+                              file_name="doc1.txt")
+        second_line = FileLine(words=["people"], line="people", file_name="doc2.txt")
+        for file_line in (first_line, second_line, first_line):
+            for word_tokens in file_line.words:
+                word_counter[word_tokens] = file_line
+
+        self.assertEqual(word_counter.line_table.strings, ["people of the nation", "people"])
+        self.assertEqual(word_counter.file_table.strings, ["doc1.txt", "doc2.txt"])
+        self.assertEqual(list(word_counter["people"].line_ids), [0, 1])
+        self.assertEqual(list(word_counter["people"].file_ids), [0, 1])
+        self.assertEqual(word_counter["people"].counter, 2)
+        self.assertEqual(word_counter["people"].lines, ["people of the nation", "people"])
+        self.assertEqual(word_counter["nation"].file_names, ["doc1.txt"])
+
+        common = word_counter.filtered(lambda occurrences: len(occurrences.file_ids) >= 2)
+        self.assertEqual(list(common), ["people"])
+        self.assertIs(common.line_table, word_counter.line_table)
+        self.assertEqual(common.to_json(), {"data": {"people": {"counter": 2,
+                                                                "lines": [0, 1],
+                                                                "file_names": [0, 1]}},
+                                            "lines": ["people of the nation", "people"],
+                                            "file_names": ["doc1.txt", "doc2.txt"]})
+
+    def test_repeated_lines(self):
+        print("##########################################################################")
+        print("#################### test repeated lines #################################")
+        print("##########################################################################")
+        # the repeated lines and files are not appended again, in any order of the lines
+        lines = [FileLine(words=["people", "nation"], line=f"line {index % 5}",
+                          file_name=f"doc{index % 3}.txt") for index in range(40)]
+        word_counter = count_words(lines)
+        self.assertEqual(word_counter["people"].counter, 5)
+        self.assertEqual(word_counter["people"].lines, [f"line {index}" for index in range(5)])
+        self.assertEqual(word_counter["nation"].file_names, ["doc0.txt", "doc1.txt", "doc2.txt"])
+        self.assertEqual(word_counter, count_words_numpy(lines))
+
+    def test_unique_ids(self):
+        print("##########################################################################")
+        print("#################### test unique ids #####################################")
+        print("##########################################################################")
+        ids = UniqueIds([3, 1])
+        self.assertTrue(ids.add(2))
+        self.assertFalse(ids.add(2))
+        self.assertFalse(ids.add(3))
+        self.assertTrue(ids.add(7, is_new=True))
+        self.assertIn(7, ids)
+        self.assertNotIn(5, ids)
+        self.assertEqual(list(ids), [3, 1, 2, 7])
+        # the set is not pickled, it is built again on the first add
+        for restored in (pickle.loads(pickle.dumps(ids)), copy.deepcopy(ids)):
+            self.assertIsInstance(restored, UniqueIds)
+            self.assertFalse(restored.add(1))
+            self.assertTrue(restored.add(5))
+            self.assertEqual(list(restored), [3, 1, 2, 7, 5])
+        self.assertEqual(list(ids), [3, 1, 2, 7])
+
+    def test_get_common(self):
+        print("##########################################################################")
+        print("#################### test get common #####################################")
+        print("##########################################################################")
+        data = [FileLine(words=["nation", "people"], line="line 1", file_name="doc1.txt"),
+                FileLine(words=["people", "troops"], line="line 2", file_name="doc1.txt"),
+                FileLine(words=["troops", "home"], line="line 3", file_name="doc2.txt"),
+                FileLine(words=["nation"], line="line 4", file_name="doc2.txt")]
+        common_words = CalculateCommonWords(results_dir="", data=data, common_criterion=1)
+        ranking = list(common_words._get_common())
+        # same counter keeps the order of the first occurrence
+        self.assertEqual([word for word, _ in ranking], ["nation", "people", "troops", "home"])
+        for top_k in range(6):
+            self.assertEqual(list(common_words._get_common(top_k=top_k)), ranking[:top_k])
+
+    def test_numpy_engine(self):
+        print("##########################################################################")
+        print("#################### test numpy counting engine ##########################")
+        print("##########################################################################")
+        data = self.data_loader.data
+        data = list(data) + [FileLine(words=[], line="empty line", file_name="doc1.txt"),
+                             FileLine(words=data[0].words, line=data[0].line,
+                                      file_name="doc9.txt")]
+        word_dict = count_words(data)
+        numpy_word_dict = count_words_numpy(data)
+        self.assertEqual(list(numpy_word_dict), list(word_dict))
+        self.assertEqual(numpy_word_dict.to_json(), word_dict.to_json())
+        for criterion in (1, 2, 6):
+            common_words = CalculateCommonWords(results_dir="", data=data,
+                                                common_criterion=criterion)
+            numpy_common_words = CalculateCommonWords(results_dir="", data=data,
+                                                      common_criterion=criterion,
+                                                      engine="numpy")
+            self.assertEqual(list(numpy_common_words._get_common()),
+                             list(common_words._get_common()))
+        with self.assertRaises(ValueError):
+            CalculateCommonWords(results_dir="", data=data, engine="unknown")
+
+    def test_sharded_counting(self):
+        print("##########################################################################")
+        print("#################### test sharded counting ###############################")
+        print("##########################################################################")
+        data = self.data_loader.data
+        # the same line in a later shard and in a new file
+        data = list(data) + [FileLine(words=data[0].words, line=data[0].line,
+                                      file_name="doc9.txt")]
+        word_dict = count_words(data)
+        for engine in ("dict", "numpy"):
+            sharded_word_dict = count_words_sharded(data, workers=2, shard_size=7, engine=engine)
+            self.assertEqual(list(sharded_word_dict), list(word_dict))
+            self.assertEqual(sharded_word_dict.to_json(), word_dict.to_json())
+        partial = count_words(data[7:])
+        self.assertEqual(merge_counts(count_words(data[:7]), partial).to_json(),
+                         word_dict.to_json())
+        for criterion in (1, 2, 6):
+            common_words = CalculateCommonWords(results_dir="", data=data,
+                                                common_criterion=criterion)
+            sharded_common_words = CalculateCommonWords(results_dir="", data=iter(data),
+                                                        common_criterion=criterion,
+                                                        workers=2, shard_size=5)
+            self.assertEqual(list(sharded_common_words._get_common()),
+                             list(common_words._get_common()))
+
+    def test_sweep(self):
+        print("##########################################################################")
+        print("#################### test sweep ##########################################")
+        print("##########################################################################")
+        data = self.data_loader.data
+        common_words = CalculateCommonWords(results_dir="", data=data, common_criterion=2)
+        index_common_words = CalculateCommonWords(results_dir="", common_criterion=2,
+                                                  index=WordIndex.build(data))
+        rendered = []
+        with patch("hash_tag.core.common_words.render_results",
+                   side_effect=lambda **task: rendered.append(task) or "path"):
+            files = common_words.sweep(criteria=[2, 6], top_ks=[3, 10000])
+            self.assertEqual(sorted(files), [(2, 3), (6, 3)])
+            self.assertEqual(sorted(index_common_words.sweep(criteria=[6, 2], top_ks=[3])),
+                             [(2, 3), (6, 3)])
+        for criterion in (2, 6):
+            expected = result_rows(CalculateCommonWords(results_dir="", data=data,
+                                                        common_criterion=criterion)
+                                   ._get_common(top_k=3))
+            tasks = [task for task in rendered if task["criterion"] == criterion]
+            self.assertEqual(len(tasks), 2)
+            self.assertTrue(all(task["rows"] == expected for task in tasks))
+        with self.assertRaises(ValueError):
+            common_words.sweep(criteria=[1], top_ks=[3])
+        # an empty grid or a top_k lower than 1
+        for criteria, top_ks in (([], [3]), ([2], []), ([2], [0, 3])):
+            with self.assertRaises(ValueError):
+                common_words.sweep(criteria=criteria, top_ks=top_ks)
+            with self.assertRaises(ValueError):
+                index_common_words.sweep(criteria=criteria, top_ks=top_ks)
+
+    def test_render_results(self):
+        print("##########################################################################")
+        print("#################### test render results #################################")
+        print("##########################################################################")
+        common_words = CalculateCommonWords(results_dir="", data=self.data_loader.data,
+                                            common_criterion=6)
+        rows = result_rows(common_words._get_common(top_k=3))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = render_results(results_dir=temp_dir, file_name="results", rows=rows,
+                                       top_k=3, criterion=6, formats=("csv",))
+            self.assertEqual(os.listdir(temp_dir), ["results-topk=3-criterion=6.csv"])
+            with open(f"{file_path}.csv") as f:
+                self.assertEqual(f.readline(), "Words,counter,line/s,document/s\n")
+                self.assertTrue(f.readline().startswith(f"{rows[0][0]},{rows[0][1]},"))
+            render_results(results_dir=temp_dir, file_name="results", rows=rows, top_k=3,
+                           criterion=6, formats=("pdf", "png"))
+            self.assertEqual(sorted(os.listdir(temp_dir)),
+                             ["results-topk=3-criterion=6.csv", "results-topk=3-criterion=6.pdf",
+                              "results-topk=3-criterion=6.png"])
+            with self.assertRaises(ValueError):
+                render_results(results_dir=temp_dir, file_name="results", rows=rows, top_k=3,
+                               criterion=6, formats=("xlsx",))
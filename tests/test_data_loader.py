@@ -1,26 +1,35 @@
 import unittest
 import os
+import shutil
+import tempfile
 import sys
 from unittest.mock import MagicMock
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from hash_tag.core.data_loader import DataLoader, FileLine
+from hash_tag.core.token_cache import TokenCache
+from hash_tag.tests import temp_folders
 from hash_tag.tools.logger import Logger
 from typing import Generator
 
 # turn off the logger
 Logger.logger = MagicMock()
+tests_dir = os.path.dirname(os.path.abspath(__file__))
 
 
 class TestDataLoader(unittest.TestCase):
 
     def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.folders = temp_folders(self.temp_dir.name)
         os.path.dirname = MagicMock(return_value=os.path.dirname(os.path.abspath(__file__)))
         self.data_loader = DataLoader(input_files_path="data",
-                                      saves_folder_name="saves_from_unittest",
-                                      results_folder_name="results_from_unittest")
+                                      **self.folders)
         self.maxDiff = None
 
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
     def test_property_methods(self):
         print("##########################################################################")
         print("#################### test property methods ###############################")
@@ -33,8 +42,7 @@ class TestDataLoader(unittest.TestCase):
         self.assertEqual(self.data_loader.total, 6)
         with self.assertRaises(Exception) as exception:
             self.data_loader = DataLoader(input_files_path="data123",
-                                          saves_folder_name="saves_from_unittest",
-                                          results_folder_name="results_from_unittest")
+                                          **self.folders)
         self.assertTrue(exception.exception)
 
     def test_file_generator(self):
@@ -164,3 +172,70 @@ class TestDataLoader(unittest.TestCase):
         self.assertTrue(file_line.line)
         self.assertEqual(file_line.line, 'I had just finished')
         self.assertTrue(file_line.file_name, "test_file_name")
+
+    def test_iter_lines(self):
+        print("##########################################################################")
+        print("#################### test iter lines #####################################")
+        print("##########################################################################")
+        file_lines = self.data_loader.parse_files()
+        stream = self.data_loader.iter_lines()
+        self.assertTrue(isinstance(stream, Generator))
+        self.assertEqual(list(stream), file_lines)
+        # the process pool must return the same lines in the same order
+        self.data_loader.workers = 2
+        self.assertEqual(self.data_loader.parse_files(), file_lines)
+        data_loader = DataLoader(input_files_path="data",
+                                 **self.folders,
+                                 workers=2, chunk_size=512, split_by="bytes")
+        self.assertEqual(list(data_loader.iter_lines()), file_lines)
+
+    def test_regex_tokenizer(self):
+        print("##########################################################################")
+        print("#################### test regex tokenizer ################################")
+        print("##########################################################################")
+        data_loader = DataLoader(input_files_path="data",
+                                 **self.folders,
+                                 tokenizer="regex")
+        self.assertEqual(data_loader.tokenizer_name, "regex")
+        file_lines = data_loader.parse_files()
+        self.assertEqual(file_lines[0].words, ['Let', 'me', 'begin', 'by', 'saying', 'thanks',
+                                               'to', 'all', 'you', 'who', "'ve", 'traveled', ',',
+                                               'from', 'far', 'and', 'wide', ',', 'to', 'brave',
+                                               'the', 'cold', 'today', '$'])
+        data_loader.workers = 2
+        self.assertEqual(data_loader.parse_files(), file_lines)
+        with self.assertRaises(ValueError):
+            data_loader.tokenizer = "unknown"
+
+    def test_data_copy(self):
+        print("##########################################################################")
+        print("#################### test data copy ######################################")
+        print("##########################################################################")
+        data = self.data_loader.data
+        self.assertEqual(data[0].file_name, "doc1.txt")
+        words = data[0].words[:]
+        # the filters change the words of the returned objects, the cached ones stay the same
+        data[0].words.append("Let")
+        data[1].words = []
+        new_data = self.data_loader.data
+        self.assertEqual(new_data[0].words, words)
+        self.assertTrue(new_data[1].words)
+        self.assertIsNot(new_data[0], data[0])
+        self.assertIs(new_data[0].line, data[0].line)
+
+    def test_seed_token_cache(self):
+        print("##########################################################################")
+        print("#################### test seed token cache ###############################")
+        print("##########################################################################")
+        input_dir = os.path.join(self.temp_dir.name, "data")
+        shutil.copytree(os.path.join(tests_dir, "data"), input_dir)
+        with open(os.path.join(input_dir, "doc1.txt"), "a", encoding="utf8") as file_writer:
+            file_writer.write("A new line after the extracted tokens\n")
+        data_loader = DataLoader(input_files_path=input_dir, **self.folders)
+        token_cache = TokenCache(os.path.join(self.temp_dir.name, "token_cache"))
+        data_loader._seed_token_cache(token_cache)
+        # the changed file is parsed again, the rest are seeded from the extracted tokens
+        self.assertNotIn(os.path.join(input_dir, "doc1.txt"), token_cache)
+        self.assertEqual(len(token_cache), 5)
+        file_lines = token_cache.lookup(os.path.join(input_dir, "doc2.txt"))
+        self.assertEqual(file_lines[0].file_name, "doc2.txt")
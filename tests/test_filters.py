@@ -1,28 +1,47 @@
 import unittest
-from unittest.mock import MagicMock
-from hash_tag.core.data_loader import DataLoader
+from unittest.mock import MagicMock, patch
+from hash_tag.core.data_loader import DataLoader, FileLine
+from hash_tag.tests import temp_folders
+from hash_tag.core import filters
 from hash_tag.core.filters import filter_duplicates, filter_punctuation, filter_by_tag, \
     filter_stop_words
+from hash_tag.tools.cache import LRUCache
 from hash_tag.tools.logger import Logger
 import string
 from unittest.mock import MagicMock
 import os
+import tempfile
 
 # turn off the logger
 Logger.logger = MagicMock()
 
 
+def fake_tag(words: list) -> list:
+    """
+    A deterministic tagger without the nltk data, the long words are nouns
+    """
+    return [(word, "NN" if len(word) > 3 else "DT") for word in words]
+
+
+def fake_tag_sents(lines: list) -> list:
+    return [fake_tag(words) for words in lines]
+
+
 class TestFilters(unittest.TestCase):
 
     def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.folders = temp_folders(self.temp_dir.name)
         os.path.dirname = MagicMock(return_value=os.path.dirname(os.path.abspath(__file__)))
         self.data_loader = DataLoader(input_files_path="data",
-                                      saves_folder_name="saves_from_unittest",
-                                      results_folder_name="results_from_unittest")
+                                      **self.folders)
         self.data_loader.parse_files()
         self.data = self.data_loader.data
         self.maxDiff = None
 
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
     def test_filter_punctuation(self):
         print("##########################################################################")
         print("#################### filter_punctuation ##################################")
@@ -83,3 +102,79 @@ class TestFilters(unittest.TestCase):
         self.assertEqual(words_after, {'troops', 'time', 'home'})
         self.assertEqual(words_before.difference(words_after),
                          {'to', ',', "'s", 'our', 'America', 'start', 'it', 'bringing', '.'})
+
+
+class TestTagBatches(unittest.TestCase):
+
+    def setUp(self):
+        sentences = [["the", "nation", "is", "great"], ["our", "troops", "come", "home"],
+                     ["a", "new", "spirit"]]
+        # 3 unique word sequences, repeated over more than one batch
+        self.lines = [sentences[index % 3][:] for index in range(7)]
+        self.expected = [[word for word, tag in fake_tag(words) if tag == "NN"]
+                         for words in self.lines]
+        self.patches = [patch("hash_tag.core.filters.require"),
+                        patch("nltk.pos_tag_sents", MagicMock(side_effect=fake_tag_sents))]
+        self.pos_tag_sents = [tag_patch.start() for tag_patch in self.patches][1]
+
+    def tearDown(self):
+        for tag_patch in self.patches:
+            tag_patch.stop()
+
+    def file_lines(self) -> list:
+        return [FileLine(words[:], " ".join(words), "doc.txt") for words in self.lines]
+
+    def test_batches(self):
+        print("##########################################################################")
+        print("#################### filter_by_tag batches ###############################")
+        print("##########################################################################")
+        data = filter_by_tag(data=self.file_lines(), tags=["NN"], batch_size=2)
+        self.assertEqual([line.words for line in data], self.expected)
+        # 7 lines in batches of 2 lines
+        self.assertEqual([len(call.args[0]) for call in self.pos_tag_sents.call_args_list],
+                         [2, 2, 2, 1])
+
+    def test_tag_cache(self):
+        print("##########################################################################")
+        print("#################### filter_by_tag tag cache #############################")
+        print("##########################################################################")
+        tag_cache = LRUCache(name="tags")
+        data = filter_by_tag(data=self.file_lines(), tags=["NN"], batch_size=2,
+                             tag_cache=tag_cache)
+        # each unique sequence is tagged once in batches of at most 2 lines
+        tagged = [words for call in self.pos_tag_sents.call_args_list for words in call.args[0]]
+        self.assertEqual(len(tagged), 3)
+        self.assertTrue(all(len(call.args[0]) <= 2
+                            for call in self.pos_tag_sents.call_args_list))
+        self.assertEqual(tag_cache.hits, 4)
+        self.assertEqual(len(tag_cache), 3)
+        # the same output as the unbatched and not cached path
+        self.assertEqual([line.words for line in data], self.expected)
+        self.assertEqual(data, filter_by_tag(data=self.file_lines(), tags=["NN"],
+                                             batch_size=len(self.lines)))
+        # a second run is served from the cache only
+        calls = self.pos_tag_sents.call_count
+        filter_by_tag(data=self.file_lines(), tags=["NN"], batch_size=2, tag_cache=tag_cache)
+        self.assertEqual(self.pos_tag_sents.call_count, calls)
+        self.assertEqual(tag_cache.hits, 11)
+
+    def test_workers(self):
+        print("##########################################################################")
+        print("#################### filter_by_tag workers ###############################")
+        print("##########################################################################")
+        serial = filter_by_tag(data=self.file_lines(), tags=["NN"], batch_size=2, tagger=fake_tag)
+        self.assertEqual([line.words for line in serial], self.expected)
+        parallel = filter_by_tag(data=self.file_lines(), tags=["NN"], batch_size=2, workers=2,
+                                 tagger=fake_tag, tag_cache=LRUCache(name="tags"))
+        self.assertEqual(parallel, serial)
+        self.assertFalse(self.pos_tag_sents.called)
+        # the pool is reused for the same workers and replaced for a different number
+        pool = filters._tagger_pool["pool"]
+        filter_by_tag(data=self.file_lines(), tags=["NN"], batch_size=2, workers=2,
+                      tagger=fake_tag)
+        self.assertIs(filters._tagger_pool["pool"], pool)
+        self.assertEqual(filter_by_tag(data=self.file_lines(), tags=["NN"], batch_size=2,
+                                       workers=3, tagger=fake_tag), serial)
+        self.assertIsNot(filters._tagger_pool["pool"], pool)
+        self.assertTrue(pool._shutdown_thread)
+        filters._shutdown_tagger_pool()
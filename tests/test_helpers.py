@@ -0,0 +1,134 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.core.columnar import ColumnarLines, read_lines, write_lines
+from hash_tag.core.data_loader import DataLoader, FileLine, copy_lines
+from hash_tag.core.common_words import WordCounterDict
+from hash_tag.tools.helpers import CheckpointWriter, restore, write_json, read_json
+from hash_tag.tools.logger import Logger
+from hash_tag.tests import tests_dir
+
+# turn off the logger
+Logger.logger = MagicMock()
+
+
+def failing_writer(file_path: str, data) -> None:
+    # a checkpoint which fails after a partial write
+    with open(f"{file_path}.lines", "w") as f:
+        f.write("partial")
+    raise OSError("No space left on device")
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_checkpoint_writer(self):
+        print("##########################################################################")
+        print("#################### test checkpoint writer ##############################")
+        print("##########################################################################")
+        data = [FileLine(words=["nation", "people"], line="line 1", file_name="doc1.txt")]
+        checkpoint_writer = CheckpointWriter(max_pending=1)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for index in range(3):
+                checkpoint_writer.submit(os.path.join(temp_dir, f"checkpoint_{index}"), data)
+                # the next stage changes the data, the checkpoint keeps the old state
+                data[0].words.append(str(index))
+            checkpoint_writer.shutdown()
+            for index in range(3):
+                file_path = os.path.join(temp_dir, f"checkpoint_{index}")
+                expected = ["nation", "people"] + [str(i) for i in range(index)]
+                self.assertEqual(restore(f"{file_path}.pickle")[0].words, expected)
+                with open(f"{file_path}.json") as f:
+                    self.assertEqual(json.load(f)["data"][0]["words"], expected)
+
+    def test_checkpoint_failure(self):
+        print("##########################################################################")
+        print("#################### test checkpoint failure #############################")
+        print("##########################################################################")
+        data = [FileLine(words=["nation", "people"], line="line 1", file_name="doc1.txt")]
+        checkpoint_writer = CheckpointWriter()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "checkpoint")
+            checkpoint_writer.submit(file_path, data, with_json=False, writer=failing_writer)
+            checkpoint_writer.submit(f"{file_path}_ok", {"nation": "nation"}, with_json=False)
+            with self.assertRaises(IOError) as error:
+                checkpoint_writer.wait()
+            self.assertIn(file_path, str(error.exception))
+            self.assertIn("No space left on device", str(error.exception))
+            # the partial checkpoint is removed, the rest are written
+            self.assertNotIn("checkpoint.lines", os.listdir(temp_dir))
+            self.assertEqual(restore(f"{file_path}_ok.pickle"), {"nation": "nation"})
+            # each failure is raised once
+            checkpoint_writer.wait()
+            checkpoint_writer.shutdown()
+
+    def test_checkpoint_columnar(self):
+        print("##########################################################################")
+        print("#################### test checkpoint columnar ############################")
+        print("##########################################################################")
+        checkpoint_writer = CheckpointWriter()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_loader = DataLoader(input_files_path=os.path.join(tests_dir, "data"),
+                                     saves_folder_name=os.path.join(temp_dir, "saves"),
+                                     results_folder_name=os.path.join(temp_dir, "results"),
+                                     tokenizer="regex")
+            data = data_loader.data
+            data[0].words = ["changed"]
+            expected = copy_lines(data)
+            file_path = os.path.join(temp_dir, "checkpoint")
+            # the columnar lines are neither decoded nor pickled in the caller
+            with patch("hash_tag.tools.helpers.pickle.dumps",
+                       side_effect=AssertionError("pickled in the caller")), \
+                    patch.object(ColumnarLines, "_decode",
+                                 side_effect=AssertionError("decoded in the caller")):
+                checkpoint_writer.submit(file_path, data, with_json=False, writer=write_lines)
+                # the next stage changes the data, the checkpoint keeps the old state
+                data[0].words.append("again")
+            checkpoint_writer.wait()
+            checkpoint_writer.shutdown()
+            with read_lines(f"{file_path}.lines") as checkpoint:
+                self.assertEqual(list(checkpoint), expected)
+                self.assertEqual(checkpoint[0].words, ["changed"])
+
+    def test_write_and_read_json(self):
+        print("##########################################################################")
+        print("#################### test streaming json #################################")
+        print("##########################################################################")
+        data = [FileLine(words=["nation", "people"], line="line 1", file_name="doc1.txt"),
+                FileLine(words=["troops"], line="line: \"2\"", file_name="doc2.txt")]
+        word_dict = WordCounterDict()
+        for line in data:
+            for word in line.words:
+                word_dict[word] = line
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = write_json(os.path.join(temp_dir, "lines"), data, chunk_size=1)
+            with open(file_path) as f:
+                self.assertEqual(json.load(f), {"data": [line.__dict__ for line in data]})
+            self.assertEqual(list(read_json(file_path)),
+                             [("data", None, line.__dict__) for line in data])
+            file_path = write_json(os.path.join(temp_dir, "words"), word_dict)
+            with open(file_path) as f:
+                self.assertEqual(json.load(f), word_dict.to_json())
+            for json_lines in (False, True):
+                file_path = write_json(os.path.join(temp_dir, "words"), word_dict,
+                                       json_lines=json_lines, compression="gzip")
+                self.assertTrue(file_path.endswith(".gz"))
+                records = list(read_json(file_path))
+                self.assertEqual(records[0], ("data", "nation",
+                                              {"counter": 1, "lines": [0], "file_names": [0]}))
+                self.assertEqual(records[-2:], [("file_names", None, "doc1.txt"),
+                                                ("file_names", None, "doc2.txt")])
+            # a pretty printed json, like the reports of the batch and the metrics
+            file_path = os.path.join(temp_dir, "report.json")
+            report = {"config": {"stages": ["stem"], "top_k": 3},
+                      "common": [{"word": "nation", "files": 6}], "peak_rss_bytes": 1024}
+            with open(file_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            self.assertEqual(list(read_json(file_path)),
+                             [("config", "stages", ["stem"]), ("config", "top_k", 3),
+                              ("common", None, {"word": "nation", "files": 6}),
+                              ("peak_rss_bytes", None, 1024)])
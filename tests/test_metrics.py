@@ -0,0 +1,116 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.core.data_loader import FileLine, copy_lines
+from hash_tag.core.stages import run_fused, token_operations
+from hash_tag.tools import metrics
+from hash_tag.tools.cache import LRUCache
+from hash_tag.tools.logger import Logger, logged
+
+# turn off the logger
+Logger.logger = MagicMock()
+
+
+@logged
+def count_lines(data):
+    return len(data)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.data = [FileLine(words=["Nations", ",", "peoples"], line="line 1",
+                              file_name="doc1.txt"),
+                     FileLine(words=["home", "."], line="line 2", file_name="doc2.txt")]
+        metrics.reset()
+
+    def tearDown(self):
+        metrics.configure(enabled=False, memory=False, profile_dir="")
+        metrics.reset()
+
+    def test_disabled(self):
+        print("##########################################################################")
+        print("#################### test metrics disabled ###############################")
+        print("##########################################################################")
+        metrics.configure(enabled=False)
+        self.assertEqual(count_lines(self.data), 2)
+        self.assertEqual(count_lines.__name__, "count_lines")
+        self.assertEqual(metrics.records, [])
+
+    def test_records(self):
+        print("##########################################################################")
+        print("#################### test metrics records ################################")
+        print("##########################################################################")
+        metrics.configure(enabled=True, memory=True)
+        cache = LRUCache(name="test cache")
+        metrics.watch_cache(cache)
+        count_lines(self.data)
+        with metrics.measure("lookup"):
+            cache.get("missing")
+            cache.put("word", 1)
+            cache.get("word")
+        run_fused(copy_lines(self.data), [("filter_punctuation", {}), ("filter_duplicates", {})])
+        self.assertEqual([record["name"] for record in metrics.records],
+                         ["count_lines", "lookup", "filter_punctuation", "filter_duplicates"])
+        record = metrics.records[0]
+        self.assertEqual((record["lines"], record["tokens"]), (2, 5))
+        self.assertGreaterEqual(record["cpu_s"], 0)
+        self.assertIn("tracemalloc_peak_delta_bytes", record)
+        self.assertEqual(metrics.records[1]["caches"], {"test cache": {"hits": 1, "misses": 1}})
+        self.assertEqual(metrics.records[3]["tokens"], 3)
+        report = metrics.report()
+        self.assertEqual(report["totals"]["count_lines"]["calls"], 1)
+        self.assertEqual(report["caches"]["test cache"]["hit_rate"], 0.5)
+
+    def test_stem_measured_once(self):
+        print("##########################################################################")
+        print("#################### test metrics stem measured once #####################")
+        print("##########################################################################")
+        metrics.configure(enabled=True)
+        stages = [("stem", {"vocabulary": "english", "stemmer": "porter"})]
+        # the stem runs as a whole stage when it can't be fused
+        with patch.dict(token_operations, clear=True):
+            data = run_fused(copy_lines(self.data), stages)
+        self.assertEqual(data[0].words, ["nation", ",", "peopl"])
+        self.assertEqual([record["name"] for record in metrics.records], ["stem"])
+
+    def test_memory_without_reset_peak(self):
+        print("##########################################################################")
+        print("#################### test metrics memory without reset_peak ##############")
+        print("##########################################################################")
+        metrics.configure(enabled=True, memory=True)
+        # a high peak before the measured call
+        tracemalloc.start()
+        garbage = bytearray(4 * 1024 * 1024)
+        del garbage
+        # python < 3.9, there isn't any tracemalloc.reset_peak
+        with patch("hash_tag.tools.metrics.tracemalloc", MagicMock(wraps=tracemalloc,
+                                                                   spec=["is_tracing", "start",
+                                                                         "stop",
+                                                                         "get_traced_memory"])):
+            count_lines(self.data)
+        self.assertLess(metrics.records[0]["tracemalloc_peak_delta_bytes"], 1024 * 1024)
+
+    def test_report_and_profile(self):
+        print("##########################################################################")
+        print("#################### test metrics report and profile #####################")
+        print("##########################################################################")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            metrics.configure(enabled=True, profile_dir=temp_dir)
+            with metrics.measure("outer", self.data):
+                count_lines(self.data)
+            # only the outermost call is profiled
+            self.assertEqual(os.listdir(temp_dir), ["001-outer.prof"])
+            self.assertNotIn("profile", metrics.records[0])
+            file_path = metrics.write_report(os.path.join(temp_dir, "report.json"))
+            with open(file_path) as f:
+                report = json.load(f)
+        self.assertEqual([record["name"] for record in report["records"]],
+                         ["count_lines", "outer"])
+        self.assertEqual(report["totals"]["outer"]["tokens"], 5)
@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.tools import resources
+from hash_tag.tools.logger import Logger
+import nltk
+
+# turn off the logger
+Logger.logger = MagicMock()
+# the other tests replace os.path functions with mocks, nltk.data.find needs the real ones
+_dirname = os.path.dirname
+_exists = os.path.exists
+
+
+class TestResources(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = dict(resources.settings)
+        self.environ = dict(os.environ)
+        self.os_path = patch.multiple(os.path, dirname=_dirname, exists=_exists)
+        self.os_path.start()
+
+    def tearDown(self):
+        self.os_path.stop()
+        resources.settings.update(self.settings)
+        os.environ.clear()
+        os.environ.update(self.environ)
+        resources._resolved.clear()
+
+    def test_offline(self):
+        print("##########################################################################")
+        print("#################### test offline nltk resources #########################")
+        print("##########################################################################")
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                patch.dict(resources.nltk_resources, {"missing": "corpora/missing"}), \
+                patch.object(nltk, "download") as download:
+            resources.configure(data_dir=temp_dir, offline=True)
+            self.assertEqual(os.environ["HASH_TAG_OFFLINE"], "1")
+            with self.assertRaises(LookupError):
+                resources.require("missing")
+            download.assert_not_called()
+            self.assertEqual(nltk.data.path[0], temp_dir)
+            nltk.data.path.remove(temp_dir)
+
+            # a resource in the local data dir is found without any download
+            os.makedirs(os.path.join(temp_dir, "corpora", "missing"))
+            resources.require("missing")
+            self.assertIn("missing", resources._resolved)
+            download.assert_not_called()
+            nltk.data.path.remove(temp_dir)
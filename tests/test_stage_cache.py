@@ -0,0 +1,115 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.core.data_loader import FileLine, copy_lines
+from hash_tag.core.filter_pipeline import FilterPipeLine
+from hash_tag.core.stage_cache import StageCache
+from hash_tag.core.stages import run_stages
+from hash_tag.tools.logger import Logger
+
+# turn off the logger
+Logger.logger = MagicMock()
+
+
+def fake_tag_sents(lines: list) -> list:
+    # a tagger without the nltk data, the plural words are NNS
+    return [[(word, "NNS" if word.endswith("s") else "NN") for word in words]
+            for words in lines]
+
+
+class TestStageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.data = [FileLine(words=["Nations", ",", "peoples", "nations", "$", "troops"],
+                              line="line 1", file_name="doc1.txt"),
+                     FileLine(words=["Let", "'ve", "home", "homes", "."],
+                              line="line 2", file_name="doc2.txt")]
+        self.stages = [("filter_punctuation", {}),
+                       ("stem", {"vocabulary": "english", "stemmer": "porter"}),
+                       ("filter_duplicates", {})]
+
+    def test_longest_prefix(self):
+        print("##########################################################################")
+        print("#################### test stage cache longest prefix #####################")
+        print("##########################################################################")
+        expected = run_stages(copy_lines(self.data), self.stages)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            stage_cache = StageCache(temp_dir)
+            data = stage_cache.run(copy_lines(self.data), self.stages, fingerprint="input")
+            self.assertEqual(data, expected)
+            self.assertEqual((stage_cache.hits, stage_cache.misses), (0, 1))
+            # the whole pipeline is cached, the input data are not used
+            self.assertEqual(stage_cache.run([], self.stages, fingerprint="input"), expected)
+            self.assertEqual(stage_cache.lookup("input", self.stages)[0], 3)
+            # another stemmer, only the first stage is reused
+            stages = self.stages[:1] + [("stem", {"vocabulary": "english",
+                                                  "stemmer": "lancaster"})]
+            self.assertEqual(stage_cache.lookup("input", stages)[0], 1)
+            self.assertEqual(stage_cache.run(copy_lines(self.data), stages, fingerprint="input"),
+                             run_stages(copy_lines(self.data), stages))
+            self.assertEqual(stage_cache.lookup("input", stages)[0], 2)
+            # other input data
+            self.assertEqual(stage_cache.lookup("changed input", self.stages), (0, None))
+            self.assertEqual(len(os.listdir(temp_dir)), 4)
+            stage_cache.clear()
+            self.assertEqual(os.listdir(temp_dir), [])
+
+    def test_evict(self):
+        print("##########################################################################")
+        print("#################### test stage cache evict ##############################")
+        print("##########################################################################")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            stage_cache = StageCache(temp_dir)
+            stage_cache.run(copy_lines(self.data), self.stages, fingerprint="input")
+            self.assertEqual(stage_cache.evict(), [])
+            paths = [f"{stage_cache._path('input', self.stages[:total])}.lines"
+                     for total in range(1, 4)]
+            # the first stage is the least recently used
+            for position, file_path in enumerate(paths):
+                os.utime(file_path, (time.time() - 100 + position, time.time() - 100 + position))
+            stage_cache.max_size = sum(os.path.getsize(file_path) for file_path in paths[1:])
+            self.assertEqual(stage_cache.evict(), paths[:1])
+            stage_cache.max_age = 50
+            self.assertEqual(stage_cache.evict(), paths[1:])
+            self.assertEqual(stage_cache.lookup("input", self.stages), (0, None))
+
+    def test_tags_change(self):
+        print("##########################################################################")
+        print("#################### test stage cache tags change ########################")
+        print("##########################################################################")
+        patches = [patch("hash_tag.core.filters.require"),
+                   patch("hash_tag.core.filters.stopwords",
+                         MagicMock(words=MagicMock(return_value=["let", "have"]))),
+                   patch("nltk.pos_tag_sents", MagicMock(side_effect=fake_tag_sents))]
+        for tag_patch in patches:
+            tag_patch.start()
+        try:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                stage_cache = StageCache(temp_dir)
+                for tags in (["NN"], ["NNS"]):
+                    filter_pipeline = FilterPipeLine(saves_dir=temp_dir,
+                                                     data=copy_lines(self.data), tags=tags,
+                                                     vocabulary="english",
+                                                     stage_cache=stage_cache,
+                                                     fingerprint="input")
+                    filter_pipeline.add_all_filters()
+                    # the tags are only in the parameters of filter_by_tag
+                    self.assertEqual(filter_pipeline.stages,
+                                     [("filter_punctuation", {}),
+                                      ("filter_stop_words", {"vocabulary": "english"}),
+                                      ("filter_by_tag", {"tags": tags})])
+                    if tags == ["NNS"]:
+                        # the filter_punctuation and filter_stop_words prefix is reused
+                        self.assertEqual(stage_cache.lookup("input",
+                                                            filter_pipeline.stages)[0], 2)
+                    data = filter_pipeline.apply_filters()
+                self.assertEqual([line.words for line in data],
+                                 [["Nations", "peoples", "nations", "troops"], ["homes"]])
+        finally:
+            for tag_patch in patches:
+                tag_patch.stop()
@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.core.data_loader import FileLine, copy_lines
+from hash_tag.core.filters import filter_punctuation, filter_duplicates
+from hash_tag.core.filter_pipeline import FilterPipeLine
+from hash_tag.core.stages import run_stages, run_fused
+from hash_tag.tools.logger import Logger
+
+# turn off the logger
+Logger.logger = MagicMock()
+
+
+class TestStages(unittest.TestCase):
+
+    def setUp(self):
+        self.data = [FileLine(words=["Nations", ",", "peoples", "nations", "$", "troops"],
+                              line="line 1", file_name="doc1.txt"),
+                     FileLine(words=["Let", "'ve", "home", "homes", "."],
+                              line="line 2", file_name="doc2.txt")]
+
+    def test_run_fused(self):
+        print("##########################################################################")
+        print("#################### test run fused stages ###############################")
+        print("##########################################################################")
+        stages = [("filter_punctuation", {}),
+                  ("stem", {"vocabulary": "english", "stemmer": "porter"}),
+                  ("filter_duplicates", {}),
+                  ("filter_punctuation", {}),
+                  ("stem", {"vocabulary": "greek", "stemmer": "porter"})]
+        expected = run_stages(copy_lines(self.data), stages)
+        fused = run_stages(copy_lines(self.data), stages, fused=True)
+        self.assertEqual([sorted(line.words) for line in fused],
+                         [sorted(line.words) for line in expected])
+        self.assertEqual(sorted(fused[0].words), ["nation", "peopl", "troop"])
+
+    def test_fused_checkpoints(self):
+        print("##########################################################################")
+        print("#################### test fused stages checkpoints #######################")
+        print("##########################################################################")
+        checkpoints = {}
+        stages = [("filter_punctuation", {}),
+                  ("stem", {"vocabulary": "english", "stemmer": "porter"})]
+        run_fused(copy_lines(self.data), stages,
+                  checkpoint=lambda name, data: checkpoints.update({name: copy_lines(data)}))
+        self.assertEqual(checkpoints["filter_punctuation"][1].words, ["Let", "home", "homes"])
+        self.assertEqual(checkpoints["stem"][1].words, ["let", "home", "home"])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filter_pipeline = FilterPipeLine(saves_dir=temp_dir, data=copy_lines(self.data),
+                                             tags=[], vocabulary="english", debug=True)
+            filter_pipeline.add_filter(filter_punctuation)
+            filter_pipeline.add_filter(filter_duplicates)
+            result = filter_pipeline.apply_filters()
+            self.assertEqual(sorted(filter_pipeline.saves),
+                             ["filter_duplicates.lines", "filter_punctuation.lines"])
+            after_punctuation = filter_pipeline.restore_after_filter("filter_punctuation.lines")
+            self.assertEqual(after_punctuation[0].words,
+                             ["Nations", "peoples", "nations", "troops"])
+        self.assertEqual(sorted(result[1].words), ["Let", "home", "homes"])
@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.core.data_loader import FileLine
+from hash_tag.core.stem import stem_words, stem_cache
+from hash_tag.tools.logger import Logger
+from nltk.stem import PorterStemmer
+
+# turn off the logger
+Logger.logger = MagicMock()
+
+
+class TestStem(unittest.TestCase):
+
+    def setUp(self):
+        stem_cache.clear()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.words = ['people', 'peoples', 'nations', 'people', 'nation', 'troops']
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_stem_cache(self):
+        print("##########################################################################")
+        print("#################### test stem cache #####################################")
+        print("##########################################################################")
+        data = [FileLine(words=self.words[:], line="test line", file_name="doc1.txt")]
+        stem_words(data, vocabulary="english", stemmer="porter",
+                   saves_dir=self.temp_dir.name, persist_cache=True)
+        self.assertEqual(data[0].words, [PorterStemmer().stem(word) for word in self.words])
+        # only the repeated word is a hit
+        self.assertEqual(stem_cache.hits, 1)
+        self.assertEqual(stem_cache.misses, 5)
+        self.assertIn(("PorterStemmer", "people"), stem_cache)
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir.name, "stem_cache.pickle")))
+
+        # a new run starts warm from the saved cache
+        stem_cache.clear()
+        data = [FileLine(words=self.words[:], line="test line", file_name="doc1.txt")]
+        stem_words(data, vocabulary="english", stemmer="porter",
+                   saves_dir=self.temp_dir.name, persist_cache=True)
+        self.assertEqual(stem_cache.misses, 0)
+        self.assertEqual(stem_cache.hits, 6)
+
+    def test_unsupported_vocabulary(self):
+        print("##########################################################################")
+        print("#################### test unsupported vocabulary #########################")
+        print("##########################################################################")
+        data = [FileLine(words=self.words[:], line="test line", file_name="doc1.txt")]
+        stem_words(data, vocabulary="greek", stemmer="porter", saves_dir=self.temp_dir.name)
+        self.assertEqual(data[0].words, self.words)
+        self.assertEqual(len(stem_cache), 0)
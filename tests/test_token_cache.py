@@ -0,0 +1,100 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import pickle
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.core.data_loader import FileLine
+from hash_tag.core.token_cache import TokenCache
+from hash_tag.tools.logger import Logger
+
+# turn off the logger
+Logger.logger = MagicMock()
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.temp_dir.name, "token_cache")
+        self.file_path = os.path.join(self.temp_dir.name, "doc1.txt")
+        with open(self.file_path, "w", encoding="utf8") as file_writer:
+            file_writer.write("Thank you.\n")
+        self.file_lines = [FileLine(words=["Thank", "you", "."], line="Thank you.",
+                                    file_name="doc1.txt")]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_lookup_and_update(self):
+        print("##########################################################################")
+        print("#################### test token cache lookup #############################")
+        print("##########################################################################")
+        token_cache = TokenCache(self.cache_path)
+        self.assertEqual(len(token_cache), 0)
+        self.assertIsNone(token_cache.lookup(self.file_path))
+
+        token_cache.update(self.file_path, self.file_lines)
+        token_cache.save()
+        # a new cache object restores the saved entries
+        token_cache = TokenCache(self.cache_path)
+        self.assertIn(self.file_path, token_cache)
+        self.assertEqual(token_cache.lookup(self.file_path), self.file_lines)
+
+        # same content with a new modification time is still valid
+        stat = os.stat(self.file_path)
+        os.utime(self.file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(token_cache.lookup(self.file_path), self.file_lines)
+
+        # changed content invalidates the entry
+        with open(self.file_path, "a", encoding="utf8") as file_writer:
+            file_writer.write("Good morning.\n")
+        self.assertIsNone(token_cache.lookup(self.file_path))
+
+    def test_prune(self):
+        print("##########################################################################")
+        print("#################### test token cache prune ##############################")
+        print("##########################################################################")
+        token_cache = TokenCache(self.cache_path)
+        token_cache.update(self.file_path, self.file_lines)
+        self.assertEqual(token_cache.prune([self.file_path]), [])
+        self.assertEqual(token_cache.prune([]), [self.file_path])
+        self.assertNotIn(self.file_path, token_cache)
+
+    def test_mapped_file(self):
+        print("##########################################################################")
+        print("#################### test token cache file ###############################")
+        print("##########################################################################")
+        second_path = os.path.join(self.temp_dir.name, "doc2.txt")
+        with open(second_path, "w", encoding="utf8") as file_writer:
+            file_writer.write("Good morning.\n")
+        second_lines = [FileLine(words=["Good", "morning", "."], line="Good morning.",
+                                 file_name="doc2.txt")]
+        token_cache = TokenCache(self.cache_path)
+        token_cache.update(self.file_path, self.file_lines)
+        token_cache.update(second_path, second_lines)
+        token_cache.save()
+        self.assertEqual(os.listdir(self.temp_dir.name).count("token_cache.lines"), 1)
+        # the lines of the saved cache are memory mapped from the file
+        token_cache = TokenCache(self.cache_path)
+        lines = token_cache.lines([second_path, self.file_path])
+        self.assertEqual(lines, second_lines + self.file_lines)
+        # a live sequence stays valid after the file is replaced
+        token_cache.prune([self.file_path])
+        token_cache.save()
+        self.assertEqual(lines, second_lines + self.file_lines)
+        self.assertEqual(len(TokenCache(self.cache_path)), 1)
+
+    def test_invalid_file(self):
+        print("##########################################################################")
+        print("#################### test token cache invalid file #######################")
+        print("##########################################################################")
+        with open(f"{self.cache_path}.lines", "wb") as f:
+            pickle.dump({}, f)
+        token_cache = TokenCache(self.cache_path)
+        self.assertEqual(len(token_cache), 0)
+        token_cache.update(self.file_path, self.file_lines)
+        token_cache.save()
+        self.assertEqual(TokenCache(self.cache_path).lookup(self.file_path), self.file_lines)
@@ -0,0 +1,23 @@
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.core.tokenizers import regex_tokenize
+
+
+class TestTokenizers(unittest.TestCase):
+
+    def test_regex_tokenize(self):
+        print("##########################################################################")
+        print("#################### test regex tokenize #################################")
+        print("##########################################################################")
+        line = "Mr. Smith cannot go to the U.S.-Russian talks. We've seen HIV/AIDS " \
+               "spread...But it won't end."
+        self.assertEqual(list(regex_tokenize(line)),
+                         [(["Mr.", "Smith", "can", "not", "go", "to", "the", "U.S.-Russian",
+                            "talks", "."], "Mr. Smith cannot go to the U.S.-Russian talks."),
+                          (["We", "'ve", "seen", "HIV/AIDS", "spread", ".", ".", ".", "But",
+                            "it", "wo", "n't", "end", "."],
+                           "We've seen HIV/AIDS spread...But it won't end.")])
+        self.assertEqual(list(regex_tokenize("  ")), [])
@@ -0,0 +1,138 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from hash_tag.core.common_words import CalculateCommonWords
+from hash_tag.core.data_loader import DataLoader, FileLine
+from hash_tag.core.word_index import WordIndex
+from hash_tag.tests import temp_folders, tests_dir
+from hash_tag.tools.logger import Logger
+
+# turn off the logger
+Logger.logger = MagicMock()
+
+
+class TestWordIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.data = [FileLine(words=["nation", "people"], line="line 1", file_name="doc1.txt"),
+                     FileLine(words=["people", "troops"], line="line 2", file_name="doc1.txt"),
+                     FileLine(words=["troops", "home"], line="line 3", file_name="doc2.txt"),
+                     FileLine(words=["nation", "people"], line="line 4", file_name="doc2.txt"),
+                     FileLine(words=["home", "people"], line="line 5", file_name="doc3.txt")]
+
+    def test_top(self):
+        print("##########################################################################")
+        print("#################### test word index top #################################")
+        print("##########################################################################")
+        word_index = WordIndex.build(self.data)
+        self.assertEqual(word_index.document_frequency("people"), 3)
+        self.assertEqual(sorted(word_index.buckets), [2, 3])
+        for criterion in range(1, 5):
+            common_words = CalculateCommonWords(results_dir="", data=self.data,
+                                                common_criterion=criterion)
+            self.assertEqual(word_index.top(criterion=criterion),
+                             list(common_words._get_common()))
+            self.assertEqual(word_index.top(criterion=criterion, top_k=2),
+                             list(common_words._get_common(top_k=2)))
+            self.assertEqual(word_index.common(criterion), common_words.word_dict)
+        self.assertEqual([word for word, _ in word_index.top(criterion=2)],
+                         ["people", "nation", "troops", "home"])
+
+    def test_save_and_load(self):
+        print("##########################################################################")
+        print("#################### test word index save ################################")
+        print("##########################################################################")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "word_index")
+            WordIndex.build(self.data).save(file_path)
+            word_index = WordIndex.load(file_path)
+        common_words = CalculateCommonWords(results_dir="", common_criterion=3,
+                                            index=word_index)
+        self.assertEqual(list(common_words.word_dict), ["people"])
+        self.assertEqual(common_words.word_dict["people"].lines,
+                         ["line 1", "line 2", "line 4", "line 5"])
+        self.assertEqual(next(common_words._get_common(top_k=1))[0], "people")
+
+    def test_add_and_retract(self):
+        print("##########################################################################")
+        print("#################### test word index add and retract #####################")
+        print("##########################################################################")
+        word_index = WordIndex.build([line for line in self.data if line.file_name != "doc2.txt"])
+        self.assertEqual(word_index.files, ["doc1.txt", "doc3.txt"])
+        # doc2.txt is between the other files, the result must match a full rebuild
+        word_index.add([line for line in self.data if line.file_name == "doc2.txt"])
+        self.assertEqual(word_index.files, ["doc1.txt", "doc2.txt", "doc3.txt"])
+        for criterion in range(1, 4):
+            self.assertEqual(word_index.top(criterion=criterion),
+                             WordIndex.build(self.data).top(criterion=criterion))
+        with self.assertRaises(ValueError):
+            word_index.add([self.data[0]])
+
+        word_index.retract(["doc1.txt"])
+        data = [line for line in self.data if line.file_name != "doc1.txt"]
+        self.assertEqual(word_index.files, ["doc2.txt", "doc3.txt"])
+        self.assertNotIn("nation", word_index.common(2))
+        for criterion in range(1, 4):
+            common_words = CalculateCommonWords(results_dir="", data=data,
+                                                common_criterion=criterion)
+            self.assertEqual(word_index.top(criterion=criterion),
+                             list(common_words._get_common()))
+
+    def test_shared_lines(self):
+        print("##########################################################################")
+        print("#################### test word index shared lines ########################")
+        print("##########################################################################")
+        # the same line in more than one file is counted once, it stays while any of its
+        # files is in the index
+        data = [FileLine(words=["thank", "you"], line="thank you", file_name="doc1.txt"),
+                FileLine(words=["nation"], line="line 1", file_name="doc1.txt"),
+                FileLine(words=["nation", "you"], line="line 2", file_name="doc2.txt"),
+                FileLine(words=["people"], line="line 3", file_name="doc3.txt"),
+                FileLine(words=["thank", "you"], line="thank you", file_name="doc3.txt")]
+        word_index = WordIndex.build([line for line in data if line.file_name != "doc2.txt"])
+        word_index.add([line for line in data if line.file_name == "doc2.txt"])
+        self.assertEqual(word_index.word_dict, WordIndex.build(data).word_dict)
+        word_index.retract(["doc1.txt"])
+        data = [line for line in data if line.file_name != "doc1.txt"]
+        full_index = WordIndex.build(data)
+        self.assertEqual(word_index.word_dict, full_index.word_dict)
+        self.assertEqual(word_index.top(criterion=1), full_index.top(criterion=1))
+        self.assertEqual(word_index.word_dict["you"].lines, ["line 2", "thank you"])
+        # the strings of the retracted lines and files are dropped from the tables
+        word_index.retract(["doc2.txt"])
+        self.assertEqual(word_index.line_table.strings, ["thank you", "line 3"])
+        self.assertEqual(word_index.file_table.strings, ["doc3.txt"])
+        self.assertEqual(word_index.word_dict, WordIndex.build(data[1:]).word_dict)
+        self.assertEqual(word_index.top(criterion=1), WordIndex.build(data[1:]).top(criterion=1))
+
+    def test_update(self):
+        print("##########################################################################")
+        print("#################### test word index update ##############################")
+        print("##########################################################################")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_dir = os.path.join(temp_dir, "data")
+            shutil.copytree(os.path.join(tests_dir, "data"), input_dir)
+            data_loader = DataLoader(input_files_path=input_dir, tokenizer="regex",
+                                     **temp_folders(temp_dir))
+            word_index = WordIndex.build(data_loader.data)
+            # added, changed and removed input files
+            shutil.copy(os.path.join(input_dir, "doc1.txt"), os.path.join(input_dir, "doc0.txt"))
+            with open(os.path.join(input_dir, "doc3.txt"), "a", encoding="utf8") as file_writer:
+                file_writer.write("The people of this great nation\n")
+            os.remove(os.path.join(input_dir, "doc5.txt"))
+            added, retracted = data_loader.update()
+            self.assertEqual(sorted(retracted), ["doc3.txt", "doc5.txt"])
+            self.assertEqual(sorted({line.file_name for line in added}), ["doc0.txt", "doc3.txt"])
+            word_index.retract(retracted)
+            word_index.add(added)
+            full_index = WordIndex.build(data_loader.data)
+        self.assertEqual(word_index.files, full_index.files)
+        self.assertEqual(word_index.word_dict, full_index.word_dict)
+        for criterion in range(1, 7):
+            self.assertEqual(word_index.top(criterion=criterion),
+                             full_index.top(criterion=criterion))
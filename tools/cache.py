@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from hash_tag.tools.helpers import restore, write
+from hash_tag.tools.logger import Logger
+
+
+class LRUCache:
+    """
+    A bounded memo with least recently used eviction, it keeps also the number of hits and
+    misses to be able to check if the cache is useful for the given data.
+    max_size: the maximum number of entries, 0 or less means unbounded
+    """
+
+    def __init__(self, max_size: int = 100000, name: str = "cache"):
+        self.max_size = max_size
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if 0 < self.max_size < len(self._entries):
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def log_stats(self) -> None:
+        Logger.logger.info(f"{self.name}: {len(self)} entries, {self.hits} hits, "
+                           f"{self.misses} misses, hit rate {self.hit_rate:0.2%}")
+
+    def save(self, file_path: str) -> None:
+        """
+        Writes the entries of the cache as a pickle checkpoint at file_path
+        """
+        write(file_path, list(self._entries.items()))
+
+    def load(self, file_path: str) -> None:
+        """
+        Adds the entries of a previous save to the cache (file_path without the .pickle)
+        :raise: FileNotFoundError in case there isn't any save
+        """
+        for key, value in restore(f"{file_path}.pickle"):
+            self.put(key, value)
@@ -1,6 +1,13 @@
 import pickle
 import json
+import itertools
+import atexit
+import collections
+import os
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
 from hash_tag.tools.logger import Logger
+from typing import Iterable, Generator, Callable
 
 
 def write(file_path: str, data) -> None:
@@ -16,14 +23,301 @@ def restore(file_path: str):
     return data
 
 
-def write_json(file_path: str, data):
+# the compressions of write_json, the extension is added after the .json or .jsonl
+json_compressions = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz", "zstd": ".zst"}
+# the first line of the .json files of write_json, the json parsers ignore the whitespace after
+# the brace, it marks the files which read_json can read record by record
+_json_first_line = "{\t"
+
+
+def open_text(file_path: str, mode: str, compression: str = None):
+    """
+    Opens a text file for "r" or "w" mode through the requested compression, zstd is used from
+    the standard library (python >= 3.14) or from the zstandard package if it is installed.
+    :raise: ValueError in case of an unknown or not available compression
+    """
+    if compression is None:
+        return open(file_path, mode, encoding="utf-8")
+    if compression == "gzip":
+        import gzip
+        return gzip.open(file_path, f"{mode}t", encoding="utf-8")
+    if compression == "bz2":
+        import bz2
+        return bz2.open(file_path, f"{mode}t", encoding="utf-8")
+    if compression == "xz":
+        import lzma
+        return lzma.open(file_path, f"{mode}t", encoding="utf-8")
+    if compression == "zstd":
+        try:
+            from compression import zstd
+        except ImportError:
+            try:
+                import zstandard as zstd
+            except ImportError:
+                raise ValueError("zstd compression needs python >= 3.14 or the zstandard "
+                                 "package")
+        return zstd.open(file_path, f"{mode}t", encoding="utf-8")
+    raise ValueError(f"Unknown compression: {compression}, "
+                     f"supported: {list(json_compressions)}")
+
+
+def _json_sections(data) -> Iterable[tuple]:
+    """
+    Returns the sections of the json as (name, items, is_mapping), the items of a mapping
+    are (key, value) tuples. Objects with json_sections() or to_json() describe their own
+    sections, otherwise the __dict__ of each element of the list or value of the dict is
+    written in the section "data".
+    """
+    if hasattr(data, "json_sections"):
+        return data.json_sections()
+    if hasattr(data, "to_json"):
+        return [(name, value.items() if isinstance(value, dict) else value,
+                 isinstance(value, dict)) for name, value in data.to_json().items()]
+    if hasattr(data, "items"):
+        return [("data", ((key, getattr(value, "__dict__", value))
+                          for key, value in data.items()), True)]
+    return [("data", (getattr(value, "__dict__", value) for value in data), False)]
+
+
+def write_json(file_path: str, data, json_lines: bool = False, compression: str = None,
+               chunk_size: int = 1000) -> str:
+    """
+    Writes the data as json without creating the whole json in memory, the records are encoded
+    in chunks of chunk_size and they are written one by one.
+    With json_lines=False the file is file_path.json, a valid json like
+    {"data": [record, ...]} where every record is in its own line.
+    With json_lines=True the file is file_path.jsonl, every line is a json object:
+    {"section": "data", "value": record} or {"section": "data", "key": key, "value": record}
+    Both formats can be read back record by record with read_json.
+    :param compression: one of json_compressions, None writes a plain text file
+    :return: the path of the written file
+    """
+    file_path = f"{file_path}.jsonl" if json_lines else f"{file_path}.json"
+    if compression is not None:
+        file_path += json_compressions.get(compression, "")
     Logger.logger.debug(f"Saving a json at:{file_path}")
-    with open(f"{file_path}.json", "w") as f:
+    with open_text(file_path, "w", compression=compression) as f:
+        if not json_lines:
+            f.write(_json_first_line)
+        for position, (name, items, is_mapping) in enumerate(_json_sections(data)):
+            if not json_lines:
+                f.write(f"{',' if position else ''}\n{json.dumps(name)}: "
+                        f"{'{' if is_mapping else '['}\n")
+            for index, chunk in enumerate(chunked(items, chunk_size)):
+                if json_lines:
+                    records = (json.dumps({"section": name, "key": item[0], "value": item[1]})
+                               if is_mapping else json.dumps({"section": name, "value": item})
+                               for item in chunk)
+                elif is_mapping:
+                    records = (f"{json.dumps(key)}: {json.dumps(value)}" for key, value in chunk)
+                else:
+                    records = (json.dumps(item) for item in chunk)
+                separator = "\n" if json_lines else ",\n"
+                f.write(f"{separator if index else ''}{separator.join(records)}")
+            if json_lines:
+                f.write("\n")
+            else:
+                f.write(f"\n{'}' if is_mapping else ']'}")
+        if not json_lines:
+            f.write("\n}\n")
+    return file_path
+
+
+def read_json(file_path: str) -> Generator:
+    """
+    Reads a file of write_json record by record, the compression is found from the extension.
+    Yields (section, key, value) where key is None for the records of a list.
+    Other json files, for example the pretty printed reports, are loaded as a whole and a
+    value which is not a list or a dict is yielded as (name, None, value).
+    """
+    compression = {extension: name for name, extension in json_compressions.items()}.get(
+        os.path.splitext(file_path)[1])
+    decoder = json.JSONDecoder()
+    with open_text(file_path, "r", compression=compression) as f:
+        if ".jsonl" in os.path.basename(file_path):
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record["section"], record.get("key"), record["value"]
+            return
+        first_line = f.readline()
+        if first_line.rstrip("\r\n") != _json_first_line:
+            # not written from write_json, it is loaded as a whole
+            for name, value in json.loads(first_line + f.read()).items():
+                if isinstance(value, dict):
+                    items = value.items()
+                elif isinstance(value, list):
+                    items = ((None, item) for item in value)
+                else:
+                    items = [(None, value)]
+                for key, item in items:
+                    yield name, key, item
+            return
+        section, is_mapping = None, False
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if section is None:
+                if line.endswith(("[", "{")):
+                    section = decoder.raw_decode(line)[0]
+                    is_mapping = line.endswith("{")
+                continue
+            if line.startswith(("]", "}")):
+                section = None
+                continue
+            line = line[:-1] if line.endswith(",") else line
+            if is_mapping:
+                key, end = decoder.raw_decode(line)
+                value = json.loads(line[line.index(":", end) + 1:])
+                yield section, key, value
+            else:
+                yield section, None, json.loads(line)
+
+
+def _snapshot(data) -> tuple:
+    """
+    Returns a snapshot of the data which the next stages can't change, without pickling it
+    in the caller: the lines (objects with words, line and file_name like FileLine) keep
+    a copy of their words list and share the immutable strings, the sequences with their own
+    snapshot (ColumnarLines) copy their buffers without decoding the lines, a dict is copied
+    and the rest are pickled.
+    """
+    if hasattr(data, "snapshot") and hasattr(type(data), "from_snapshot"):
+        return "snapshot", type(data), data.snapshot()
+    if isinstance(data, list) and data:
+        line_class = type(data[0])
+        if all(hasattr(data[0], field) for field in ("words", "line", "file_name")) and \
+                all(type(line) is line_class for line in data):
+            return "lines", line_class, [(line.words[:], line.line, line.file_name)
+                                         for line in data]
+    if type(data) is dict:
+        return "dict", dict(data)
+    return "pickle", pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+
+
+def _from_snapshot(snapshot: tuple):
+    if snapshot[0] == "lines":
+        _, line_class, lines = snapshot
+        return [line_class(words, line, file_name) for words, line, file_name in lines]
+    if snapshot[0] == "snapshot":
+        _, data_class, state = snapshot
+        return data_class.from_snapshot(*state)
+    if snapshot[0] == "dict":
+        return snapshot[1]
+    return pickle.loads(snapshot[1])
+
+
+def _write_checkpoint(file_path: str, snapshot: tuple, with_json: bool,
+                      writer: Callable = None) -> None:
+    """
+    Writes the data of a checkpoint and its json, it runs in the writer process
+    :param snapshot: the data from _snapshot
+    :param writer: writes the data at file_path in another format, default the pickle
+    """
+    data = _from_snapshot(snapshot)
+    if writer is None:
+        write(file_path, data)
+    else:
+        writer(file_path, data)
+    if with_json:
+        write_json(file_path, data)
+
+
+# the files which a checkpoint can create, a failed checkpoint doesn't leave any of them
+checkpoint_extensions = (".pickle", ".json", ".lines")
+
+
+class CheckpointWriter:
+    """
+    Writes the checkpoints (pickle and json) from a background process, so the pipeline
+    doesn't wait for the serialization of the whole data after every stage.
+    A cheap snapshot of the data is taken at submit, see _snapshot, it is pickled for the
+    writer process from the background threads of the process pool and the data can be
+    changed from the next stage. At most max_pending checkpoints wait to be written, submit
+    blocks until the oldest one is written (back-pressure), the checkpoints are written in
+    the order of submit. The failed checkpoints are removed and reported from wait.
+    """
+
+    def __init__(self, max_pending: int = 2):
+        self.max_pending = max(1, max_pending)
+        self._pending = collections.deque()
+        self._executor = None
+        self._failed = []
+
+    def submit(self, file_path: str, data, with_json: bool = True,
+               writer: Callable = None) -> None:
+        """
+        Same as write and write_json at file_path but in the background
+        :param writer: a module level function writer(file_path, data) for another format
+        than the pickle, e.g. core/columnar.write_lines
+        """
+        snapshot = _snapshot(data)
+        while len(self._pending) >= self.max_pending:
+            self._result(*self._pending.popleft())
         try:
-            Logger.logger.warning("Creating json from list with custom objects..")
-            temp = {"data": [data.__dict__ for data in data]}
-        except AttributeError as e:
-            Logger.logger.warning(f"{e}\tCreating json from dict with custom objects..")
-            temp = {"data": {key: values.__dict__ for key, values in data.items()}}
-        finally:
-            json.dump(temp, f)
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=1)
+            self._pending.append((file_path, self._executor.submit(
+                _write_checkpoint, file_path, snapshot, with_json, writer)))
+        except (BrokenProcessPool, RuntimeError, OSError) as error:
+            Logger.logger.error(f"Checkpoint writer is not available: {error}, "
+                                f"writing: {file_path}")
+            self._executor = None
+            try:
+                _write_checkpoint(file_path, snapshot, with_json, writer)
+            except Exception as write_error:
+                self._failure(file_path, write_error)
+
+    def wait(self, check: bool = True) -> None:
+        """
+        Blocks until all the submitted checkpoints are written
+        :param check: raise the failures of the checkpoints since the last check
+        :raise: IOError with the paths of the failed checkpoints
+        """
+        while self._pending:
+            self._result(*self._pending.popleft())
+        if check and self._failed:
+            failed, self._failed = self._failed, []
+            raise IOError(f"Failed to write the checkpoints: "
+                          f"{[f'{file_path}: {error}' for file_path, error in failed]}")
+
+    def _result(self, file_path: str, future: Future) -> None:
+        try:
+            future.result()
+        except Exception as error:
+            self._failure(file_path, error)
+
+    def _failure(self, file_path: str, error: Exception) -> None:
+        Logger.logger.error(f"Failed to write the checkpoint {file_path}: {error}")
+        self._failed.append((file_path, error))
+        for extension in checkpoint_extensions:
+            try:
+                os.remove(f"{file_path}{extension}")
+            except OSError:
+                pass
+
+    def shutdown(self) -> None:
+        # the failures are already logged, the exit doesn't raise them
+        self.wait(check=False)
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+# the writer of the pipeline checkpoints, the pending writes are completed before the exit
+checkpoint_writer = CheckpointWriter()
+atexit.register(checkpoint_writer.shutdown)
+
+
+def chunked(data: Iterable, chunk_size: int) -> Generator:
+    """
+    Yields lists with at most chunk_size consecutive elements of data, used from the
+    streaming stages to work on one chunk of FileLine objects at a time.
+    """
+    iterator = iter(data)
+    while True:
+        chunk = list(itertools.islice(iterator, max(1, chunk_size)))
+        if not chunk:
+            return
+        yield chunk
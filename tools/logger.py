@@ -1,8 +1,10 @@
+import functools
 import logging
 import sys
 import time
 import inspect
 import os
+from hash_tag.tools.metrics import measure, is_data, settings as metrics_settings
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_path = os.path.dirname(current_dir)
@@ -37,16 +39,37 @@ class Logger:
         self.logger.addHandler(console_handler)
 
 
+def _input_data(args: tuple, kwargs: dict):
+    """
+    The FileLine objects of the arguments of a logged call, for the metrics
+    """
+    if "data" in kwargs:
+        return kwargs["data"]
+    return next((arg for arg in args if is_data(arg)), None)
+
+
 def logged(function):
+    """
+    Logs the duration of every call and measures it for the run report of tools/metrics.py
+    when the metrics are enabled, the generator functions are only logged
+    """
+    is_generator = inspect.isgeneratorfunction(function)
+
+    @functools.wraps(function)
     def wrapper(*args, **kwargs):
         Logger.logger.info(f"Calling {function.__name__}")
         start = time.time()
-        result = function(*args, **kwargs)
-        duration = time.time() - start
-        if not inspect.isgeneratorfunction(function):
-            Logger.logger.info(f"Called {function.__name__} for {duration:0.2f}s")
-        else:
+        if is_generator:
+            result = function(*args, **kwargs)
             Logger.logger.info(f"Called {function.__name__} (is a generator)")
+            return result
+        data = _input_data(args, kwargs) if metrics_settings["enabled"] else None
+        with measure(function.__name__, data) as step:
+            result = function(*args, **kwargs)
+            if step is not None:
+                step.output(result)
+        duration = time.time() - start
+        Logger.logger.info(f"Called {function.__name__} for {duration:0.2f}s")
         return result
 
     return wrapper
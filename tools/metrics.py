@@ -0,0 +1,200 @@
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Optional
+
+try:
+    import resource
+except ImportError:
+    # windows, there isn't any peak rss
+    resource = None
+
+# The instrumentation of the pipeline: every @logged function and every fused group of stages is
+# measured with measure, when it is enabled, in a record with its wall and cpu time, the lines
+# and the tokens it processed, the throughput, the growth of the peak rss, the peak of the
+# python allocations (only with memory=True, tracemalloc slows down the allocations) and the
+# hits and misses of the watched caches during the call. The nested calls are measured too,
+# their tracemalloc peak is the peak since the start of the outermost call.
+# profile_dir: every measured call which isn't inside another one runs under cProfile and its
+# stats are saved there, they can be read with pstats or snakeviz.
+# The defaults are read from the HASH_TAG_METRICS and HASH_TAG_PROFILE_DIR environment variables.
+settings = {"enabled": os.environ.get("HASH_TAG_METRICS", "").lower() in ("1", "true", "yes"),
+            "memory": False,
+            "profile_dir": os.environ.get("HASH_TAG_PROFILE_DIR") or None}
+records = []
+_caches = {}
+_depth = [0]
+
+
+def configure(enabled: bool = None, memory: bool = None, profile_dir: str = None) -> None:
+    """
+    Changes the settings of the instrumentation, an empty profile_dir disables the profiling
+    """
+    if enabled is not None:
+        settings["enabled"] = enabled
+    if memory is not None:
+        settings["memory"] = memory
+        if not memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+    if profile_dir is not None:
+        settings["profile_dir"] = profile_dir or None
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+
+def reset() -> None:
+    records.clear()
+
+
+def watch_cache(cache) -> None:
+    """
+    Adds a cache with hits and misses attributes (LRUCache, StageCache) in the run report and
+    in the records of the calls which use it, the last cache with the same name replaces the
+    previous one
+    """
+    _caches[getattr(cache, "name", cache.__class__.__name__)] = cache
+
+
+def _cache_counters() -> dict:
+    return {name: (cache.hits, cache.misses) for name, cache in _caches.items()}
+
+
+def is_data(data) -> bool:
+    """
+    True for the sequences of FileLine objects, a list or ColumnarLines
+    """
+    return hasattr(data, "total_tokens") or \
+        (isinstance(data, list) and (not data or hasattr(data[0], "words")))
+
+
+def data_size(data) -> Optional[tuple]:
+    """
+    Returns (lines, tokens) of a sequence of FileLine objects or None for any other object,
+    the ColumnarLines count their tokens without creating the FileLine objects
+    """
+    if not is_data(data):
+        return None
+    if hasattr(data, "total_tokens"):
+        return len(data), data.total_tokens
+    return len(data), sum(len(file_line.words) for file_line in data)
+
+
+def _peak_rss() -> Optional[int]:
+    """
+    The peak resident set size of the process in bytes, ru_maxrss is in KB in linux
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _Measure:
+    """
+    The record of one measured call, the size of the output is used only if the size of the
+    input is unknown, e.g. parse_files
+    """
+
+    def __init__(self, name: str, data=None):
+        self.record = {"name": name}
+        self.size = data_size(data)
+
+    def output(self, result) -> None:
+        if self.size is None:
+            self.size = data_size(result)
+
+
+@contextlib.contextmanager
+def measure(name: str, data=None):
+    """
+    Measures the code of the with block as a record of the run report, data: the input of
+    the stage for the lines and tokens, yields a _Measure object or None when the
+    instrumentation is disabled
+    """
+    if not settings["enabled"]:
+        yield None
+        return
+    step = _Measure(name, data)
+    profiler = None
+    if settings["profile_dir"] and _depth[0] == 0:
+        profiler = cProfile.Profile()
+    memory = settings["memory"]
+    if memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif _depth[0] == 0 and not hasattr(tracemalloc, "reset_peak"):
+            # python < 3.9, the tracing starts again for a peak since the start of the call
+            tracemalloc.stop()
+            tracemalloc.start()
+        memory_start = tracemalloc.get_traced_memory()[0]
+        if _depth[0] == 0 and hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+    caches = _cache_counters()
+    rss = _peak_rss()
+    _depth[0] += 1
+    wall, cpu = time.perf_counter(), time.process_time()
+    if profiler:
+        profiler.enable()
+    try:
+        yield step
+    finally:
+        if profiler:
+            profiler.disable()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        _depth[0] -= 1
+        record = step.record
+        record.update({"wall_s": wall, "cpu_s": cpu, "lines": None, "tokens": None,
+                       "tokens_per_s": None})
+        if step.size is not None:
+            record["lines"], record["tokens"] = step.size
+            record["tokens_per_s"] = step.size[1] / wall if wall > 0 else None
+        if rss is not None:
+            record["peak_rss_delta_bytes"] = _peak_rss() - rss
+        if memory:
+            record["tracemalloc_peak_delta_bytes"] = tracemalloc.get_traced_memory()[1] - \
+                memory_start
+        record["caches"] = {name: {"hits": counters[0] - caches.get(name, (0, 0))[0],
+                                   "misses": counters[1] - caches.get(name, (0, 0))[1]}
+                            for name, counters in _cache_counters().items()
+                            if counters != caches.get(name)}
+        if profiler:
+            record["profile"] = os.path.join(settings["profile_dir"],
+                                             f"{len(records):03d}-{step.record['name']}.prof")
+            profiler.dump_stats(record["profile"])
+        records.append(record)
+
+
+def report() -> dict:
+    """
+    Returns the run report: all the records in the order they finished, the totals of each
+    name and the hit rates of the watched caches
+    """
+    totals = {}
+    for record in records:
+        total = totals.setdefault(record["name"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                                   "tokens": 0})
+        total["calls"] += 1
+        total["wall_s"] += record["wall_s"]
+        total["cpu_s"] += record["cpu_s"]
+        total["tokens"] += record["tokens"] or 0
+    for total in totals.values():
+        total["tokens_per_s"] = total["tokens"] / total["wall_s"] if total["wall_s"] else None
+    caches = {name: {"hits": cache.hits, "misses": cache.misses,
+                     "hit_rate": cache.hits / (cache.hits + cache.misses)
+                     if cache.hits + cache.misses else 0.0}
+              for name, cache in _caches.items()}
+    return {"records": list(records), "totals": totals, "caches": caches,
+            "peak_rss_bytes": _peak_rss()}
+
+
+def write_report(file_path: str) -> str:
+    """
+    Writes the run report as json at file_path and returns the path
+    """
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(report(), f, indent=2)
+    return file_path
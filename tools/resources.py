@@ -0,0 +1,56 @@
+from hash_tag.tools.logger import Logger
+import os
+
+# The nltk resources of the package and their path in the nltk data, they are checked only
+# when they are used for the first time in each process.
+nltk_resources = {"punkt": "tokenizers/punkt",
+                  "averaged_perceptron_tagger": "taggers/averaged_perceptron_tagger",
+                  "stopwords": "corpora/stopwords"}
+
+# data_dir: a local nltk data folder which is searched first and where the missing resources
+# are downloaded, offline: the missing resources are never downloaded.
+# The defaults are read from the HASH_TAG_NLTK_DATA and HASH_TAG_OFFLINE environment variables,
+# so they are the same in the worker processes.
+settings = {"data_dir": os.environ.get("HASH_TAG_NLTK_DATA") or None,
+            "offline": os.environ.get("HASH_TAG_OFFLINE", "").lower() in ("1", "true", "yes")}
+_resolved = set()
+
+
+def configure(data_dir: str = None, offline: bool = None) -> None:
+    """
+    Changes the nltk data folder and the offline mode for this process and the processes which
+    are started after it
+    """
+    if data_dir is not None:
+        settings["data_dir"] = data_dir
+        os.environ["HASH_TAG_NLTK_DATA"] = data_dir
+    if offline is not None:
+        settings["offline"] = offline
+        os.environ["HASH_TAG_OFFLINE"] = "1" if offline else "0"
+    _resolved.clear()
+
+
+def require(name: str) -> None:
+    """
+    Makes sure that the nltk resource exists, it is searched in the data_dir and in the nltk
+    data paths and it is downloaded only if it is missing and we are not offline.
+    After the first successful call it costs only a set lookup.
+    :raise: LookupError in case the resource is missing and it can't be downloaded
+    """
+    if name in _resolved:
+        return
+    import nltk
+
+    data_dir = settings["data_dir"]
+    if data_dir and data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+    try:
+        nltk.data.find(nltk_resources[name])
+    except LookupError:
+        if settings["offline"]:
+            raise LookupError(f"The nltk resource: {name} is missing from the nltk data "
+                              f"{nltk.data.path} and we are offline")
+        Logger.logger.info(f"Downloading the nltk resource: {name}")
+        nltk.download(name, download_dir=data_dir, quiet=True)
+        nltk.data.find(nltk_resources[name])
+    _resolved.add(name)